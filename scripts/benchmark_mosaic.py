@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+# compare the output size and build time of a WMTS layer with and without mosaicking
+# usage (from the repository root): PYTHONPATH=`pwd` python3 scripts/benchmark_mosaic.py [url]
+
+import sys
+import time
+
+from visigoth import Diagram
+from visigoth.containers.map import Map
+from visigoth.map_layers.wmts import WMTS
+
+url = sys.argv[1] if len(sys.argv) > 1 else WMTS.default_url
+bounds = ((166.509144322, -46.641235447), (178.517093541, -34.4506617165))
+for zoom_to in [1,2,4,8]:
+    for mosaic in [False,True]:
+        d = Diagram()
+        m = Map(512,bounds,zoom_to=zoom_to)
+        m.add(WMTS(url=url,mosaic=mosaic))
+        d.add(m)
+        start = time.time()
+        svg = d.draw(format="svg")
+        elapsed = time.time()-start
+        print("zoom_to %d mosaic %-5s: %9d bytes %5d images %.2fs" % (zoom_to,mosaic,len(svg),svg.count("<image"),elapsed))
@@ -71,5 +71,38 @@ class TestScatterPlot(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_som")
 
+    def test_batch(self):
+
+        rng = random.Random(1)
+
+        centres = {"A":(0.1,0.1,0.8),"B":(0.8,0.1,0.1),"C":(0.1,0.8,0.1)}
+        colour_manager = DiscreteColourManager()
+        colour_manager.addColour("A","blue").addColour("B","red").addColour("C","green")
+
+        data = []
+        for x in range(1000):
+            cat = rng.choice(list(centres.keys()))
+            data.append(("label%d"%(x),cat,[v+0.1*rng.random() for v in centres[cat]]))
+
+        d = Diagram(fill="white")
+
+        som = SOM(data,width=512,gridheight=10,gridwidth=10,iters=20,colour_manager=colour_manager,batch=True)
+        som.getMarkerManager().setDefaultRadius(5)
+        d.add(som)
+
+        TestUtils.draw_output(d,"test_som_batch")
+
+        # both batch and online training should map each well separated cluster to its own set of winning cells
+        online = SOM(data,width=512,gridheight=10,gridwidth=10,iters=20,colour_manager=colour_manager)
+        online.build("svg")
+        for trained in [som,online]:
+            winners = {}
+            for (coords,scores) in trained.scores.items():
+                categories = set(category for (_,_,category) in scores)
+                self.assertLessEqual(len(categories),1)
+                for category in categories:
+                    winners[category] = winners.get(category,[])+[coords]
+            self.assertEqual(sorted(winners.keys()),["A","B","C"])
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
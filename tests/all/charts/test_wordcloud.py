@@ -21,6 +21,7 @@
 import os.path
 import sys
 import argparse
+import random
 
 import unittest
 
@@ -63,5 +64,15 @@ class TestWordCloud(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_wordcloud")
 
+    def test_overlaps(self):
+        rng = random.Random(1)
+        data = [("word%d"%(i),rng.choice(["A","B","C"]),1+rng.random()*100) for i in range(300)]
+        wc = WordCloud(data, width=600, height=600, seed=1, flip_fraction=0.2)
+        wc.build("svg")
+        self.assertEqual(len(wc.plots),len(data))
+        for i in range(len(wc.plots)):
+            for j in range(i+1,len(wc.plots)):
+                self.assertFalse(WordCloud.overlaps(wc.plots[i],wc.plots[j]))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
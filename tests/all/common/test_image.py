@@ -20,12 +20,17 @@
 
 import unittest
 import os
+import random
+import struct
+import zlib
 
 from visigoth import Diagram
 from visigoth.utils.test_utils import TestUtils
 from visigoth.common.image import Image
 from visigoth.common.space import Space
 from visigoth.containers.box import Box
+from visigoth.utils.image.png_canvas import PngCanvas
+from visigoth.utils.image.png_reader import PngReader
 
 
 class TestImage(unittest.TestCase):
@@ -47,5 +52,67 @@ class TestImage(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_image")
 
+    def chunks(self,content):
+        # split PNG content into (name,data) chunks, checking the CRC of each
+        self.assertEqual(content[:8],PngCanvas.png_magic)
+        pos = 8
+        chunks = []
+        while pos < len(content):
+            (length,name) = struct.unpack(">L4s",content[pos:pos+8])
+            data = content[pos+8:pos+8+length]
+            (crc,) = struct.unpack(">L",content[pos+8+length:pos+12+length])
+            self.assertEqual(crc,zlib.crc32(data,zlib.crc32(name)))
+            chunks.append((name,data))
+            pos += 12+length
+        self.assertEqual(chunks[-1],(b"IEND",b""))
+        return chunks
+
+    def test_png_round_trip(self):
+        rng = random.Random(1)
+        (width,height) = (37,23)
+
+        # truecolour, with smooth gradients and noise so that each filter gets used
+        truecolour = PngCanvas(height,width)
+        for y in range(height):
+            for x in range(width):
+                truecolour.addpixel(x,y,(x*7) % 256,(y*11) % 256,rng.randint(0,255),255 if x % 5 else rng.randint(0,255))
+
+        # palette, including transparent colours
+        colours = [(rng.randint(0,255),rng.randint(0,255),rng.randint(0,255),rng.choice([0,128,255])) for _ in range(20)]
+        palette = PngCanvas(height,width)
+        for y in range(height):
+            for x in range(width):
+                palette.addpixel(x,y,*colours[(x//4+y) % len(colours)])
+
+        for (canvas,colour_type) in [(truecolour,6),(palette,3)]:
+            for filters in [(0,),(1,),(2,),(3,),(4,),(0,1,2,3,4)]:
+                for chunk_size in [65536,50]:
+                    canvas.filters = filters
+                    canvas.chunk_size = chunk_size
+                    content = canvas.tobytes()
+                    chunks = self.chunks(content)
+                    self.assertEqual(chunks[0][0],b"IHDR")
+                    self.assertEqual(struct.unpack(">LLBBBBB",chunks[0][1]),(width,height,8,colour_type,0,0,0))
+                    idat = [data for (name,data) in chunks if name == b"IDAT"]
+                    self.assertTrue(all(len(data) <= chunk_size for data in idat))
+                    if chunk_size == 50:
+                        self.assertTrue(len(idat) > 1)
+                    # each scanline starts with its filter type, palette images are not filtered
+                    raw = zlib.decompress(b"".join(idat))
+                    stride = width*(4 if colour_type == 6 else 1)
+                    self.assertEqual(len(raw),height*(stride+1))
+                    filter_types = set(raw[0::stride+1])
+                    if colour_type == 6:
+                        self.assertTrue(filter_types.issubset(filters))
+                    else:
+                        self.assertEqual(filter_types,{0})
+                    self.assertEqual(PngReader.decode(content),(width,height,canvas.pixels))
+            self.assertEqual(PngReader.decode(PngCanvas.encodeRGBA(width,height,canvas.pixels)),(width,height,canvas.pixels))
+
+        self.assertEqual(PngReader.decode(PngCanvas.encodeTrueColour(width,height,palette.pixels,filters=(4,))),(width,height,palette.pixels))
+        indices = bytes(rng.randint(0,len(colours)-1) for _ in range(width*height))
+        expected = bytearray(b"".join(bytes(colours[index]) for index in indices))
+        self.assertEqual(PngReader.decode(PngCanvas.encodeIndexed(width,height,indices,[bytes(c) for c in colours])),(width,height,expected))
+
 if __name__ == "__main__":
     unittest.main()
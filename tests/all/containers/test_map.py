@@ -19,6 +19,7 @@
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import unittest
+import random
 
 from visigoth import Diagram
 from visigoth.utils.test_utils import TestUtils
@@ -26,6 +27,7 @@ from visigoth.containers.box import Box
 from visigoth.containers.map import Map
 from visigoth.containers.sequence import Sequence
 
+from visigoth.map_layers import MapLayer
 from visigoth.map_layers.wms import WMS
 from visigoth.utils.mapping import Geocoder
 from visigoth.utils.mapping import Projections,Mapping
@@ -66,5 +68,21 @@ class TestMap(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_map")
 
+    def test_projections(self):
+        rng = random.Random(1)
+        lon_lats = [(-180+360*rng.random(),-85+170*rng.random()) for _ in range(100)]
+        bounds = ((-10,40),(20,60))
+        layer = MapLayer()
+        for projection in [Projections.EPSG_3857,Projections.EPSG_4326]:
+            # the batched conversions should give exactly the same results as converting each point
+            e_ns = projection.fromLonLatArray(lon_lats)
+            self.assertEqual(e_ns,[projection.fromLonLat(lon_lat) for lon_lat in lon_lats])
+            self.assertEqual(projection.toLonLatArray(e_ns),[projection.toLonLat(e_n) for e_n in e_ns])
+
+            layer.configureLayer(None,512,384,bounds,projection,None,"svg")
+            layer.drawTo(300,200)
+            self.assertEqual(layer.getXYArray(e_ns),[layer.getXY(e_n) for e_n in e_ns])
+            self.assertEqual(layer.getXYFromLonLatArray(lon_lats),[layer.getXYFromLonLat(lon_lat) for lon_lat in lon_lats])
+
 if __name__ == "__main__":
     unittest.main()
@@ -20,6 +20,7 @@
 
 import unittest
 import random
+from math import sqrt
 
 from visigoth import Diagram
 from visigoth.utils.test_utils import TestUtils
@@ -65,5 +66,76 @@ class TestCartogram(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_cartogram")
 
+    @staticmethod
+    def bruteForce(c,xs,ys,rs):
+        # reference layout testing every pair of points for overlap
+        xs = xs[:]
+        ys = ys[:]
+        oxs = xs[:]
+        oys = ys[:]
+        n = len(xs)
+        fxs = [0]*n
+        fys = [0]*n
+        best = None
+        best_error = None
+        rng = random.Random(0)
+        for _ in range(c.iterations):
+            overlaps = 0
+            error = 0
+            for i in range(n):
+                (nx,ny,nr) = (xs[i],ys[i],rs[i])
+                d = sqrt((nx-oxs[i])**2+(ny-oys[i])**2)
+                (fx,fy) = (0,0)
+                if d > 0.0:
+                    fx = (oxs[i]-nx)*c.f1
+                    fy = (oys[i]-ny)*c.f1
+                    error += d
+                for j in range(n):
+                    if i != j:
+                        overlap_radius = (rs[j]+nr) / c.scale_x
+                        if nx == xs[j] and ny == ys[j]:
+                            nudge = (nx+ny)*0.001 if nx+ny else 0.001
+                            nx += nudge*rng.random()-nudge*0.5
+                            ny += nudge*rng.random()-nudge*0.5
+                        d = sqrt((nx-xs[j])**2+(ny-ys[j])**2)
+                        if d <= overlap_radius:
+                            fac = -1*c.f2*(d-overlap_radius)/overlap_radius
+                            fx += (nx-xs[j])*fac
+                            fy += (ny-ys[j])*fac
+                            overlaps += 1
+                fxs[i] = fx
+                fys[i] = fy
+            if overlaps < 3 and (best_error == None or error < best_error):
+                best_error = error
+                best = (xs[:],ys[:])
+            for i in range(n):
+                d = rs[i] / c.scale_x
+                xs[i] = min(max(xs[i]+fxs[i],c.x0+d),c.x1-d)
+                ys[i] = min(max(ys[i]+fys[i],c.y0+d),c.y1-d)
+        return best if best else (xs,ys)
+
+    def test_overlaps(self):
+        rng = random.Random(5)
+        data = [(0.2+0.6*rng.random(),0.2+0.6*rng.random(),10+20*rng.random()) for _ in range(80)]
+        # include exactly coincident points, which are separated by nudging, just inside the edges of grid cells
+        # (cells are as wide as twice the largest marker radius)
+        cell_size = 2*40/512
+        data += [(cell_size*k+1e-6,cell_size*k+1e-6,30) for k in range(1,8) for _ in range(3)]
+        data += [(0.5,0.5,20)]*4
+
+        d = Diagram()
+        m = Map(512,((0.0,0.0),(1.0,1.0)),projection=Projections.IDENTITY)
+        c = Cartogram(data, size=2, iterations=50)
+        m.add(c)
+        d.add(m)
+        d.draw()
+
+        xs = [plot["ox"] for plot in c.plots]
+        ys = [plot["oy"] for plot in c.plots]
+        rs = [plot["r"] for plot in c.plots]
+        (expected_xs,expected_ys) = TestCartogram.bruteForce(c,xs,ys,rs)
+        self.assertEqual([plot["x"] for plot in c.plots],expected_xs)
+        self.assertEqual([plot["y"] for plot in c.plots],expected_ys)
+
 if __name__ == "__main__":
     unittest.main()
@@ -27,6 +27,9 @@ from visigoth.utils.test_utils import TestUtils
 from visigoth.containers.map import Map
 from visigoth.containers.box import Box
 from visigoth.map_layers.cluster import Cluster, AgglomerativeAlgorithm, KMeansAlgorithm
+from visigoth.utils.clustering.kmeans import KMeans
+from visigoth.utils.clustering.silhouette import Silhouette
+from visigoth.utils.mapping.projections import Projections
 
 class TestCluster(unittest.TestCase):
 
@@ -57,5 +60,72 @@ class TestCluster(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_cluster")
 
+    @staticmethod
+    def blobs(seed,centers,size):
+        rng = random.Random(seed)
+        return [(cx+rng.gauss(0,0.05),cy+rng.gauss(0,0.05)) for (cx,cy) in centers for _ in range(size)]
+
+    def test_kmeans(self):
+        points = TestCluster.blobs(2,[(0.2,0.2),(0.8,0.3),(0.5,0.8),(0.3,0.6),(0.7,0.7)],100)
+        for k in [3,5,8]:
+            model = KMeans(None,k,iterations=1000,seed=k,tolerance=0)
+            model.trainProjected(points)
+
+            # plain Lloyd iterations from the same initial centroids
+            lloyd = KMeans(None,k,seed=k)
+            lloyd.data = points
+            lloyd.rng = random.Random(k)
+            centroids = lloyd.initCentroids()
+            while True:
+                lloyd.setCentroids(centroids)
+                assignments = lloyd.assign(points)
+                updated = centroids[:]
+                for cluster in range(k):
+                    members = [point for (point,a) in zip(points,assignments) if a == cluster]
+                    if members:
+                        updated[cluster] = (sum(x for (x,_) in members)/len(members),sum(y for (_,y) in members)/len(members))
+                if updated == centroids:
+                    break
+                centroids = updated
+
+            self.assertEqual(model.getAssignments(),assignments)
+            for (c1,c2) in zip(model.getCentroids(),centroids):
+                self.assertAlmostEqual(c1[0],c2[0])
+                self.assertAlmostEqual(c1[1],c2[1])
+
+    def test_agglomerative(self):
+        rng = random.Random(4)
+        points = TestCluster.blobs(4,[(0.2,0.2),(0.8,0.3),(0.5,0.8)],20)+[(rng.random(),rng.random()) for _ in range(30)]
+        max_distance = 0.05
+
+        # naive single linkage, repeatedly merge the closest pair of clusters
+        naive = [[point] for point in points]
+        while True:
+            closest = None
+            for c1 in range(len(naive)):
+                for c2 in range(c1+1,len(naive)):
+                    d = min(math.sqrt((x1-x2)**2+(y1-y2)**2) for (x1,y1) in naive[c1] for (x2,y2) in naive[c2])
+                    if d < max_distance and (closest is None or d < closest[0]):
+                        closest = (d,c1,c2)
+            if closest is None:
+                break
+            (_,c1,c2) = closest
+            naive[c1] += naive.pop(c2)
+
+        model = AgglomerativeAlgorithm(max_distance=max_distance).train(points,Projections.IDENTITY)
+        clusters = [model.clusters[cluster] for cluster in range(model.getClusterCount())]
+        self.assertEqual(sorted(sorted(cluster) for cluster in clusters),sorted(sorted(cluster) for cluster in naive))
+        for point in points:
+            self.assertIn(point,model.clusters[model.score(point)])
+
+    def test_silhouette(self):
+        points = TestCluster.blobs(3,[(0.2,0.2),(0.8,0.3),(0.5,0.8)],300)
+        model = KMeans(None,3,seed=1)
+        model.trainProjected(points)
+        full = Silhouette.computeProjected(points,model.getAssignments(),3)
+        sampled = Silhouette.computeProjected(points,model.getAssignments(),3,sample_size=200,seed=1)
+        self.assertGreater(full,0.5)
+        self.assertAlmostEqual(sampled,full,delta=0.05)
+
 if __name__ == "__main__":
     unittest.main()
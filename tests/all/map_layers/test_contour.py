@@ -91,6 +91,24 @@ class TestContour(unittest.TestCase):
 
         TestUtils.draw_output(d, "test_contour_edge")
 
+    def test_label_placement(self):
+        # the label position and angle should not depend on where a ring starts or which way it runs
+        c = Contour([[0,0],[0,0]],1)
+        ring = [(0,0),(10,0),(10,10),(5,14),(0,10),(0,0)]
+        expected = None
+        for points in [ring,list(reversed(ring))]:
+            for start in range(len(points)-1):
+                rotated = points[start:-1]+points[:start]+[points[start]]
+                t = c.generateLabel(rotated,1)
+                placement = (t.x,t.y,t.rotation)
+                if expected is None:
+                    expected = placement
+                for (v,e) in zip(placement,expected):
+                    self.assertAlmostEqual(v,e)
+        # the longest segments are all 10 units long, the top-most (lowest y) one is chosen and kept upright
+        self.assertEqual(expected[:2],(5,0))
+        self.assertAlmostEqual(expected[2],0)
+
     def test_negative(self):
         try:
             c = Contour([[]],1)
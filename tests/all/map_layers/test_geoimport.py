@@ -20,6 +20,12 @@
 
 import unittest
 import os.path
+import io
+import json
+import tempfile
+import shutil
+import random
+import re
 
 from visigoth import Diagram
 from visigoth.utils.test_utils import TestUtils
@@ -27,6 +33,8 @@ from visigoth.containers.map import Map
 from visigoth.containers.box import Box
 from visigoth.map_layers.geoimport import Geoimport
 from visigoth.map_layers.wms import WMS
+from visigoth.utils.geojson.geojson_reader import JsonFeatureStream
+from visigoth.utils.geojson import GeojsonReader, GeojsonWriter, GeometryCache, GeoJsonTransformer, Coordinates
 
 class TestGeoimport(unittest.TestCase):
 
@@ -42,5 +50,173 @@ class TestGeoimport(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_geoimport")
 
+    def test_filter(self):
+        d = Diagram(fill="white",margin_left=0,margin_right=0,margin_top=0,margin_bottom=0)
+
+        m1 = Map(512)
+
+        path = os.path.join(os.path.split(__file__)[0],"arrondissements.geojson")
+        m1.add(WMS(type="osm"))
+        m1.add(Geoimport(path=path,polygon_style=lambda props:{"fill":"#FF000030","label":str(props["c_ar"])},
+                         filter_box=(2.3,48.85,2.35,48.87),include_properties=["c_ar"]))
+        d.add(Box(m1))
+
+        TestUtils.draw_output(d,"test_geoimport_filter")
+
+    def test_chunk_sizes(self):
+        # values (numbers in particular) split across chunk boundaries must decode as if read in one go
+        text = '{"type":"FeatureCollection", "features":[ {"type":"Feature","properties":{"name":"a \\"b\\"","n":-12.5e-3},' \
+            + '"geometry":{"type":"Point","coordinates":[1.25,-0.0001]}},\n' \
+            + '{"type":"Feature","properties":{"ok":true,"none":null,"big":1E+10},' \
+            + '"geometry":{"type":"LineString","coordinates":[[100,0],[101.5,1e2]]}} ],"version":1.25}'
+        for chunk_size in range(1,len(text)+2):
+            self.assertEqual(list(JsonFeatureStream(io.StringIO(text),chunk_size)),json.loads(text)["features"])
+
+        path = os.path.join(os.path.split(__file__)[0],"Berlin_gemeinden_simplify0.geojson")
+        with open(path) as f:
+            content = f.read()
+        expected = list(JsonFeatureStream(io.StringIO(content),len(content)))
+        self.assertEqual(expected,json.loads(content)["features"])
+        for chunk_size in range(1,2000,37):
+            self.assertEqual(list(JsonFeatureStream(io.StringIO(content),chunk_size)),expected)
+
+    def test_export_cached(self):
+        # geometry loaded from the cache is backed by a memory map but must still be passed to worker processes
+        path = os.path.join(os.path.split(__file__)[0],"arrondissements.geojson")
+        cache_dir = GeometryCache.cache_dir
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            GeometryCache.configureCacheDirectory(tmp_dir)
+            try:
+                GeojsonReader(use_cache=True).extract(path)
+                extracted = GeojsonReader(use_cache=True).extract(path)
+                outputs = []
+                for processes in [1,2]:
+                    out_path = os.path.join(tmp_dir,"out%d.geojson" % processes)
+                    GeojsonWriter().export(out_path,*extracted,processes=processes)
+                    with open(out_path) as f:
+                        outputs.append(f.read())
+                self.assertEqual(outputs[0],outputs[1])
+            finally:
+                GeometryCache.configureCacheDirectory(cache_dir)
+
+    def test_geometry_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = GeometryCache.cache_dir
+            GeometryCache.configureCacheDirectory(os.path.join(tmp_dir,"cache"))
+            try:
+                path = os.path.join(tmp_dir,"berlin.geojson")
+                shutil.copy(os.path.join(os.path.split(__file__)[0],"Berlin_gemeinden_simplify0.geojson"),path)
+                extracted = GeojsonReader().extract(path)
+                self.assertIsNone(GeometryCache.load(path,["a"]))
+
+                # hit
+                GeometryCache.store(path,["a"],extracted)
+                self.assertEqual(GeometryCache.load(path,["a"]),extracted)
+
+                # miss when the options differ
+                self.assertIsNone(GeometryCache.load(path,["b"]))
+
+                # miss when the file changes, storing again replaces the stale entry
+                st = os.stat(path)
+                os.utime(path,ns=(st.st_atime_ns,st.st_mtime_ns+1000000000))
+                self.assertIsNone(GeometryCache.load(path,["a"]))
+                GeometryCache.store(path,["a"],extracted)
+                GeometryCache.store(path,["b"],extracted)
+                self.assertEqual(len(os.listdir(GeometryCache.cache_dir)),2)
+                self.assertEqual(GeometryCache.load(path,["a"]),extracted)
+
+                # reject corrupt files
+                cache_path = GeometryCache.getCachePath(path,["a"])
+                with open(cache_path,"rb") as f:
+                    content = f.read()
+                for corrupt in [b"",content[:10],content[:-8],b"XXXX"+content[4:]]:
+                    with open(cache_path,"wb") as f:
+                        f.write(corrupt)
+                    self.assertIsNone(GeometryCache.load(path,["a"]))
+            finally:
+                GeometryCache.configureCacheDirectory(cache_dir)
+
+    def test_export_rounding(self):
+        # the output should match the earlier implementation, which serialised the whole collection
+        # with json.dumps and then rounded the coordinates with a regular expression
+        def export_regex(multipoints,multilines,multipolys,decimal_places):
+            features = []
+            for (kind,collection) in [("MultiPoint",multipoints),("MultiLineString",multilines),("MultiPolygon",multipolys)]:
+                for (properties,coordinates) in collection:
+                    features.append({ "type":"Feature", "properties":properties, "geometry":{ "type":kind, "coordinates":coordinates }})
+            jgs = json.dumps({ "type":"FeatureCollection", "features":features },default=list)
+            pat = re.compile(r"\d+\.\d{%d,}"%(decimal_places+1))
+            return re.sub(pat,lambda match:("{:.%df}"%(decimal_places)).format(float(match.group())),jgs)
+
+        rng = random.Random(1)
+        values = [0.0,1.0,-2.5,0.1,1e-07,-1.23456789e-07,6.02e+23,123456789.123456789,0.000015,2.675] \
+            + [rng.uniform(-180,180) for _ in range(200)] + [rng.uniform(-1,1)*10**rng.randint(-8,8) for _ in range(200)]
+        pairs = list(zip(values[0::2],values[1::2]))
+        multipoints = [({"name":"p"},pairs[:5]),({},Coordinates.fromPositions(pairs[5:20]))]
+        multilines = [({"id":1},[pairs[20:60],Coordinates.fromPositions(pairs[60:100])])]
+        multipolys = [({"id":2},[[pairs[100:150]],[Coordinates.fromPositions(pairs[150:])]])]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_path = os.path.join(tmp_dir,"out.geojson")
+            for decimal_places in [0,3,5,8]:
+                GeojsonWriter().export(out_path,multipoints,multilines,multipolys,decimal_places=decimal_places)
+                with open(out_path) as f:
+                    self.assertEqual(f.read(),export_regex(multipoints,multilines,multipolys,decimal_places))
+
+    def test_transform_processes(self):
+        # encoding features in worker processes should not change the output
+        path = os.path.join(os.path.split(__file__)[0],"arrondissements.geojson")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for ndjson in [False,True]:
+                outputs = []
+                for processes in [1,2]:
+                    out_path = os.path.join(tmp_dir,"out%d.geojson" % processes)
+                    GeoJsonTransformer(decimal_places=4,ndjson=ndjson,processes=processes).transform_file(path,out_path)
+                    with open(out_path) as f:
+                        outputs.append(f.read())
+                self.assertEqual(outputs[0],outputs[1])
+                # with several chunks of features in flight
+                out = io.StringIO()
+                GeojsonWriter().write(out,GeojsonReader().iterate(path),decimal_places=4,ndjson=ndjson,processes=2,chunk_size=3)
+                self.assertEqual(out.getvalue(),outputs[0])
+                if ndjson:
+                    features = [json.loads(line) for line in outputs[0].splitlines()]
+                else:
+                    features = json.loads(outputs[0])["features"]
+                self.assertEqual(len(features),20)
+
+    def test_transform_altitude(self):
+        # altitude and any further ordinates should pass through a transform unchanged
+        geometries = [
+            {"type":"LineString","coordinates":[[13.4,52.5,34.5],[13.5,52.6,36.25],[13.6,52.4,-2.0]]},
+            {"type":"Point","coordinates":[2.35,48.85,35.0]},
+            {"type":"Polygon","coordinates":[[[0.0,0.0,1.0,7.0],[1.0,0.0,2.0,8.0],[1.0,1.0,3.0,9.0],[0.0,0.0,1.0,7.0]]]},
+            {"type":"MultiLineString","coordinates":[[[0.0,1.0],[2.0,3.0]],[[4.0,5.0,6.0],[7.0,8.0,9.0]]]}
+        ]
+        collection = {"type":"FeatureCollection","features":[{"type":"Feature","properties":{"id":i},"geometry":geometry}
+                                                             for (i,geometry) in enumerate(geometries)]}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir,"in.geojson")
+            out_path = os.path.join(tmp_dir,"out.geojson")
+            with open(path,"w") as f:
+                json.dump(collection,f)
+            GeoJsonTransformer().transform_file(path,out_path)
+            with open(out_path) as f:
+                features = json.load(f)["features"]
+        # single geometries are written as the corresponding multi geometries
+        self.assertEqual([feature["geometry"]["coordinates"] for feature in features[:3]],
+                         [[geometry["coordinates"]] for geometry in geometries[:3]])
+        self.assertEqual(features[3]["geometry"]["coordinates"],geometries[3]["coordinates"])
+
+        # lon,lat pairs are still yielded when further ordinates are stored
+        line = Coordinates.fromPositions(geometries[0]["coordinates"])
+        self.assertEqual(line.getDimension(),3)
+        self.assertEqual(list(line),[(13.4,52.5),(13.5,52.6),(13.6,52.4)])
+        self.assertEqual(line[-1],(13.6,52.4))
+        self.assertEqual(line.getPositions(),[tuple(position) for position in geometries[0]["coordinates"]])
+        # positions without an altitude limit the ordinates stored
+        self.assertEqual(Coordinates.fromPositions([[0,1,2],[3,4]]).getPositions(),[(0,1),(3,4)])
+        with self.assertRaises(TypeError):
+            hash(line)
+
 if __name__ == "__main__":
     unittest.main()
@@ -21,6 +21,7 @@
 import unittest
 import random
 import math
+import base64
 
 from visigoth import Diagram
 from visigoth.utils.test_utils import TestUtils
@@ -29,6 +30,7 @@ from visigoth.containers.map import Map
 from visigoth.map_layers.geoplot import Geoplot, Multipoint, Multiline, Multipolygon
 from visigoth.map_layers import WMS
 from visigoth.utils.mapping.projections import Projections
+from visigoth.utils.geometry.packed_features import PackedFeatures
 
 class TestGeoplot(unittest.TestCase):
 
@@ -111,6 +113,146 @@ class TestGeoplot(unittest.TestCase):
 
         TestUtils.draw_output(d, "test_geoplot_world")
 
+    def test_geoplot_simplify(self):
+        d = Diagram(fill="white")
+
+        rng = random.Random(1)
+
+        # a detailed ring and line extending beyond the map boundaries
+        ring = []
+        line = []
+        for i in range(0,5000):
+            angle = 2*math.pi*i/5000
+            r = 0.6 + 0.05*rng.random()
+            ring.append((0.5+r*math.cos(angle),0.5+r*math.sin(angle)))
+            line.append((-0.5+2*i/5000,0.5+0.3*math.sin(20*angle)+0.01*rng.random()))
+
+        m = Map(512, boundaries=((0, 0), (1, 1)), zoom_to=4)
+        m.add(Geoplot(multipolys=[Multipolygon([[ring]],fill="lightblue")],
+                      multilines=[Multiline([line],stroke="red",stroke_width=2)],simplify_tolerance=1))
+        d.add(m)
+
+        TestUtils.draw_output(d, "test_geoplot_simplify")
+
+    def test_geoplot_lazy(self):
+        d = Diagram(fill="white")
+
+        rng = random.Random(1)
+
+        # a grid of small polygons and a set of lines, whose paths are filled in as they come into view
+        squares = []
+        for x in range(0,40):
+            for y in range(0,40):
+                squares.append([[(x/40,y/40),((x+0.8)/40,y/40),((x+0.8)/40,(y+0.8)/40),(x/40,(y+0.8)/40)]])
+        lines = [[(rng.random(),rng.random()) for _ in range(0,20)] for _ in range(0,10)]
+
+        m = Map(512, boundaries=((0, 0), (1, 1)), zoom_to=8)
+        m.add(Geoplot(multipolys=[Multipolygon(squares,fill="lightblue",id="squares")],
+                      multilines=[Multiline(lines,stroke="red",stroke_width=2)],lazy=True))
+        d.add(m)
+
+        TestUtils.draw_output(d, "test_geoplot_lazy")
+
+    @staticmethod
+    def decodePacked(config):
+        # decode PackedFeatures.getConfig() into a list of (closed,bbox,levels) for each feature,
+        # where bbox is (min_x,min_y,max_x,max_y) and levels lists the rings for each level of detail
+        data = base64.b64decode(config["data"])
+        pos = 0
+        def readValue():
+            nonlocal pos
+            value = 0
+            shift = 0
+            while True:
+                b = data[pos]
+                pos += 1
+                value |= (b & 127) << shift
+                shift += 7
+                if not (b & 128):
+                    return value
+        def readSigned():
+            value = readValue()
+            return -(value+1)//2 if value % 2 else value//2
+        (x0,y0,precision) = (config["x"],config["y"],config["precision"])
+        features = []
+        for _ in config["ids"]:
+            header = readValue()
+            (min_x,min_y) = (readSigned(),readSigned())
+            (w,h) = (readValue(),readValue())
+            levels = []
+            for _ in range(header//2):
+                rings = []
+                (last_x,last_y) = (min_x,min_y)
+                for _ in range(readValue()):
+                    ring = []
+                    for _ in range(readValue()):
+                        last_x += readSigned()
+                        last_y += readSigned()
+                        ring.append((x0+last_x/precision,y0+last_y/precision))
+                    rings.append(ring)
+                levels.append(rings)
+            bbox = (x0+min_x/precision,y0+min_y/precision,x0+(min_x+w)/precision,y0+(min_y+h)/precision)
+            features.append((header % 2 == 1,bbox,levels))
+        return features
+
+    @staticmethod
+    def queryPacked(config,bboxes,window):
+        # find the features whose bounding boxes intersect a window using the index, as geoplot.js does
+        (xmin,ymin,xmax,ymax) = window
+        candidates = list(config["root"])
+        for level in range(1,config["depth"]+1):
+            cw = config["width"]/2**level
+            ch = config["height"]/2**level
+            for i in range(math.floor((xmin-config["x"])/cw)-1,math.floor((xmax-config["x"])/cw)+1):
+                for j in range(math.floor((ymin-config["y"])/ch)-1,math.floor((ymax-config["y"])/ch)+1):
+                    candidates += config["index"].get("%d,%d,%d" % (level,i,j),[])
+        return set(idx for idx in candidates
+                   if bboxes[idx][2] >= xmin and bboxes[idx][0] <= xmax and bboxes[idx][3] >= ymin and bboxes[idx][1] <= ymax)
+
+    def test_packed_features(self):
+        rng = random.Random(1)
+        packed = PackedFeatures(10,20,100,80,depth=4,precision=100)
+        features = []
+        for idx in range(300):
+            # features of widely varying sizes, some extending outside the area
+            size = rng.choice([0.5,2,10,50,150])
+            (cx,cy) = (10+rng.uniform(-10,110),20+rng.uniform(-10,90))
+            closed = rng.random() < 0.5
+            levels = []
+            for points in [20,5]:
+                rings = [[(cx+size*rng.uniform(-0.5,0.5),cy+size*rng.uniform(-0.5,0.5)) for _ in range(points)]
+                         for _ in range(rng.randint(1,3))]
+                levels.append(rings)
+            stroke_width = rng.choice([0,1,3])
+            packed.add("f%d" % idx,closed,stroke_width,levels)
+            features.append((closed,stroke_width,levels))
+
+        config = packed.getConfig()
+        decoded = TestGeoplot.decodePacked(config)
+        self.assertEqual(config["ids"],["f%d" % idx for idx in range(len(features))])
+        self.assertEqual(len(decoded),len(features))
+        tolerance = 0.5/config["precision"]+1e-9
+        for ((closed,stroke_width,levels),(decoded_closed,bbox,decoded_levels)) in zip(features,decoded):
+            self.assertEqual(decoded_closed,closed)
+            self.assertEqual([[len(ring) for ring in rings] for rings in decoded_levels],[[len(ring) for ring in rings] for rings in levels])
+            for (rings,decoded_rings) in zip(levels,decoded_levels):
+                for (ring,decoded_ring) in zip(rings,decoded_rings):
+                    for ((x,y),(dx,dy)) in zip(ring,decoded_ring):
+                        self.assertLessEqual(abs(x-dx),tolerance)
+                        self.assertLessEqual(abs(y-dy),tolerance)
+                        # the bounding box includes the points, padded for the stroke width
+                        self.assertTrue(bbox[0]+stroke_width/2 <= dx+1e-9 and dx <= bbox[2]-stroke_width/2+1e-9)
+                        self.assertTrue(bbox[1]+stroke_width/2 <= dy+1e-9 and dy <= bbox[3]-stroke_width/2+1e-9)
+
+        # querying the index finds the same features as checking every bounding box
+        bboxes = [bbox for (_,bbox,_) in decoded]
+        for _ in range(200):
+            (wx,wy) = (rng.uniform(0,120),rng.uniform(10,110))
+            (ww,wh) = (rng.uniform(0,40),rng.uniform(0,40))
+            window = (wx,wy,wx+ww,wy+wh)
+            expected = set(idx for (idx,bbox) in enumerate(bboxes)
+                           if bbox[2] >= window[0] and bbox[0] <= window[2] and bbox[3] >= window[1] and bbox[1] <= window[3])
+            self.assertEqual(TestGeoplot.queryPacked(config,bboxes,window),expected)
 
 if __name__ == "__main__":
     unittest.main()
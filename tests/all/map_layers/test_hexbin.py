@@ -32,6 +32,22 @@ from visigoth.map_layers.scatter import Scatter
 
 class TestHexbin(unittest.TestCase):
 
+    @staticmethod
+    def findBin(hexbin,grid,px,py):
+        # find the (col,row) of the hexagon in the grid containing a point by testing the hexagons around it,
+        # returning None if the hexagon lies outside the grid
+        (s,nr_across,nr_down) = grid
+        row0 = round((py-s/2)/(1.5*s))
+        col0 = round(px/(s*math.sqrt(3)))
+        for row in range(row0-1,row0+2):
+            for col in range(col0-1,col0+2):
+                (hx,hy) = hexbin.hexacenter(col,row,s)
+                dx = abs(px-hx)
+                dy = abs(py-hy)
+                if dx <= s*math.sqrt(3)/2 and dy <= s-dx/math.sqrt(3):
+                    return (col,row) if 0 <= col < nr_across and 0 <= row < nr_down else None
+        raise Exception("no hexagon contains (%f,%f)" % (px,py))
+
     def test_basic(self):
         d = Diagram(fill="white")
 
@@ -65,5 +81,75 @@ class TestHexbin(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_hexbin")
 
+    def test_aggregation(self):
+        d = Diagram(fill="white")
+        rng = random.Random(1)
+
+        # each point has a magnitude which increases from west to east
+        data = [(x,y,x*100) for (x,y) in [(rng.random(), rng.random()) for _ in range(0, 5000)]]
+
+        hexbins = {}
+        for aggregation in ["sum","mean","count"]:
+            m = Map(512)
+            colour_manager = ContinuousColourManager()
+            hexbins[aggregation] = Hexbin(data, colour=2, nr_bins_across=20, colour_manager=colour_manager, aggregation=aggregation)
+            m.add(hexbins[aggregation])
+            d.add(m)
+            d.add(Legend(colour_manager, 512))
+
+        TestUtils.draw_output(d,"test_hexbin_aggregation")
+
+        # each point is binned into the hexagon containing it
+        hexbin = hexbins["sum"]
+        grid = (hexbin.dlength,hexbin.nr_bins_across,hexbin.nr_bins_down)
+        bins = {}
+        for ((px,py),(_,_,value)) in zip(hexbin.points,hexbin.data):
+            key = TestHexbin.findBin(hexbin,grid,px,py)
+            (sums,counts) = hexbin.binPoints([(px,py)],[value])
+            self.assertEqual(list(counts),[key] if key is not None else [])
+            if key is not None:
+                bins[key] = bins.get(key,[])+[value]
+
+        # compare the aggregations for the most populated bin
+        (key,values) = max(bins.items(),key=lambda item:len(item[1]))
+        self.assertAlmostEqual(hexbins["sum"].freqs[key],sum(values))
+        self.assertEqual(hexbins["count"].freqs[key],len(values))
+        self.assertAlmostEqual(hexbins["mean"].freqs[key],sum(values)/len(values))
+        for key in bins:
+            self.assertAlmostEqual(hexbins["mean"].freqs[key],hexbins["sum"].freqs[key]/hexbins["count"].freqs[key])
+
+    def test_zoom(self):
+        d = Diagram(fill="white")
+        rng = random.Random(1)
+
+        # clusters of points which are resolved into separate bins as the map is zoomed in
+        data = []
+        for (cx,cy) in [(rng.random(), rng.random()) for _ in range(0, 20)]:
+            data += [(cx+0.02*rng.gauss(0,1),cy+0.02*rng.gauss(0,1)) for _ in range(0, 200)]
+
+        m = Map(512, boundaries=((0,0),(1,1)), zoom_to=8)
+        colour_manager = ContinuousColourManager()
+        hexbin = Hexbin(data, nr_bins_across=20, colour_manager=colour_manager, stroke_width=0.5)
+        m.add(hexbin)
+        d.add(m)
+        d.add(Legend(colour_manager, 512))
+
+        TestUtils.draw_output(d,"test_hexbin_zoom")
+
+        # each level counts the points in the hexagons of its grid
+        levels = [(1,(hexbin.dlength,hexbin.nr_bins_across,hexbin.nr_bins_down),hexbin.freqs)]+hexbin.pyramid
+        self.assertEqual([zoom for (zoom,_,_) in levels],[1,2,4,8])
+        for (zoom,grid,freqs) in levels:
+            self.assertEqual(grid[1],1+(hexbin.nr_bins_across-1)*zoom)
+            self.assertAlmostEqual(grid[0],hexbin.dlength/zoom)
+            counts = {}
+            for (px,py) in hexbin.points:
+                key = TestHexbin.findBin(hexbin,grid,px,py)
+                if key is not None:
+                    counts[key] = counts.get(key,0)+1
+            self.assertEqual({key:freq for (key,freq) in freqs.items() if freq},counts)
+            self.assertEqual(sum(freqs.values()),sum(counts.values()))
+            self.assertGreater(sum(counts.values()),0.9*len(data))
+
 if __name__ == "__main__":
     unittest.main()
@@ -20,14 +20,23 @@
 
 import unittest
 import math
+import re
+import base64
 
 from visigoth import Diagram
 from visigoth.utils.test_utils import TestUtils
 from visigoth.containers import Map, Box
 from visigoth.map_layers import ImageGrid
-from visigoth.utils.mapping.projections import Projections
+from visigoth.utils.mapping.projections import Projections, PROJ_EPSG_4326
+from visigoth.utils.image.png_reader import PngReader
 from visigoth.common import Legend
 
+class NonSeparableProjection(PROJ_EPSG_4326):
+    """the identity projection, reporting that it is not separable so that every pixel is unprojected"""
+
+    def isSeparable(self):
+        return False
+
 class TestImageGrid(unittest.TestCase):
 
     def computeHeight(self, peaks, x, y):
@@ -63,6 +72,63 @@ class TestImageGrid(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_imagegrid")
 
+    @staticmethod
+    def nearest(centres,value):
+        # index of the nearest centre, or None if two centres are (almost) equally near
+        distances = sorted((abs(centre-value),index) for (index,centre) in enumerate(centres))
+        if distances[1][0]-distances[0][0] < 1e-9:
+            return None
+        return distances[0][1]
+
+    def checkPixels(self,columns,rows,colour_fn,colour_type):
+        lons = [0.5+(i+0.5)/columns for i in range(columns)]
+        lats = [0.5+(i+0.5)/rows for i in range(rows)]
+        # each row of data is centred on the corresponding latitude
+        data = [[colour_fn(x,y) for x in range(columns)] for y in range(rows)]
+        boundaries = ((0.1,0.2),(1.9,1.7))
+        for projection in [Projections.IDENTITY,NonSeparableProjection()]:
+            d = Diagram()
+            m = Map(512, projection=projection, boundaries=boundaries)
+            m.add(ImageGrid(r=[[c[0] for c in row] for row in data],g=[[c[1] for c in row] for row in data],
+                            b=[[c[2] for c in row] for row in data],a=[[c[3] for c in row] for row in data],lons=lons,lats=lats))
+            d.add(m)
+            svg = d.draw(format="svg")
+            png = base64.b64decode(re.search("data:image/png;[^\"]*base64,([^\"]*)",svg).group(1))
+            self.assertEqual(png[25],colour_type)
+            (width,height,pixels) = PngReader.decode(png)
+            self.assertEqual((width,height),(columns,rows))
+            ((min_lon,min_lat),(max_lon,max_lat)) = boundaries
+            checked = 0
+            for y in range(height):
+                lat = max_lat-(y+0.5)*(max_lat-min_lat)/height
+                for x in range(width):
+                    lon = min_lon+(x+0.5)*(max_lon-min_lon)/width
+                    pixel = tuple(pixels[(y*width+x)*4:(y*width+x+1)*4])
+                    if 0.5 <= lon <= 1.5 and 0.5 <= lat <= 1.5:
+                        (column,row) = (TestImageGrid.nearest(lons,lon),TestImageGrid.nearest(lats,lat))
+                        if column is None or row is None:
+                            continue
+                        self.assertEqual(pixel,colour_fn(column,row))
+                    else:
+                        # transparent outside the region covered by the grid
+                        self.assertEqual(pixel,(0,0,0,0))
+                    checked += 1
+            self.assertGreater(checked,width*height/2)
+
+    def test_pixels(self):
+        # a few colours are encoded as a palette image
+        self.checkPixels(20,16,lambda x,y:[(255,0,0,255),(0,0,255,128),(10,200,30,255)][(x+2*y)%3],3)
+        # more than 256 colours are encoded as an RGBA image
+        self.checkPixels(30,24,lambda x,y:(8*x,10*y,(x*y)%256,255),6)
+
+    def test_data_format(self):
+        channel = [[0,1,2],[3,4,5]]
+        for (r,g) in [(channel,channel[:1]),(channel,[[0,1],[2,3]]),(channel,[[0,1,256],[0,0,0]]),(channel,[[0,1,-1],[0,0,0]]),(channel,[[0,1,"a"],[0,0,0]])]:
+            with self.assertRaises(Exception):
+                ImageGrid(r=r,g=g,b=None,a=None,lons=[0,1,2],lats=[0,1])
+        grid = ImageGrid(r=None,g=channel,b=None,a=None,lons=[0,1,2],lats=[0,1])
+        self.assertEqual(grid.getValueAt(2,1),(0,5,0,255))
+
 
 if __name__ == "__main__":
     unittest.main()
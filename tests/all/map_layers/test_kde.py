@@ -67,5 +67,36 @@ class TestKDE(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_kde")
 
+    @staticmethod
+    def densities(kde):
+        # drawing the map configures the layer, which computes the sampled density grid
+        d = Diagram()
+        m = Map(256,boundaries=((0,0),(1,1)))
+        m.add(kde)
+        d.add(m)
+        d.draw()
+        return kde.contour.data
+
+    def test_cutoff(self):
+        rng = random.Random(1)
+        data = [(rng.random(), rng.random()) for x in range(0, 100)]
+
+        truncated = TestKDE.densities(KDE(data, bandwidth=4000, nr_samples_across=20, label_fn=None))
+        full = TestKDE.densities(KDE(data, bandwidth=4000, nr_samples_across=20, label_fn=None, cutoff=None))
+        peak = max(max(row) for row in full)
+        for (truncated_row,full_row) in zip(truncated,full):
+            for (t,f) in zip(truncated_row,full_row):
+                self.assertAlmostEqual(t,f,delta=peak*0.001)
+
+        # a custom kernel is not truncated unless a cutoff is supplied
+        kernel = lambda dist: 1/(1+dist)
+        custom = TestKDE.densities(KDE(data, kernel=kernel, bandwidth=4000, nr_samples_across=20, label_fn=None))
+        custom_full = TestKDE.densities(KDE(data, kernel=kernel, bandwidth=4000, nr_samples_across=20, label_fn=None, cutoff=None))
+        self.assertEqual(custom,custom_full)
+
+        for cutoff in [0,-1]:
+            with self.assertRaises(Exception):
+                KDE(data, cutoff=cutoff)
+
 if __name__ == "__main__":
     unittest.main()
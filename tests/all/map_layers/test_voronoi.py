@@ -27,6 +27,8 @@ from visigoth.utils.test_utils import TestUtils
 from visigoth.containers.map import Map
 from visigoth.containers.box import Box
 from visigoth.map_layers.voronoi import Voronoi
+from visigoth.map_layers.voronoi.delaunay import Delaunay
+from visigoth.map_layers.voronoi.bowyer_watson import bowyer_watson
 from visigoth.utils.colour import DiscreteColourManager
 from visigoth.utils.marker import MarkerManager
 
@@ -77,6 +79,42 @@ class TestVoronoi(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_voronoi_square")
 
+    def test_delaunay(self):
+        # compare with the reference implementation, which may miss some triangles along the convex hull
+        for seed in range(10):
+            rng = random.Random(seed)
+            points = [(rng.random(), rng.random()) for _ in range(50)]
+            triangles = Delaunay(points).getTriangles()
+            found = set(frozenset(triangle) for triangle in triangles)
+            expected = set(frozenset(triangle) for triangle in bowyer_watson(points))
+            self.assertTrue(expected.issubset(found))
+            # no point may lie inside the circumcircle of any triangle
+            for ((ax,ay),(bx,by),(cx,cy)) in triangles:
+                for (px,py) in points:
+                    adx, ady, bdx, bdy, cdx, cdy = ax-px, ay-py, bx-px, by-py, cx-px, cy-py
+                    det = (adx*adx+ady*ady)*(bdx*cdy-cdx*bdy) \
+                        - (bdx*bdx+bdy*bdy)*(adx*cdy-cdx*ady) \
+                        + (cdx*cdx+cdy*cdy)*(adx*bdy-bdx*ady)
+                    self.assertLess(det,1e-12)
+            # a triangulation of n points with h on the convex hull has 2n-2-h triangles
+            self.assertEqual(len(triangles),2*len(points)-2-self.hullSize(points))
+
+    def hullSize(self,points):
+        # count the points on the convex hull (monotone chain)
+        def cross(o,a,b):
+            return (a[0]-o[0])*(b[1]-o[1]) - (a[1]-o[1])*(b[0]-o[0])
+        lower = []
+        upper = []
+        for p in sorted(points):
+            while len(lower) >= 2 and cross(lower[-2],lower[-1],p) <= 0:
+                lower.pop()
+            lower.append(p)
+        for p in reversed(sorted(points)):
+            while len(upper) >= 2 and cross(upper[-2],upper[-1],p) <= 0:
+                upper.pop()
+            upper.append(p)
+        return len(lower) + len(upper) - 2
+
 
 if __name__ == "__main__":
     unittest.main()
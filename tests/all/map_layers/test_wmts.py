@@ -19,6 +19,12 @@
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import unittest
+import os.path
+import tempfile
+import ssl
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 from visigoth import Diagram
 from visigoth.utils.test_utils import TestUtils
@@ -26,15 +32,112 @@ from visigoth.containers.map import Map
 from visigoth.containers.box import Box
 from visigoth.map_layers.wmts import WMTS
 from visigoth.map_layers.geoplot import Geoplot, Multipoint
+from visigoth.utils.httpcache import HttpCache
+from visigoth.utils.httpcache.connection_pool import ConnectionPool
+from visigoth.utils.image.png_reader import PngReader
+
+class TileServer(object):
+    """serve the same tile for every request from a local HTTP server, optionally failing the first request for each tile
+    and delaying each response"""
+
+    def __init__(self,tile_path,fail_first=False,delay=0):
+        with open(tile_path,"rb") as f:
+            tile = f.read()
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        requests = self.requests
+        lock = threading.Lock()
+        server = self
+
+        class TileHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                with lock:
+                    requests.append(self.path)
+                    first = requests.count(self.path) == 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight,server.in_flight)
+                time.sleep(delay)
+                with lock:
+                    server.in_flight -= 1
+                if fail_first and first:
+                    self.send_response(503)
+                    self.end_headers()
+                elif self.headers.get("If-None-Match") == '"tile"':
+                    self.send_response(304)
+                    self.end_headers()
+                else:
+                    self.send_response(200)
+                    self.send_header("Content-Type","image/png")
+                    self.send_header("Content-Length",str(len(tile)))
+                    self.send_header("ETag",'"tile"')
+                    self.end_headers()
+                    self.wfile.write(tile)
+
+            def log_message(self,format,*args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1",0),TileHandler)
+        self.url = "http://127.0.0.1:%d/{z}/{x}/{y}.png" % self.server.server_port
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever,daemon=True).start()
+        self.cache_dir = HttpCache.cache_dir
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        HttpCache.configureCacheDirectory(self.tmp_dir.name)
+        return self
+
+    def __exit__(self,*args):
+        HttpCache.configureCacheDirectory(self.cache_dir)
+        self.tmp_dir.cleanup()
+        self.server.shutdown()
+        self.server.server_close()
+
+class KeepAliveServer(object):
+    """a local HTTP/1.1 server which records the client port of each request, optionally closing each connection
+    after a response without telling the client and delaying each response"""
+
+    def __init__(self,drop_connections=False,delay=0):
+        self.ports = []
+        ports = self.ports
+
+        class KeepAliveHandler(BaseHTTPRequestHandler):
+
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                ports.append(self.client_address[1])
+                time.sleep(delay)
+                content = self.path.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Length",str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+                self.close_connection = drop_connections
+
+            def log_message(self,format,*args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1",0),KeepAliveHandler)
+        self.url = "http://127.0.0.1:%d" % self.server.server_port
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever,daemon=True).start()
+        return self
+
+    def __exit__(self,*args):
+        self.server.shutdown()
+        self.server.server_close()
 
 class TestWMTS(unittest.TestCase):
 
+    bounds = ((166.509144322, -46.641235447), (178.517093541, -34.4506617165))
+
     def test_basic(self):
         d = Diagram(fill="white")
 
-        bounds = ((166.509144322, -46.641235447), (178.517093541, -34.4506617165))
-
-        m = Map(512, bounds)
+        m = Map(512, TestWMTS.bounds)
         m.add(WMTS())
 
         # add marker for Christchurch
@@ -43,5 +146,137 @@ class TestWMTS(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_wmts")
 
+    def test_local_server(self):
+        with TileServer(os.path.join(os.path.split(__file__)[0],"..","common","up.png"),fail_first=True) as server:
+            HttpCache.resetStats()
+            for suffix in ["","_cached"]:
+                d = Diagram(fill="white")
+                m = Map(512, TestWMTS.bounds, zoom_to=2)
+                m.add(WMTS(url=server.url))
+                d.add(Box(m))
+                TestUtils.draw_output(d,"test_wmts_local_server"+suffix)
+            paths = set(server.requests)
+            self.assertTrue(len(paths) > 0)
+            self.assertEqual(len(server.requests),2*len(paths))
+            # tiles are downloaded once, later renders are served from the cache
+            stats = HttpCache.getStats()
+            self.assertEqual(stats["misses"],len(paths))
+            self.assertTrue(stats["memory_hits"]+stats["disk_hits"] > 0)
+
+    def test_mosaic(self):
+        with TileServer(os.path.join(os.path.split(__file__)[0],"osm_tile_6_62_40.png")) as server:
+            d = Diagram(fill="white")
+            m = Map(512, TestWMTS.bounds, zoom_to=4)
+            wmts = WMTS(url=server.url,mosaic=True)
+            m.add(wmts)
+            d.add(Box(m))
+            TestUtils.draw_output(d,"test_wmts_mosaic")
+            with open(os.path.join(os.path.split(__file__)[0],"osm_tile_6_62_40.png"),"rb") as f:
+                (_,_,tile_pixels) = PngReader.decode(f.read())
+            for zoom in [1,2,4]:
+                self.assertIsNotNone(wmts.content[zoom]["mosaic"])
+                # every tile is the same image, so each mosaic pixel should match the tile pixel at the crop offset
+                (x0,y0,width,height,content) = wmts.content[zoom]["mosaic"]
+                (decoded_width,decoded_height,pixels) = PngReader.decode(content)
+                self.assertEqual((decoded_width,decoded_height),(width,height))
+                for y in range(0,height,37):
+                    for x in range(0,width,41):
+                        offset = (y*width+x)*4
+                        tile_offset = (((y0+y)%256)*256+(x0+x)%256)*4
+                        self.assertEqual(pixels[offset:offset+4],tile_pixels[tile_offset:tile_offset+4])
+
+    def test_fetch_concurrent(self):
+        path = os.path.join(os.path.split(__file__)[0],"..","common","up.png")
+        with open(path,"rb") as f:
+            tile = f.read()
+        with TileServer(path,delay=0.2) as server:
+            # pick urls whose cache entries share a lock file, their downloads should still overlap
+            urls = []
+            lock_name = None
+            x = 0
+            while len(urls) < 4:
+                url = server.url.format(z=0,x=x,y=0)
+                name = HttpCache.getLockName(HttpCache.getCachePath(url)[0])
+                if lock_name is None:
+                    lock_name = name
+                if name == lock_name:
+                    urls.append(url)
+                x += 1
+            results = HttpCache.fetchAll(urls,max_workers=4,max_workers_per_host=4)
+            self.assertEqual(list(results.values()),[tile]*4)
+            self.assertTrue(server.max_in_flight > 1)
+
+            # expired entries are revalidated with the ETag sent by the server
+            HttpCache.resetStats()
+            url = server.url.format(z=1,x=0,y=0)
+            for _ in range(3):
+                self.assertEqual(HttpCache.fetch(url,metered=False,ttl=0),tile)
+                HttpCache.clearMemory()
+            stats = HttpCache.getStats()
+            self.assertEqual(stats["misses"],1)
+            self.assertEqual(stats["revalidations"],2)
+
+    def test_connection_pool(self):
+        # requests to a host reuse a single keep-alive connection
+        with KeepAliveServer() as server:
+            pool = ConnectionPool()
+            pool.proxies = {}
+            for i in range(5):
+                (content,_) = pool.request(server.url+"/%d" % i)
+                self.assertEqual(content,b"/%d" % i)
+            self.assertEqual(len(server.ports),5)
+            self.assertEqual(len(set(server.ports)),1)
+            pool.close()
+
+        # a new connection is made when the server has closed the idle connection
+        with KeepAliveServer(drop_connections=True) as server:
+            pool = ConnectionPool()
+            pool.proxies = {}
+            for i in range(3):
+                time.sleep(0.1)
+                (content,_) = pool.request(server.url+"/%d" % i)
+                self.assertEqual(content,b"/%d" % i)
+            self.assertEqual(len(set(server.ports)),3)
+            pool.close()
+
+        # no more than max_idle_per_host connections are kept open for each host
+        with KeepAliveServer(delay=0.2) as server1, KeepAliveServer(delay=0.2) as server2:
+            pool = ConnectionPool(max_idle_per_host=2)
+            pool.proxies = {}
+            threads = [threading.Thread(target=pool.request,args=(server.url+"/%d" % i,))
+                       for server in [server1,server2] for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(set(server1.ports)),4)
+            self.assertEqual(sorted(len(connections) for connections in pool.idle.values()),[2,2])
+            for i in range(4):
+                pool.request(server1.url+"/%d" % i)
+            self.assertEqual(len(set(server1.ports)),4)
+            pool.close()
+
+    def test_connection_pool_context(self):
+        # https connections are pooled separately for each SSL context
+        ctx1 = ssl.create_default_context()
+        ctx2 = ssl.create_default_context()
+        key1 = ConnectionPool.getPoolKey("https://example.com/a",ctx1)
+        self.assertEqual(ConnectionPool.getPoolKey("https://example.com/b",ctx1),key1)
+        self.assertEqual(len(set([key1,ConnectionPool.getPoolKey("https://example.com/a",ctx2),
+                                  ConnectionPool.getPoolKey("https://example.com/a",None)])),3)
+        self.assertEqual(ConnectionPool.getPoolKey("http://example.com/a",ctx1),ConnectionPool.getPoolKey("http://example.com/a",None))
+
+        pool = ConnectionPool()
+        (conn1,reused) = pool.acquire(key1,5,ctx1)
+        self.assertFalse(reused)
+        pool.release(key1,conn1)
+        key2 = ConnectionPool.getPoolKey("https://example.com/a",ctx2)
+        (conn2,reused) = pool.acquire(key2,5,ctx2)
+        self.assertFalse(reused)
+        self.assertIsNot(conn2,conn1)
+        self.assertIs(conn2._context,ctx2)
+        self.assertEqual(pool.acquire(key1,5,ctx1),(conn1,True))
+        pool.close()
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+#    visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import unittest
+
+from visigoth.utils.data import Dataset
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+class TestDataset(unittest.TestCase):
+
+    rows = [["a",1,2.5],["b",None,1.0],["c",3,None],["a",4,0.5],["d",None,None]]
+
+    columns = {"name":["a","b","c","a","d"],"x":[1,None,3,4,None],"y":[2.5,1.0,None,0.5,None]}
+
+    def check_filters(self,ds,name,x):
+        def names(*filters):
+            return ds.query([name],filters=list(filters),flatten=True)
+
+        # None never passes an ordering comparison, but is not equal to any other value
+        self.assertEqual(names(Dataset.filter(x,">",1)),["c","a"])
+        self.assertEqual(names(Dataset.filter(x,"<=",3)),["a","c"])
+        self.assertEqual(names(Dataset.filter(x,"!=",1)),["b","c","a","d"])
+        self.assertEqual(names(Dataset.filter(x,"!=",None)),["a","c","a"])
+        self.assertEqual(names(Dataset.filter(x,"=",None)),["b","d"])
+
+        self.assertEqual(names(Dataset.range(x,2,4)),["c","a"])
+        self.assertEqual(names(Dataset.range(x,min_value=3)),["c","a"])
+        self.assertEqual(names(Dataset.range(x,max_value=3)),["a","c"])
+
+        self.assertEqual(names(Dataset.filter(name,"in",["a","d"])),["a","a","d"])
+        self.assertEqual(names(Dataset.filter(name,"not in",["a","d"])),["b","c"])
+        self.assertEqual(names(Dataset.filter(x,"in",[None,3])),["b","c","d"])
+
+        self.assertEqual(names(Dataset.predicate(x,lambda v:v is None or v % 2 == 0)),["b","a","d"])
+
+        # filters are combined
+        self.assertEqual(names(Dataset.filter(name,"=","a"),Dataset.filter(x,">",1)),["a"])
+        self.assertEqual(ds.query([name,x],filters=[Dataset.filter(name,"=","a")]),[("a",1),("a",4)])
+        self.assertEqual(ds.query([name],aggregations=[Dataset.sum(x),Dataset.count_none(x)],filters=[Dataset.filter(x,"!=",3)]),
+                         [("a",5,0),("b",0,1),("d",0,1)])
+
+    def test_filters(self):
+        self.check_filters(Dataset(TestDataset.rows),0,1)
+        self.check_filters(Dataset([dict(zip(["name","x","y"],row)) for row in TestDataset.rows]),"name","x")
+        self.check_filters(Dataset(TestDataset.columns),"name","x")
+
+    def test_unhashable(self):
+        ds = Dataset([[[1],"d"],[[2],"e"],[3,"f"]])
+        self.assertEqual(ds.query([1],filters=[Dataset.filter(0,"in",[[1],3])],flatten=True),["d","f"])
+        self.assertEqual(ds.query([1],filters=[Dataset.filter(0,"not in",[3])],flatten=True),["d","e"])
+        self.assertEqual(ds.query([1],filters=[Dataset.filter(0,"in",[[2]])],flatten=True),["e"])
+
+    def test_columns(self):
+        ds = Dataset(TestDataset.columns)
+        self.assertEqual(len(ds),5)
+        self.assertEqual(ds.getColumns(),["name","x","y"])
+        # columns may also be referred to by position
+        self.assertEqual(ds.query([0,2],filters=[Dataset.filter(1,"=",4)]),[("a",0.5)])
+        self.assertEqual(ds.query(["name"],unique=True,flatten=True),["a","b","c","d"])
+        self.assertEqual(ds.query(["name"],aggregations=[Dataset.count(),Dataset.max("x")]),
+                         [("a",2,4),("b",1,None),("c",1,3),("d",1,None)])
+        self.assertTrue(ds.isDiscrete("name"))
+        self.assertFalse(ds.isDiscrete("y"))
+
+        # shorter columns are padded with None
+        ragged = Dataset({"name":["a","b","c"],"x":[1]})
+        self.assertEqual(len(ragged),3)
+        self.assertEqual(ragged.query(["name","x"]),[("a",1),("b",None),("c",None)])
+        self.assertEqual(ragged.query(["name"],filters=[Dataset.filter("x","!=",1)],flatten=True),["b","c"])
+        self.assertEqual(ragged.query(["missing"],unique=True),[(None,)])
+
+    @unittest.skipIf(pandas is None,"pandas is not installed")
+    def test_pandas(self):
+        ds = Dataset(pandas.DataFrame({"name":["a","b","c","a"],"x":[1,2,3,4]}))
+        self.assertEqual(ds.query(["name"],aggregations=[Dataset.sum("x")]),[("a",5),("b",2),("c",3)])
+
+    @unittest.skipIf(pyarrow is None,"pyarrow is not installed")
+    def test_pyarrow(self):
+        ds = Dataset(pyarrow.table({"name":["a","b","c","a"],"x":[1,2,None,4]}))
+        self.assertEqual(ds.query(["name"],aggregations=[Dataset.sum("x")]),[("a",5),("b",2),("c",0)])
+        self.assertEqual(ds.query(["name"],filters=[Dataset.filter("x","!=",2)],flatten=True),["a","c","a"])
+
+if __name__ == "__main__":
+    unittest.main()
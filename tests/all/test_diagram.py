@@ -19,12 +19,17 @@
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import unittest
+import os.path
+import io
+import re
 
 from visigoth import Diagram
+from visigoth.svg.svgdoc import svgdoc
 from visigoth.utils.test_utils import TestUtils
 from visigoth.containers.box import Box
 from visigoth.containers.map import Map
 from visigoth.common.text import Text
+from visigoth.common.image import Image
 from visigoth.containers.sequence import Sequence
 
 from visigoth.map_layers.wms import WMS
@@ -60,6 +65,40 @@ class TestDiagram(unittest.TestCase):
 
         TestUtils.draw_output(d,"test_diagram")
 
+    @staticmethod
+    def normaliseIds(text):
+        # element ids are allocated from global counters and so differ between draws,
+        # replace them by their order of first appearance
+        ids = {}
+        return re.sub(r"\b(diagelem|s|style_|cp_|lg_|ct)\d+\b",lambda m:ids.setdefault(m.group(0),"id%d" % len(ids)),text)
+
+    def test_stream(self):
+        d = Diagram(fill="white")
+        d.add(Box(Text("Streamed Diagram",font_height=32),fill="lightblue"))
+        for (format,pretty) in [("html",True),("html",False),("svg",True),("svg",False)]:
+            expected = d.draw(format=format,pretty=pretty)
+            out = io.StringIO()
+            d.draw(format=format,out=out,pretty=pretty)
+            self.assertEqual(TestDiagram.normaliseIds(out.getvalue()),TestDiagram.normaliseIds(expected))
+
+    def test_stream_defs(self):
+        # a document with no definitions should not get an empty defs element
+        doc = svgdoc(Diagram(),100,100,"svg")
+        doc.definitions = []
+        out = io.StringIO()
+        doc.write(out,pretty=False)
+        self.assertNotIn("<defs",out.getvalue())
+
+    def test_draw_to(self):
+        d = Diagram(fill="white")
+        d.add(Box(Text("Diagram Drawn To Binary File",font_height=32),fill="lightblue"))
+        d.add(Image(path_or_url=os.path.join(os.path.split(__file__)[0],"common","up.png")))
+        expected = d.draw(format="html").encode("utf-8")
+        out = io.BytesIO()
+        d.draw_to(out,format="html",chunk_size=1024)
+        self.assertIn(b"data:image/png",out.getvalue())
+        self.assertEqual(TestDiagram.normaliseIds(out.getvalue().decode("utf-8")),TestDiagram.normaliseIds(expected.decode("utf-8")))
+
 if __name__ == '__main__':
     thb = TestDiagram()
     thb.test_basic()
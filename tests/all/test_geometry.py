@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+#    visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import unittest
+
+from visigoth.utils.geometry import Geometry
+
+class TestGeometry(unittest.TestCase):
+
+    @staticmethod
+    def area(ring):
+        return abs(sum(x0*y1-x1*y0 for ((x0,y0),(x1,y1)) in zip(ring,ring[1:]+ring[:1])))/2
+
+    def test_simplify(self):
+        # collinear vertices are removed
+        self.assertEqual(Geometry.simplify([(0,0),(1,0),(2,0),(3,0)],0.1),[(0,0),(3,0)])
+        # vertices further than the tolerance from the simplified line are kept
+        self.assertEqual(Geometry.simplify([(0,0),(1,0),(2,1),(3,0),(4,0)],0.5),[(0,0),(2,1),(4,0)])
+        self.assertEqual(Geometry.simplify([(0,0),(1,0),(2,1),(3,0),(4,0)],0.1),[(0,0),(1,0),(2,1),(3,0),(4,0)])
+        # short lines are returned unchanged
+        self.assertEqual(Geometry.simplify([(0,0),(1,1)],10),[(0,0),(1,1)])
+
+    def test_simplify_closed(self):
+        # the repeated closing point and collinear vertices are removed from rings
+        square = [(0,0),(1,0),(2,0),(2,2),(0,2),(0,0)]
+        self.assertEqual(Geometry.simplify(square,0.1,closed=True),[(0,0),(2,0),(2,2),(0,2)])
+        # a thin ring keeps at least 3 vertices
+        thin = [(0,0),(5,0.01),(10,0),(5,-0.02)]
+        simplified = Geometry.simplify(thin,1,closed=True)
+        self.assertEqual(len(simplified),3)
+        self.assertEqual(simplified,[point for point in thin if point in simplified])
+
+    def test_clip_polygon(self):
+        square = [(2,2),(8,2),(8,8),(2,8)]
+        self.assertEqual(Geometry.clipPolygon(square,0,0,10,10),square)
+        self.assertEqual(Geometry.clipPolygon(square,20,20,30,30),[])
+        self.assertEqual(Geometry.clipPolygon([],0,0,10,10),[])
+
+        # a 4x4 square straddling the middle of each edge keeps half its area, one straddling a corner keeps a quarter
+        for (cx,cy,expected_area) in [(0,5,8),(10,5,8),(5,0,8),(5,10,8),(0,0,4),(10,10,4)]:
+            ring = [(cx-2,cy-2),(cx+2,cy-2),(cx+2,cy+2),(cx-2,cy+2)]
+            clipped = Geometry.clipPolygon(ring,0,0,10,10)
+            self.assertAlmostEqual(TestGeometry.area(clipped),expected_area)
+            for (x,y) in clipped:
+                self.assertTrue(0 <= x <= 10 and 0 <= y <= 10)
+
+        # a ring enclosing the rectangle is clipped to the rectangle
+        clipped = Geometry.clipPolygon([(-5,-5),(15,-5),(15,15),(-5,15)],0,0,10,10)
+        self.assertEqual(sorted(set(clipped)),[(0,0),(0,10),(10,0),(10,10)])
+
+    def test_clip_line(self):
+        self.assertEqual(Geometry.clipLine([(1,1),(5,5),(9,1)],0,0,10,10),[[(1,1),(5,5),(9,1)]])
+        self.assertEqual(Geometry.clipLine([(-5,-5),(-1,-1)],0,0,10,10),[])
+        # a line leaving and re-entering the rectangle is split
+        self.assertEqual(Geometry.clipLine([(5,5),(15,5),(15,8),(5,8)],0,0,10,10),[[(5,5),(10,5)],[(10,8),(5,8)]])
+        # a line crossing the rectangle is clipped at both ends
+        self.assertEqual(Geometry.clipLine([(-10,5),(20,5)],0,0,10,10),[[(0,5),(10,5)]])
+
+    def test_clip_line_boundary(self):
+        # a vertex on the boundary is not repeated
+        self.assertEqual(Geometry.clipLine([(5,-5),(5,0),(5,5)],0,0,10,10),[[(5,0),(5,5)]])
+        # lines which only touch the boundary or a corner are removed
+        self.assertEqual(Geometry.clipLine([(-5,5),(5,-5)],0,0,10,10),[])
+        self.assertEqual(Geometry.clipLine([(5,-5),(5,0),(6,-5)],0,0,10,10),[])
+        # a line leaving through a boundary vertex ends there
+        self.assertEqual(Geometry.clipLine([(5,5),(5,10),(5,15),(6,5)],0,0,10,10),[[(5,5),(5,10)],[(5.5,10),(6,5)]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,6 +20,8 @@
 
 
 import random
+import math
+import operator
 from visigoth.utils.term.progress import Progress
 
 class SelfOrganisingMap(object):
@@ -35,14 +37,16 @@ class SelfOrganisingMap(object):
 
     Keyword Arguments:
         seed(int) : random seed - set to produce repeatable results
+        batch(bool) : use batch training, updating all weights once per iteration from the instances mapped to each cell
     """
 
-    def __init__(self,data, hexgrid, colour_manager, gridwidth, gridheight, iters, seed=None):
+    def __init__(self,data, hexgrid, colour_manager, gridwidth, gridheight, iters, seed=None, batch=False):
         self.hexgrid = hexgrid
         self.colour_manager = colour_manager
         self.gridheight = gridheight
         self.gridwidth = gridwidth
         self.iters = iters
+        self.batch = batch
 
         self.learnRate_initial = 0.5
         self.learnRate_final = 0.05
@@ -52,8 +56,8 @@ class SelfOrganisingMap(object):
             random.seed(self.seed)
 
         self.rng = random.Random()
+        # weights are held as one list per output
         self.weights = []
-        self.oactivations = []
 
         self.neighbour_limit = 0
         self.learnRate = 0
@@ -67,11 +71,12 @@ class SelfOrganisingMap(object):
         self.nrOutputs = self.gridwidth * self.gridheight
         self.nrWeights = self.nrOutputs * self.nrInputs
 
-        for w in range(0,self.nrWeights):
-            self.weights.append((self.rng.random()/5.0)+0.4)
+        for o in range(0,self.nrOutputs):
+            self.weights.append([(self.rng.random()/5.0)+0.4 for w in range(0,self.nrInputs)])
 
-        for oa in range(0,self.nrOutputs):
-            self.oactivations.append(0.0)
+        # grid distances between every pair of outputs (None if further apart than the hexgrid computes)
+        self.grid_distances = None
+        self.neighbourhoods = None
 
     def getGridWidth(self):
         return self.gridwidth
@@ -80,21 +85,44 @@ class SelfOrganisingMap(object):
         return self.gridheight
 
     def getWeights(self,outputIndex):
-        return self.weights[(self.nrInputs * outputIndex):(self.nrInputs * (outputIndex + 1))]
+        return self.weights[outputIndex][:]
+
+    def computeGridDistances(self):
+        if self.grid_distances is None:
+            self.grid_distances = []
+            for winner in range(0,self.nrOutputs):
+                (wx,wy) = self.coords(winner)
+                self.grid_distances.append([self.hexgrid.getDistance(ox,oy,wx,wy) for (ox,oy) in map(self.coords,range(0,self.nrOutputs))])
+        return self.grid_distances
+
+    def getNeighbourhoods(self,limit,include_winner=False):
+        # for each possible winning output, list the outputs within limit of the winner
+        # (like isNeighbour, online training excludes the winner itself)
+        min_distance = 0 if include_winner else 1
+        return [[output for (output,d) in enumerate(row) if d is not None and min_distance <= d <= limit]
+                for row in self.computeGridDistances()]
 
     def train(self):
         p = Progress("SOM")
         progress_frac = 0.0
         p.report("Starting",progress_frac)
         iteration = 0
+        neighbourhoods_by_limit = {}
+        instances = [instance for (label,category,instance) in self.instances]
         while iteration < self.iters:
             self.learnRate = (1.0 - float(iteration) / float(self.iters)) * (self.learnRate_initial - self.learnRate_final) + self.learnRate_final
             self.neighbour_limit = self.initial_neighbourhood - int(
                 (float(iteration) / float((self.iters + 1))) * self.initial_neighbourhood)
             # print("iter=%d (of %d) / learning-rate=%f / neighbourhood=%d"%(iteration,self.iters,self.learnRate,self.neighbour_limit))
-            for (label,category,instance) in self.instances:
-                winner = self.computeActivations(instance)
-                self.updateNetwork(winner,instance)
+            if self.neighbour_limit not in neighbourhoods_by_limit:
+                neighbourhoods_by_limit[self.neighbour_limit] = self.getNeighbourhoods(self.neighbour_limit,include_winner=self.batch)
+            self.neighbourhoods = neighbourhoods_by_limit[self.neighbour_limit]
+            if self.batch:
+                self.updateNetworkBatch(self.computeWinners(instances),instances)
+            else:
+                for instance in instances:
+                    winner = self.computeActivations(instance)
+                    self.updateNetwork(winner,instance)
 
             iteration += 1
             progress_frac = iteration/self.iters
@@ -104,8 +132,8 @@ class SelfOrganisingMap(object):
 
         self.scores = {(xc, yc): [] for xc in range(0, self.gridwidth) for yc in range(0, self.gridheight)}
 
-        for (label, category, instance) in self.instances:
-            winner_coords = self.coords(self.computeActivations(instance))
+        for ((label, category, instance),winner) in zip(self.instances,self.computeWinners(instances)):
+            winner_coords = self.coords(winner)
             colour = ""
             if category and self.colour_manager:
                 colour = self.colour_manager.getColour(category)
@@ -115,31 +143,54 @@ class SelfOrganisingMap(object):
         return self.scores
 
     def computeActivations(self,iactivations):
-        mindistance = None
-        winner = -1
-        # inarr = numpy.array(iactivations)
-        for idx in range(0,self.nrOutputs):
-            self.oactivations[idx] = self.distance(iactivations,self.weights[(self.nrInputs*idx):(self.nrInputs*(idx+1))])
-            # self.oactivations[idx] = numpy.linalg.norm(inarr-numpy.array(self.getWeights(idx)))
-            if winner == -1:
-                mindistance = self.oactivations[idx]
-                winner = idx
-            else:
-                if mindistance > self.oactivations[idx]:
-                    mindistance = self.oactivations[idx]
-                    winner = idx
-        return winner
+        # find the output whose weights are closest to the input (the first such output if there are ties)
+        distances = [SelfOrganisingMap.distanceSq(iactivations,weights) for weights in self.weights]
+        return distances.index(min(distances))
+
+    def computeWinners(self,instances):
+        # find the winning output for each of a batch of instances, against the current weights
+        weights = self.weights
+        distanceSq = SelfOrganisingMap.distanceSq
+        winners = []
+        for instance in instances:
+            distances = [distanceSq(instance,output_weights) for output_weights in weights]
+            winners.append(distances.index(min(distances)))
+        return winners
+
+    @staticmethod
+    def distanceSq(v1,v2):
+        # squared euclidean distance is sufficient for finding the closest output
+        return sum((a-b)*(a-b) for (a,b) in zip(v1,v2))
 
     def updateNetwork(self,winner,iactivations):
-        for idx in range(0,self.nrOutputs):
-            if self.isNeighbour(idx,winner):
-                self.adjustWeights(idx,iactivations)
-
-    def isNeighbour(self,output,winner):
-        (ox,oy) = self.coords(output)
-        (wx,wy) = self.coords(winner)
-        neighbour_distance = self.hexgrid.getDistance(ox,oy,wx,wy)
-        return neighbour_distance and neighbour_distance <= self.neighbour_limit
+        for idx in self.neighbourhoods[winner]:
+            self.adjustWeights(idx,iactivations)
+
+    def updateNetworkBatch(self,winners,instances):
+        # sum the instances won by each output...
+        sums = [None]*self.nrOutputs
+        counts = [0]*self.nrOutputs
+        for (winner,instance) in zip(winners,instances):
+            if sums[winner] is None:
+                sums[winner] = list(instance)
+            else:
+                sums[winner] = list(map(operator.add,sums[winner],instance))
+            counts[winner] += 1
+
+        # ...then set each output's weights to the mean of the instances won by outputs in its neighbourhood
+        new_weights = []
+        for output in range(0,self.nrOutputs):
+            total = None
+            count = 0
+            for neighbour in self.neighbourhoods[output]:
+                if counts[neighbour]:
+                    total = sums[neighbour] if total is None else list(map(operator.add,total,sums[neighbour]))
+                    count += counts[neighbour]
+            if count:
+                new_weights.append([t/count for t in total])
+            else:
+                new_weights.append(self.weights[output])
+        self.weights = new_weights
 
     def coords(self,output):
         return (output % self.gridwidth, output // self.gridwidth)
@@ -148,25 +199,8 @@ class SelfOrganisingMap(object):
         return x + (y*self.gridwidth)
 
     def getDimensionValue(self,dimensionFn,x,y):
-        output = self.getOutput(x,y)
-        pos = (output*self.nrInputs)
-        cellweights = self.weights[pos:pos+self.nrInputs]
-        return dimensionFn(cellweights)
-
-    def distance(self,array1,array2):
-        total = 0.0
-        for idx in range(0,len(array1)):
-            dist = array1[idx]-array2[idx]
-            total += (dist*dist)
-        return total
+        return dimensionFn(self.getWeights(self.getOutput(x,y)))
 
     def adjustWeights(self,output,iactivations):
-        for idx in range(0,self.nrInputs):
-            wpos = (output*self.nrInputs)+idx
-            w = self.weights[wpos]
-            i = iactivations[idx]
-            w = w + (self.learnRate * (i - w))
-            self.weights[wpos] = w
-
-
-
+        learnRate = self.learnRate
+        self.weights[output] = [w + (learnRate * (i - w)) for (w,i) in zip(self.weights[output],iactivations)]
@@ -55,9 +55,10 @@ class SOM(ChartElement):
         seed(int): random seed
         dimension(lambda): lambda to compute the dimension (from the values vector) value
         dimensionPalette(ContinuousColourManager): a colour_manager to map dimension values to colours
+        batch(bool): train the SOM in batch mode, which is much faster for large data sets
     """
 
-    def __init__(self,data, width, label=0, colour=1, dimensions=2, gridwidth=10, gridheight=10, iters=100, colour_manager=None, marker_manager=None, trainedSom=None, seed=None, dimension=None, dimensionPalette=None):
+    def __init__(self,data, width, label=0, colour=1, dimensions=2, gridwidth=10, gridheight=10, iters=100, colour_manager=None, marker_manager=None, trainedSom=None, seed=None, dimension=None, dimensionPalette=None, batch=False):
         super(SOM, self).__init__()
         self.width = width
         dataset = Dataset(data)
@@ -86,6 +87,7 @@ class SOM(ChartElement):
         self.seed = seed
         if self.seed != None:
             random.seed(self.seed)
+        self.batch = batch
 
         self.built = False
 
@@ -108,7 +110,7 @@ class SOM(ChartElement):
             self.som_trained = True
         else:
             self.som_trained = False
-            self.som = SelfOrganisingMap(self.data, self.hexgrid, self.colour_manager, self.gridwidth, self.gridheight, self.iters, seed=self.seed)
+            self.som = SelfOrganisingMap(self.data, self.hexgrid, self.colour_manager, self.gridwidth, self.gridheight, self.iters, seed=self.seed, batch=self.batch)
         self.hexgrid.setModel(self.som)
         self.plot = None
 
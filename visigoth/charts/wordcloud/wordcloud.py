@@ -20,7 +20,7 @@
 
 import random
 from visigoth.charts import ChartElement
-from math import radians,sin,cos,pi,sqrt
+from math import radians,sin,cos,pi,sqrt,floor
 import sys
 
 # import numpy
@@ -67,6 +67,8 @@ class WordCloud(ChartElement):
         for (_,cat,_) in self.data:
             colour_manager.allocateColour(cat)
         self.plots = []
+        self.index = {} # (col,row) => list of plots overlapping the grid cell
+        self.cell_size = None
         self.renders = []
         self.text_attributes = text_attributes
         self.flip_fraction = flip_fraction
@@ -95,6 +97,9 @@ class WordCloud(ChartElement):
 
         rng = random.Random(self.seed)
 
+        # index placed words in a grid with cells around twice the size of an average word
+        self.cell_size = 2*sqrt(self.width*self.height*0.5/max(len(self.data),1))
+
         for (word,cat,v) in sorted(self.data,key=lambda x:x[2],reverse=True):
             counter += 1
             frac = v/self.total
@@ -114,6 +119,7 @@ class WordCloud(ChartElement):
 
             pos = self.positions.get(flip,0)
 
+            blocker = None
             while True:
                 pos += 1
                 coords = self.spiral(pos,sx,sy)
@@ -123,8 +129,13 @@ class WordCloud(ChartElement):
 
                 x = x-w/2
                 y = y-h/2
-                if not self.intersects(x,y,w,h):
-                    self.plots.append((x,y,w,h))
+                # successive spiral positions are close together, so skip quickly past
+                # positions where the word still overlaps the last word it collided with
+                if blocker and WordCloud.overlaps((x,y,w,h),blocker):
+                    continue
+                blocker = self.findIntersecting(x,y,w,h)
+                if not blocker:
+                    self.addPlot(x,y,w,h)
                     self.renders.append((word,w,h,cat,x,y,flip))
                     self.positions[flip] = pos
                     break
@@ -203,10 +214,31 @@ class WordCloud(ChartElement):
             return None
         return (cx+r*sin(angle),cy+r*cos(angle))
 
-    def intersects(self,x1,y1,w1,h1):
-        for area in self.plots:
-            (x2,y2,w2,h2) = area
-            if not (x1 > x2+w2 or x1+w1 < x2 or y1 > y2+h2 or y1+h1 < y2):
-                return True
-        return False
-
+    def cells(self,x,y,w,h):
+        # list the grid cells overlapped by a rectangle, including cells it only touches
+        cs = self.cell_size
+        return [(col,row) for col in range(floor(x/cs),floor((x+w)/cs)+1) for row in range(floor(y/cs),floor((y+h)/cs)+1)]
+
+    def addPlot(self,x,y,w,h):
+        area = (x,y,w,h)
+        self.plots.append(area)
+        for cell in self.cells(x,y,w,h):
+            if cell in self.index:
+                self.index[cell].append(area)
+            else:
+                self.index[cell] = [area]
+
+    @staticmethod
+    def overlaps(area1,area2):
+        (x1,y1,w1,h1) = area1
+        (x2,y2,w2,h2) = area2
+        return not (x1 > x2+w2 or x1+w1 < x2 or y1 > y2+h2 or y1+h1 < y2)
+
+    def findIntersecting(self,x1,y1,w1,h1):
+        # return a placed area intersecting the rectangle, or None
+        area1 = (x1,y1,w1,h1)
+        for cell in self.cells(x1,y1,w1,h1):
+            for area2 in self.index.get(cell,()):
+                if WordCloud.overlaps(area1,area2):
+                    return area2
+        return None
@@ -17,7 +17,6 @@
 #   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
 #   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-import base64
 import csv
 from io import StringIO, BytesIO
 import zipfile
@@ -25,7 +24,7 @@ import os
 
 from visigoth.common.diagram_element import DiagramElement
 from visigoth.utils.fonts.fontmanager import FontManager
-from visigoth.svg import text
+from visigoth.svg import text, datauri
 
 from visigoth.utils.data.dataset import Dataset
 
@@ -105,7 +104,7 @@ class EmbeddedData(DiagramElement):
             binary_content = zf.getvalue()
             filename = os.path.splitext(self.filename)[0]+".zip"
             mime_type = "application/zip"
-        url = "data:"+mime_type+";base64,"+base64.b64encode(binary_content).decode("utf-8")
+        url = datauri(mime_type,content_bytes=binary_content,charset=None)
         width1 = FontManager.getTextLength(self.text_attributes, self.text, self.font_height)
         ts = text(ox+width1/2, cy, self.text, font_height=self.font_height, text_attributes=self.text_attributes)
         ts.setVerticalCenter()
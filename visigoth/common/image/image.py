@@ -18,10 +18,9 @@
 #   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-from visigoth.svg import image, embedded_svg
+from visigoth.svg import image, embedded_svg, datauri
 from visigoth.common.diagram_element import DiagramElement
 from visigoth.utils.httpcache import HttpCache
-import base64
 import struct
 
 class Image(DiagramElement):
@@ -133,7 +132,7 @@ class Image(DiagramElement):
         elif self.mime_type=="image/svg+xml":
             i = embedded_svg(self.width,self.height,ox,oy,str(self.content_bytes,"utf-8"))
         else:
-            uri="data:"+self.mime_type+";charset=US-ASCII;base64,"+str(base64.b64encode(self.content_bytes),"utf-8")
+            uri = datauri(self.mime_type,content_bytes=self.content_bytes)
             i = image(ox,oy,self.width,self.height,uri,tooltip=self.tooltip)
         image_id = i.getId()
         d.add(i)
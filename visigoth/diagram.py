@@ -20,11 +20,13 @@
 
 import os.path
 import os
+import io
 
 import visigoth
 from visigoth.svg import svgdoc,rectangle
 from visigoth.utils.js import Js
 from visigoth.svg import css_snippet
+from visigoth.svg.svgwriter import chunked_output
 from visigoth.common.text import Text, Span
 from visigoth.utils.fonts import FontManager
 from visigoth.containers.sequence import Sequence
@@ -209,7 +211,7 @@ class Diagram:
     def __repr_svg__(self):
         return self.draw()
 
-    def draw(self,format="html",html_title="",include_footer=True):
+    def draw(self,format="html",html_title="",include_footer=True,out=None,pretty=True):
         """
         Draw the diagram to create an SVG or HTML document
 
@@ -217,11 +219,50 @@ class Diagram:
             format(str): the format of the output file, either "svg" or "html"
             html_title(str): the title for the document valid for format="html"
             include_footer(bool): whether to include a footer with project/github repo links
+            out(file): a text stream to which the document is written as it is generated
+            pretty(bool): whether to indent the output document
 
         Returns:
-            a string containing the document in the requested format
+            a string containing the document in the requested format, or None if out is specified
+
+        Notes:
+            when out is specified, or pretty is False, the document is serialized directly from the diagram's
+            elements instead of via an intermediate XML DOM, which is faster and uses much less memory
+        """
+        d = self.buildDocument(format,html_title,include_footer)
+        if out is not None:
+            d.write(out,pretty)
+            return None
+        if not pretty:
+            out = io.StringIO()
+            d.write(out,pretty)
+            return out.getvalue()
+        return d.render()
+
+    def draw_to(self,fileobj,format="html",html_title="",include_footer=True,pretty=True,chunk_size=65536):
         """
+        Draw the diagram, writing the SVG or HTML document incrementally to a file object
 
+        Arguments:
+            fileobj(file): a text or binary file object (or any object with a write method accepting bytes)
+
+        Keyword Arguments:
+            format(str): the format of the output file, either "svg" or "html"
+            html_title(str): the title for the document valid for format="html"
+            include_footer(bool): whether to include a footer with project/github repo links
+            pretty(bool): whether to indent the output document
+            chunk_size(int): approximate size of each write made to fileobj
+
+        Notes:
+            binary file objects receive UTF-8 encoded output.  Embedded images and fonts are base64 encoded
+            as they are written so that the complete document is never held in memory, for example when
+            sending the output directly to an HTTP response
+        """
+        out = chunked_output(fileobj,chunk_size)
+        self.draw(format=format,html_title=html_title,include_footer=include_footer,out=out,pretty=pretty)
+        out.flush()
+
+    def buildDocument(self,format,html_title,include_footer):
         if include_footer:
             footer = self.generateFooter()
             self.content.add(footer)
@@ -261,5 +302,4 @@ class Diagram:
 
         if include_footer:
             self.content.remove(footer)
-        return d.render()
-
+        return d
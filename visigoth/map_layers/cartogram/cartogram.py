@@ -19,8 +19,7 @@
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 
-from math import sqrt
-import copy
+from math import sqrt, floor
 import os.path
 import random
 
@@ -125,22 +124,50 @@ class Cartogram(MapLayer):
             return None
         return d
 
+    @staticmethod
+    def buildIndex(xs,ys,cell_size):
+        index = {}
+        for i in range(len(xs)):
+            key = (floor(xs[i]/cell_size),floor(ys[i]/cell_size))
+            if key in index:
+                index[key].append(i)
+            else:
+                index[key] = [i]
+        return index
+
+    # return the sorted ids of points in the given cell and its eight surrounding cells
+    @staticmethod
+    def getNeighbours(index,col,row):
+        neighbours = []
+        for key in ((col+dc,row+dr) for dc in (-1,0,1) for dr in (-1,0,1)):
+            neighbours += index.get(key,())
+        neighbours.sort()
+        return neighbours
+
     def build(self,fmt):
         if self.built:
             return
 
+        # positions, original positions and radii are held in parallel lists indexed by plot id
+        xs = []
+        ys = []
+        rs = []
         for (lon,lat,colour,label,size) in self.data:
             r = self.getMarkerManager().getRadius(size)
             (x,y) = self.projection.fromLonLat((lon,lat))
-            self.plots.append({"x":x,"y":y,"ox":x,"oy":y,"fx":0,"fy":0,"label":label,"cat":colour,"r":r})
-
-        for i in range(0,len(self.plots)):
-            self.plots[i]["id"] = i
+            xs.append(x)
+            ys.append(y)
+            rs.append(r)
+        oxs = xs[:]
+        oys = ys[:]
+        n = len(xs)
+        fxs = [0]*n
+        fys = [0]*n
 
         self.built = True
-        distance = lambda x1,y1,x2,y2: sqrt((x1-x2)**2+(y1-y2)**2)
 
-        best_plots = None
+        best_xs = None
+        best_ys = None
         best_error = None
 
         rng = random.Random(0)
@@ -148,6 +175,11 @@ class Cartogram(MapLayer):
         progress = Progress("cartogram")
         progress.report("building", 0)
 
+        # only points in the same or adjacent grid cells can overlap
+        cell_size = (2*max(rs) / self.scale_x) if n else 1
+        if not cell_size:
+            cell_size = 1
+
         for iter in range(self.iterations):
 
             # gradually increase the force attracting each point to its original position...
@@ -159,14 +191,15 @@ class Cartogram(MapLayer):
             # print(f1,f2)
             overlaps = 0
             error = 0
-            for plot in self.plots:
-                ox = plot["ox"]
-                oy = plot["oy"]
-                nx = plot["x"]
-                ny = plot["y"]
-                nr = plot["r"]
+            index = Cartogram.buildIndex(xs,ys,cell_size)
+            for i in range(n):
+                ox = oxs[i]
+                oy = oys[i]
+                nx = xs[i]
+                ny = ys[i]
+                nr = rs[i]
 
-                d = distance(nx,ny,ox,oy)
+                d = sqrt((nx-ox)**2+(ny-oy)**2)
 
                 # compute the forces on this point, fx and fy
                 fx = 0
@@ -179,11 +212,17 @@ class Cartogram(MapLayer):
                     error += d
 
                 # next, repel the point from any overlapping points
-                for otherplot in self.plots:
-                    if plot["id"] != otherplot["id"]:
-                        opx = otherplot["x"]
-                        opy = otherplot["y"]
-                        onr = otherplot["r"]
+                col = floor(nx/cell_size)
+                row = floor(ny/cell_size)
+                neighbours = Cartogram.getNeighbours(index,col,row)
+                k = 0
+                while k < len(neighbours):
+                    j = neighbours[k]
+                    k += 1
+                    if i != j:
+                        opx = xs[j]
+                        opy = ys[j]
+                        onr = rs[j]
                         overlap_radius = (onr+nr) / self.scale_x
 
                         if nx == opx and ny == opy:
@@ -194,6 +233,13 @@ class Cartogram(MapLayer):
                                 nudge = 0.001
                             nx += nudge*rng.random()-nudge*0.5
                             ny += nudge*rng.random()-nudge*0.5
+                            # re-bucket the nudged point, adding any unvisited neighbours of its new cell
+                            if floor(nx/cell_size) != col or floor(ny/cell_size) != row:
+                                col = floor(nx/cell_size)
+                                row = floor(ny/cell_size)
+                                remaining = set(neighbours[k:])
+                                remaining.update(o for o in Cartogram.getNeighbours(index,col,row) if o > j)
+                                neighbours = neighbours[:k] + sorted(remaining)
                         d = self.distance_lteq(nx,ny,opx,opy,overlap_radius)
                         if d != None:
                             fac = -1*f2*(d-overlap_radius)/overlap_radius
@@ -201,20 +247,18 @@ class Cartogram(MapLayer):
                             fy += (ny-opy)*fac
                             overlaps += 1
 
-                plot["fx"] = fx
-                plot["fy"] = fy
+                fxs[i] = fx
+                fys[i] = fy
 
             if overlaps < 3 and (best_error == None or error < best_error):
                 best_error = error
-                best_plots = copy.deepcopy(self.plots)
+                best_xs = xs[:]
+                best_ys = ys[:]
 
-            for plot in self.plots:
-                d = plot["r"] / self.scale_x
-                x = plot["x"]
-                y = plot["y"]
-
-                x = x + plot["fx"]
-                y = y + plot["fy"]
+            for i in range(n):
+                d = rs[i] / self.scale_x
+                x = xs[i] + fxs[i]
+                y = ys[i] + fys[i]
                 # ensure the point is completely visible
                 # ...stop the point from going out of the plot boundaries
                 if x - d < self.x0:
@@ -225,13 +269,18 @@ class Cartogram(MapLayer):
                     y = self.y0 + d
                 if y + d > self.y1:
                     y = self.y1 - d
-                plot["x"] = x
-                plot["y"] = y
+                xs[i] = x
+                ys[i] = y
 
             progress.report("building",(iter+1)/self.iterations)
 
-        if best_plots:
-            self.plots = best_plots
+        if best_xs:
+            xs = best_xs
+            ys = best_ys
+
+        for i in range(n):
+            (_,_,colour,label,_) = self.data[i]
+            self.plots.append({"x":xs[i],"y":ys[i],"ox":oxs[i],"oy":oys[i],"fx":fxs[i],"fy":fys[i],"label":label,"cat":colour,"r":rs[i],"id":i})
 
         progress.complete("complete")
 
@@ -39,13 +39,14 @@ class Choropleth(Geoimport):
         colour_manager(DiscreteColourManager|ContinuousColourManager) : a DiscreteColourManager|ContinuousColourManager object for mapping values to colours
         stroke (str): stroke color
         stroke_width (int): stroke width
+        filter_box (tuple): (min_lon,min_lat,max_lon,max_lat) only import features with at least one point inside this box
 
     Notes:
 
     """
 
-    def __init__(self, path, valueNameOrFn, labelNameOrFn=None, colour_manager=None, stroke="black",stroke_width=2):
-        super().__init__(path,polygon_style=lambda props:self.getPolygonStyle(props))
+    def __init__(self, path, valueNameOrFn, labelNameOrFn=None, colour_manager=None, stroke="black",stroke_width=2, filter_box=None):
+        super().__init__(path,polygon_style=lambda props:self.getPolygonStyle(props),filter_box=filter_box)
         self.path = path
         self.valueNameOrFn = valueNameOrFn
         self.labelNameOrFn = labelNameOrFn
@@ -90,30 +90,20 @@ class ColourGrid(MapLayer):
         g_data = []
         b_data = []
         a_data = []
-        for row_idx in range(len(self.data)):
-            row = self.data[row_idx]
-            r_row = []
-            g_row = []
-            b_row = []
-            a_row = []
-            for col_idx in range(len(row)):
-                value = row[col_idx]
-                col = self.colour_manager.getColour(value)
-                if col == "red":
-                    print("red?")
-                # col should be a hex encoded string, either #RRGGBBAA or #RRGGBB
-                r = int(col[1:3], 16)
-                g = int(col[3:5], 16)
-                b = int(col[5:7], 16)
-                a = 255 if len(col) == 7 else int(col[7:9], 16)
-                r_row.append(r)
-                g_row.append(g)
-                b_row.append(b)
-                a_row.append(a)
-            r_data.append(r_row)
-            g_data.append(g_row)
-            b_data.append(b_row)
-            a_data.append(a_row)
+        # decode each distinct colour only once
+        rgba_lookup = {}
+        for row in self.data:
+            colours = [self.colour_manager.getColour(value) for value in row]
+            for col in colours:
+                if col not in rgba_lookup:
+                    # col should be a hex encoded string, either #RRGGBBAA or #RRGGBB
+                    rgba_lookup[col] = bytes([int(col[1:3], 16),int(col[3:5], 16),int(col[5:7], 16),
+                                              255 if len(col) == 7 else int(col[7:9], 16)])
+            rgba = b"".join(map(rgba_lookup.__getitem__,colours))
+            r_data.append(rgba[0::4])
+            g_data.append(rgba[1::4])
+            b_data.append(rgba[2::4])
+            a_data.append(rgba[3::4])
         self.imagegrid.update_data(r=r_data,g=g_data,b=b_data,a=a_data)
         return self.imagegrid.draw(doc,cx,cy)
 
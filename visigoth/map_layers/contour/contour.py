@@ -20,6 +20,7 @@
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import math
+import bisect
 from urllib import request
 import os
 import os.path
@@ -75,6 +76,7 @@ class Contour(MapLayer):
         self.text_attributes = text_attributes
         self.clip = True
         self.boundaries = None
+        self.padded_data = None
 
     CONTOUR_INTERVAL_ERROR = "contour_interval parameter must be a positive number > 0"
     INPUT_DATA_FORMAT_ERROR = "data parameter must be a non-empty list of equally sized non-empty lists containing elevation values"
@@ -102,32 +104,70 @@ class Contour(MapLayer):
         index = sw | (se << 1) | (ne << 2) | (nw << 3)
         return index
 
+    # line segments (x1,y1,x2,y2) crossing a cell, relative to the cell's north west corner, for each cell index
+    cell_segments = {
+        0: [], 15: [],
+        1: [(0,0.5,0.5,1)], 14: [(0,0.5,0.5,1)],
+        2: [(0.5,1,1,0.5)], 13: [(0.5,1,1,0.5)],
+        3: [(0,0.5,1,0.5)], 12: [(0,0.5,1,0.5)],
+        4: [(0.5,0,1,0.5)], 11: [(0.5,0,1,0.5)],
+        5: [(0,0.5,0.5,0),(0.5,1,1,0.5)],
+        6: [(0.5,0,0.5,1)], 9: [(0.5,0,0.5,1)],
+        7: [(0,0.5,0.5,0)], 8: [(0,0.5,0.5,0)],
+        10: [(0,0.5,0.5,1),(0.5,0,1,0.5)]
+    }
+
     def computeCellLine(self,index,cell_x,cell_y):
-        scale = 1
         nw_x = cell_x-1
         nw_y = cell_y-1
-        if index == 0 or index == 15:
-            return []
-        if index == 1 or index == 14:
-            return [(nw_x,nw_y+scale/2,nw_x+scale/2,nw_y+scale)]
-        if index == 2 or index == 13:
-            return [(nw_x+scale/2,nw_y+scale,nw_x+scale,nw_y+scale/2)]
-        if index == 3 or index == 12:
-            return [(nw_x,nw_y+scale/2,nw_x+scale,nw_y+scale/2)]
-        if index == 4 or index == 11:
-            return [(nw_x+scale/2,nw_y,nw_x+scale,nw_y+scale/2)]
-        if index == 5:
-            return [(nw_x,nw_y+scale/2,nw_x+scale/2,nw_y),(nw_x+scale/2,nw_y+scale,nw_x+scale,nw_y+scale/2)]
-        if index == 6 or index == 9:
-            return [(nw_x+scale/2,nw_y,nw_x+scale/2,nw_y+scale)]
-        if index == 7 or index == 8:
-            return [(nw_x,nw_y+scale/2,nw_x+scale/2,nw_y)]
-        if index == 10:
-            return [(nw_x,nw_y+scale/2,nw_x+scale/2,nw_y+scale),(nw_x+scale/2,nw_y,nw_x+scale,nw_y+scale/2)]
-        return []
+        return [(nw_x+x1,nw_y+y1,nw_x+x2,nw_y+y2) for (x1,y1,x2,y2) in Contour.cell_segments[index]]
+
+    # get the data surrounded by a border of cells with value -infinity (below every threshold)
+    def getPaddedData(self):
+        if self.padded_data is None:
+            neg_inf = float("-inf")
+            border = [neg_inf]*(self.columns+2)
+            self.padded_data = [border]+[[neg_inf]+list(rowdata)+[neg_inf] for rowdata in self.data]+[border]
+        return self.padded_data
+
+    def computeSegments(self,thresholds):
+        """
+        Compute the contour line segments for a list of thresholds in a single pass over the grid
+
+        Arguments:
+            thresholds(list): threshold values in ascending order
+
+        Returns:
+            a list containing the list of (x1,y1,x2,y2) segments for each threshold, each in grid scan order
+        """
+        segments = [[] for _ in thresholds]
+        nr_thresholds = len(thresholds)
+        padded = self.getPaddedData()
+        cell_segments = Contour.cell_segments
+        for cell_y in range(self.rows+1):
+            upper = padded[cell_y]
+            lower = padded[cell_y+1]
+            nw_y = cell_y-1
+            for cell_x in range(self.columns+1):
+                nw = upper[cell_x]
+                ne = upper[cell_x+1]
+                sw = lower[cell_x]
+                se = lower[cell_x+1]
+                # the contour for threshold t crosses the cell only if min(corners) < t <= max(corners)
+                lo = bisect.bisect_right(thresholds,min(nw,ne,sw,se))
+                if lo == nr_thresholds:
+                    continue
+                hi = bisect.bisect_right(thresholds,max(nw,ne,sw,se))
+                nw_x = cell_x-1
+                for threshold_index in range(lo,hi):
+                    t = thresholds[threshold_index]
+                    index = (sw >= t) | ((se >= t) << 1) | ((ne >= t) << 2) | ((nw >= t) << 3)
+                    threshold_segments = segments[threshold_index]
+                    for (x1,y1,x2,y2) in cell_segments[index]:
+                        threshold_segments.append((nw_x+x1,nw_y+y1,nw_x+x2,nw_y+y2))
+        return segments
 
     def reposition(self,path,ox,oy):
-        rpath = []
         (lonmin,latmin) = self.sw
         (lonmax,latmax) = self.ne
 
@@ -137,91 +177,60 @@ class Contour(MapLayer):
         self.scalex = self.width / (emax-emin)
         self.scaley = self.height / (nmax-nmin)
 
-        for (x,y) in path:
-            lon = lonmin + (x / (self.columns-1)) * (lonmax-lonmin)
-            lat = latmax - (y / (self.rows-1)) * (latmax-latmin)
-            (e,n) = self.projection.fromLonLat((lon,lat))
-            rpath.append((ox+(e-emin)*self.scalex,oy+self.height - (n-nmin)*self.scaley))
-        return rpath
+        max_x = self.columns-1
+        max_y = self.rows-1
+        lon_range = lonmax-lonmin
+        lat_range = latmax-latmin
+        scalex = self.scalex
+        scaley = self.scaley
+        base_y = oy+self.height
+
+        ens = self.projection.fromLonLatArray(
+            [(lonmin + (x / max_x) * lon_range,latmax - (y / max_y) * lat_range) for (x,y) in path])
+        return [(ox+(e-emin)*scalex,base_y - (n-nmin)*scaley) for (e,n) in ens]
 
     def distance(self,p0,p1):
         return math.sqrt((p0[0]-p1[0])**2 + (p0[1]-p1[1])**2)
 
     def stitch(self,lines):
-        fragmentsByStart = {}
-        fragmentsByEnd = {}
-        rings = []
-
+        # every segment end point is shared with exactly one other segment, so the segments form
+        # closed rings which can be traced through a map from each point to its two neighbours
+        neighbours = {}
         for (x1,y1,x2,y2) in lines:
             p1 = (x1,y1)
             p2 = (x2,y2)
-            if p1 in fragmentsByStart:
-                ring = fragmentsByStart[p1]
-                ring.insert(0,p2)
-                del fragmentsByStart[p1]
-                fragmentsByStart[p2] = ring
-            elif p1 in fragmentsByEnd:
-                ring = fragmentsByEnd[p1]
-                ring.append(p2)
-                del fragmentsByEnd[p1]
-                fragmentsByEnd[p2] = ring
-            elif p2 in fragmentsByStart:
-                ring = fragmentsByStart[p2]
-                ring.insert(0,p1)
-                del fragmentsByStart[p2]
-                fragmentsByStart[p1] = ring
-            elif p2 in fragmentsByEnd:
-                ring = fragmentsByEnd[p2]
-                ring.append(p1)
-                del fragmentsByEnd[p2]
-                fragmentsByEnd[p1] = ring
+            if p1 in neighbours:
+                neighbours[p1].append(p2)
             else:
-                ring = [p1,p2]
-                fragmentsByStart[p1] = ring
-                fragmentsByEnd[p2] = ring
-                rings.append(ring)
-
-        incomplete = rings[:]
-
-        def prepend(l1,l2):
-            l2.reverse()
-            for i in l2:
-                l1.insert(0,i)
+                neighbours[p1] = [p2]
+            if p2 in neighbours:
+                neighbours[p2].append(p1)
+            else:
+                neighbours[p2] = [p1]
 
         total = []
-    
-        for ring in rings:
-            if ring in incomplete:
-                assembling = True
-                while assembling:
-                    assembling = False
-                    for other in incomplete:
-                        if other != ring:
-                            if ring[-1] == other[0]:
-                                incomplete.remove(other)
-                                ring += other[1:]
-                            elif other[-1] == ring[0]:
-                                incomplete.remove(other)
-                                prepend(ring,other[:-1])
-                            elif ring[0] == other[0]:
-                                incomplete.remove(other)
-                                other.reverse()
-                                prepend(ring,other[:-1])
-                            elif ring[-1] == other[-1]:
-                                incomplete.remove(other)
-                                other.reverse()
-                                ring += other[1:]
-                            else:
-                                continue
-                            assembling = True
-                            break
-                if ring[0] == ring[-1]:
-                    total.append(ring)
-                else:
+        visited = set()
+        # rings are returned in the order in which their first segment appears in lines
+        for (x1,y1,x2,y2) in lines:
+            start = (x1,y1)
+            if start in visited:
+                continue
+            visited.add(start)
+            ring = [start]
+            previous = start
+            current = (x2,y2)
+            while current != start:
+                adjacent = neighbours[current]
+                if len(adjacent) != 2:
                     raise Exception("Unable to compute closed contour")
+                visited.add(current)
+                ring.append(current)
+                (previous,current) = (current,adjacent[1] if adjacent[0] == previous else adjacent[0])
+            ring.append(start)
+            total.append(ring)
         return total
 
-    def isConcave(self,points,tdata):
+    def isConcave(self,points,threshold):
         # find left most line centre (left_cx,left_cy)
         left_cx = None
         left_cy = None
@@ -236,10 +245,11 @@ class Contour(MapLayer):
         # for the cell this center falls in, try and infer if the cell is concave
         cell_x = math.floor(left_cx)
         cell_y = math.floor(left_cy)
-        nw = tdata[cell_y][cell_x]
-        sw = tdata[cell_y+1][cell_x]
-        ne = tdata[cell_y][cell_x+1]
-        se = tdata[cell_y+1][cell_x+1]
+        padded = self.getPaddedData()
+        nw = int(padded[cell_y][cell_x] >= threshold)
+        sw = int(padded[cell_y+1][cell_x] >= threshold)
+        ne = int(padded[cell_y][cell_x+1] >= threshold)
+        se = int(padded[cell_y+1][cell_x+1] >= threshold)
         return (nw == 1 and sw ==1) or ((ne==0 or se==0) and (nw==1 or sw==1))
 
     def interpolate(self,path,threshold):
@@ -280,38 +290,23 @@ class Contour(MapLayer):
         return simplified
 
     def computeContourLines(self,threshold,ox,oy):
-        lines = []
-        tdata = []
-        def binarize(x):
-            if x < threshold:
-                return 0
-            else:
-                return 1
+        return self.computeAllContourLines([threshold],ox,oy)[0]
 
-        tdata.append([0]*(self.columns+2))
-        for rowdata in self.data:
-            trowdata = [binarize(val) for val in rowdata]
-            tdata.append([0]+trowdata+[0])
-        tdata.append([0]*(self.columns+2))
+    def computeAllContourLines(self,thresholds,ox,oy):
+        results = []
+        for (threshold,lines) in zip(thresholds,self.computeSegments(thresholds)):
+            total = self.stitch(lines)
 
-        for cell_y in range(self.rows+1):
-            for cell_x in range(self.columns+1):
-                index = self.computeCellIndex(tdata,cell_x,cell_y)
-                cellLines = self.computeCellLine(index,cell_x,cell_y)
-                for cellLine in cellLines:
-                    lines.append(cellLine)
+            interpolated_total = [self.interpolate(path,threshold) for path in total]
 
-        total = self.stitch(lines)
-        
-        interpolated_total = [self.interpolate(path,threshold) for path in total]
+            concavity = [self.isConcave(points,threshold) for points in interpolated_total]
 
-        concavity = [self.isConcave(points,tdata) for points in interpolated_total]
-        
-        repositioned_total = [self.reposition(path,ox,oy) for path in interpolated_total]
+            repositioned_total = [self.reposition(path,ox,oy) for path in interpolated_total]
 
-        simplified_total = [self.simplify(path) for path in repositioned_total]
+            simplified_total = [self.simplify(path) for path in repositioned_total]
 
-        return (simplified_total,concavity)
+            results.append((simplified_total,concavity))
+        return results
 
     def getHeight(self):
         return self.height
@@ -330,27 +325,29 @@ class Contour(MapLayer):
         colour_manager.allocateColour(self.max_val)
 
     def generateLabel(self,points,threshold):
-
-        def lineProperties(p0,p1):
-            lX = p1[0] - p0[0]
-            lY = p1[1] - p0[1]
-            mX = p0[0] + (p1[0]-p0[0])*0.5
-            mY = p0[1] + (p1[1]-p0[1])*0.5
-            return (math.sqrt(lX**2 + lY**2),math.atan2(lY, lX),(mX,mY))
+        # place the label at the center of the longest segment of the ring, rotated to follow the segment
+        # so that the placement does not depend on where the ring starts or which way it runs, the label
+        # is kept upright and ties between equally long segments go to the segment whose center is nearest
+        # the top left (lowest y, then lowest x)
 
         maxl = None
         angle = None
         coords = None
 
         for idx in range(1,len(points)):
-            p0 = points[idx-1]
-            p1 = points[idx]
-            (l,a,mp) = lineProperties(p0,p1)
-
-            if maxl == None or l > maxl:
+            (x0,y0) = points[idx-1]
+            (x1,y1) = points[idx]
+            l = round(math.sqrt((x1-x0)**2 + (y1-y0)**2),6)
+            mp = ((x0+x1)/2,(y0+y1)/2)
+            if maxl == None or l > maxl or (l == maxl and (mp[1],mp[0]) < (coords[1],coords[0])):
                 maxl = l
                 coords = mp
-                angle = a
+                angle = math.atan2(y1-y0,x1-x0)
+
+        if angle > math.pi/2:
+            angle -= math.pi
+        elif angle <= -math.pi/2:
+            angle += math.pi
 
         t = text(coords[0],coords[1],self.label_fn(threshold))
         t.setRotation(angle)
@@ -378,11 +375,14 @@ class Contour(MapLayer):
                 doc.add(r)
             threshold += self.contour_interval
 
+        thresholds = []
         while threshold < self.max_val:
-            (total,concavity) = self.computeContourLines(threshold,ox,oy)
-            contourTotal.append((threshold,total,concavity))
+            thresholds.append(threshold)
             threshold += self.contour_interval
 
+        for (threshold,(total,concavity)) in zip(thresholds,self.computeAllContourLines(thresholds,ox,oy)):
+            contourTotal.append((threshold,total,concavity))
+
         if self.colour_manager:
             for (threshold,contours,concavity) in contourTotal:
                 for idx in range(len(contours)):
@@ -40,6 +40,10 @@ class Geoimport(Geoplot):
         point_style (dict|function): see Notes
         line_style (dict|function): see Notes
         polygon_style (dict|function): see Notes
+        filter_box (tuple): (min_lon,min_lat,max_lon,max_lat) only import features with at least one point inside this box
+        include_properties (list): only import these properties for each feature (import all if None)
+        use_cache (bool): cache the imported geometry on disk (see visigoth.utils.geojson.GeometryCache) to speed up repeated imports
+        lazy (bool): in html output, only fill in the paths of lines and polygons in the visible part of the map (see visigoth.map_layers.geoplot.Geoplot)
         
     Notes:
         The point_style, line_style and polygon_style values should be dicts or functions operating on a properties dict and returning a style dict
@@ -48,9 +52,12 @@ class Geoimport(Geoplot):
         These keys map to keyword arguments of the geoplot.Multipoint, geoplot.Multiline and geoplot.Multipolygon instances
     """
 
-    def __init__(self, path, point_style=lambda p:{}, line_style=lambda p:{}, polygon_style=lambda p:{}):
-        super().__init__()
+    def __init__(self, path, point_style=lambda p:{}, line_style=lambda p:{}, polygon_style=lambda p:{}, filter_box=None, include_properties=None, use_cache=False, lazy=False):
+        super().__init__(lazy=lazy)
         self.path = path
+        self.filter_box = filter_box
+        self.include_properties = include_properties
+        self.use_cache = use_cache
         self.point_style = point_style
         self.line_style = line_style
         self.polygon_style = polygon_style
@@ -72,7 +79,7 @@ class Geoimport(Geoplot):
             return fn_or_val
 
     def extractGeojson(self):
-        reader = GeojsonReader()
+        reader = GeojsonReader(filter_box=self.filter_box,include_properties=self.include_properties,use_cache=self.use_cache)
         return reader.extract(self.path)
 
     def extract(self):
@@ -50,6 +50,20 @@ class geoplot {
         this.defineEventSources(this.config.polygons);
         this.defineEventSources(this.config.lines);
         this.defineEventSources(this.config.points);
+
+        this.zoom_level = 1;
+        this.zoom_index = 0;
+        if (this.config.lazy) {
+            // decode the packed feature geometry and fill in the paths of features in the initial window
+            var raw = atob(this.config.lazy.data);
+            this.lazy_data = new Uint8Array(raw.length);
+            for(var i=0; i<raw.length; i++) {
+                this.lazy_data[i] = raw.charCodeAt(i);
+            }
+            this.scanLazyFeatures();
+            this.materialized = {};
+            this.updateLazyFeatures({"cx":x, "cy":y, "width":width, "height":height});
+        }
     }
 
     defineCallback(trigger) {
@@ -85,14 +99,28 @@ class geoplot {
             var transform = "translate("+tx+","+ty+") scale("+scale+")";
             document.getElementById(mid).setAttribute("transform",transform);
         }
+        // lines and polygons may have been simplified separately for each zoom level
+        var zoom_index = Math.max(0,Math.floor(Math.log2(zoom_level)));
+        this.zoom_level = zoom_level;
+        this.zoom_index = zoom_index;
+        // packed features in view are given the path for the new zoom level when the visible window is updated
+        for (var idx in this.materialized) {
+            var sw = this.config.lazy.stroke_widths[idx];
+            if (sw) {
+                document.getElementById(this.config.lazy.ids[idx]).setAttribute("stroke-width",sw/zoom_level);
+            }
+        }
         for (var lid in this.config.lines) {
             var sw = this.config.lines[lid].sw;
-            document.getElementById(lid).setAttribute("stroke-width",sw/zoom_level);
+            var elt = document.getElementById(lid);
+            elt.setAttribute("stroke-width",sw/zoom_level);
+            this.setZoomPath(elt,this.config.lines[lid].zoom_paths,zoom_index);
         }
         for (var pid in this.config.polygons) {
             var sw = this.config.polygons[pid].sw;
             var elt = document.getElementById(pid);
             elt.setAttribute("stroke-width",sw/zoom_level);
+            this.setZoomPath(elt,this.config.polygons[pid].zoom_paths,zoom_index);
         }
         for (var lid in this.config.labels) {
             var x = this.config.labels[lid].x;
@@ -112,6 +140,161 @@ class geoplot {
         }
     }
 
+    readValue() {
+        // read an unsigned varint from the packed data at the current position
+        var data = this.lazy_data;
+        var value = 0;
+        var scale = 1;
+        var b;
+        do {
+            b = data[this.lazy_pos++];
+            value += (b & 127) * scale;
+            scale *= 128;
+        } while (b & 128);
+        return value;
+    }
+
+    readSigned() {
+        var value = this.readValue();
+        return (value % 2) ? -(value+1)/2 : value/2;
+    }
+
+    scanLazyFeatures() {
+        // read the header of each packed feature, to find its bounding box and the offset of each level of detail
+        var lazy = this.config.lazy;
+        var n = lazy.ids.length;
+        this.lazy_bboxes = new Float64Array(4*n);
+        this.lazy_corners = new Float64Array(2*n);
+        this.lazy_closed = new Uint8Array(n);
+        this.lazy_offsets = [];
+        this.lazy_pos = 0;
+        for(var idx=0; idx<n; idx++) {
+            var header = this.readValue();
+            var min_x = this.readSigned();
+            var min_y = this.readSigned();
+            var w = this.readValue();
+            var h = this.readValue();
+            this.lazy_closed[idx] = header % 2;
+            this.lazy_corners[2*idx] = min_x;
+            this.lazy_corners[2*idx+1] = min_y;
+            this.lazy_bboxes[4*idx] = lazy.x+min_x/lazy.precision;
+            this.lazy_bboxes[4*idx+1] = lazy.y+min_y/lazy.precision;
+            this.lazy_bboxes[4*idx+2] = lazy.x+(min_x+w)/lazy.precision;
+            this.lazy_bboxes[4*idx+3] = lazy.y+(min_y+h)/lazy.precision;
+            var offsets = [];
+            var nr_levels = Math.floor(header/2);
+            for(var level=0; level<nr_levels; level++) {
+                offsets.push(this.lazy_pos);
+                var nr_rings = this.readValue();
+                for(var r=0; r<nr_rings; r++) {
+                    var nr_values = 2*this.readValue();
+                    for(var v=0; v<nr_values; v++) {
+                        while (this.lazy_data[this.lazy_pos++] & 128) {
+                        }
+                    }
+                }
+            }
+            this.lazy_offsets.push(offsets);
+        }
+    }
+
+    queryLazyFeatures(obj) {
+        // find the packed features whose bounding boxes intersect a window, using the loose quadtree index
+        var lazy = this.config.lazy;
+        var xmin = obj.cx - obj.width/2;
+        var xmax = obj.cx + obj.width/2;
+        var ymin = obj.cy - obj.height/2;
+        var ymax = obj.cy + obj.height/2;
+        var candidates = lazy.root.slice();
+        for(var level=1; level<=lazy.depth; level++) {
+            var cw = lazy.width/Math.pow(2,level);
+            var ch = lazy.height/Math.pow(2,level);
+            // a feature stored in a cell lies within the 2x2 block of cells starting at that cell
+            var i0 = Math.floor((xmin-lazy.x)/cw)-1;
+            var i1 = Math.floor((xmax-lazy.x)/cw);
+            var j0 = Math.floor((ymin-lazy.y)/ch)-1;
+            var j1 = Math.floor((ymax-lazy.y)/ch);
+            for(var i=i0; i<=i1; i++) {
+                for(var j=j0; j<=j1; j++) {
+                    var cell = lazy.index[level+","+i+","+j];
+                    if (cell) {
+                        candidates = candidates.concat(cell);
+                    }
+                }
+            }
+        }
+        var bboxes = this.lazy_bboxes;
+        var visible = {};
+        for(var k=0; k<candidates.length; k++) {
+            var idx = candidates[k];
+            if (bboxes[4*idx+2] >= xmin && bboxes[4*idx] <= xmax && bboxes[4*idx+3] >= ymin && bboxes[4*idx+1] <= ymax) {
+                visible[idx] = true;
+            }
+        }
+        return visible;
+    }
+
+    updateLazyFeatures(obj) {
+        var visible = this.queryLazyFeatures(obj);
+        for (var idx in this.materialized) {
+            if (!(idx in visible)) {
+                document.getElementById(this.config.lazy.ids[idx]).removeAttribute("d");
+                delete this.materialized[idx];
+            }
+        }
+        for (var idx in visible) {
+            this.materialize(idx);
+        }
+    }
+
+    materialize(idx) {
+        // set the path of a packed feature, using the level of detail for the current zoom level
+        var offsets = this.lazy_offsets[idx];
+        var offset = offsets[Math.min(this.zoom_index,offsets.length-1)];
+        if (this.materialized[idx] === offset) {
+            return;
+        }
+        var elt = document.getElementById(this.config.lazy.ids[idx]);
+        elt.setAttribute("d",this.decodePath(idx,offset));
+        var sw = this.config.lazy.stroke_widths[idx];
+        if (sw) {
+            elt.setAttribute("stroke-width",sw/this.zoom_level);
+        }
+        this.materialized[idx] = offset;
+    }
+
+    decodePath(idx,offset) {
+        // read the rings of one level of detail of a packed feature and build the SVG path
+        var lazy = this.config.lazy;
+        var closed = this.lazy_closed[idx];
+        var x = this.lazy_corners[2*idx];
+        var y = this.lazy_corners[2*idx+1];
+        this.lazy_pos = offset;
+        var nr_rings = this.readValue();
+        var d = [];
+        for(var r=0; r<nr_rings; r++) {
+            var nr_points = this.readValue();
+            var coords = [];
+            for(var p=0; p<nr_points; p++) {
+                x += this.readSigned();
+                y += this.readSigned();
+                coords.push((lazy.x+x/lazy.precision)+" "+(lazy.y+y/lazy.precision));
+            }
+            if (closed) {
+                d.push("M"+coords.join(" ")+"Z");
+            } else {
+                d.push("M"+coords.join(" L"));
+            }
+        }
+        return d.join(" ");
+    }
+
+    setZoomPath(elt,zoom_paths,zoom_index) {
+        if (zoom_paths) {
+            elt.setAttribute("d",zoom_paths[Math.min(zoom_index,zoom_paths.length-1)]);
+        }
+    }
+
     defineEventSources(source_map) {
         for (var eid in source_map) {
             var id = source_map[eid].id;
@@ -208,6 +391,9 @@ class geoplot {
         }
         if (channel == "visible_window") {
             this.updateVisibleWindow(obj);
+            if (this.config.lazy) {
+                this.updateLazyFeatures(obj);
+            }
         }
         if (channel == "show_labels") {
             this.showOrHideLabels(obj);
@@ -26,6 +26,7 @@ import math
 from visigoth.svg import text
 from visigoth.map_layers import MapLayer
 from visigoth.utils.js import Js
+from visigoth.utils.geometry import Geometry, PackedFeatures
 
 from .multiline import Multiline
 from .multipoint import Multipoint
@@ -43,15 +44,26 @@ class Geoplot(MapLayer):
         font_height(int) : font size in pixels for labels
         text_attributes(dict): a dict containing SVG name/value attributes to apply to labels
         label_fill(str): fill colour for displaying labels 
+        simplify_tolerance(float): simplify lines and polygons, removing detail smaller than this many pixels (None to disable)
+        clip_margin(float): clip lines and polygons to the map area extended by this many pixels (None to disable)
+        lazy(bool): in html output, embed line and polygon geometry as packed data and only fill in the paths of features in the visible part of the map
 
     Notes:
+        When the map allows zooming, lines and polygons are also simplified for each zoom level
+        and the detail appropriate to the current zoom level is displayed.
+
+        With lazy=True, the SVG elements for lines and polygons are emitted without their path data.  The browser
+        decodes the path of each feature from the packed data (see visigoth.utils.geometry.PackedFeatures) when it
+        intersects the visible window, and removes it again when the feature moves out of view.
+
         The following JavaScript events are dispatched from this element:
 
         channel select_id: for points/lines/polygons with an assigned id, dispatch the id value when clicked
         channel select_category: for points/lines/polygons with an assigned category, dispatch the category value when clicked
     """
 
-    def __init__(self, multipoints=[], multilines=[], multipolys=[],font_height=12,text_attributes={}, label_fill="#FFFFFF80"):
+    def __init__(self, multipoints=[], multilines=[], multipolys=[],font_height=12,text_attributes={}, label_fill="#FFFFFF80",
+                 simplify_tolerance=0.5, clip_margin=20, lazy=False):
         super(Geoplot, self).__init__()
         self.multipoints = multipoints
         self.multilines = multilines
@@ -59,6 +71,11 @@ class Geoplot(MapLayer):
         self.font_height = font_height
         self.text_attributes = text_attributes
         self.label_fill = label_fill
+        self.simplify_tolerance = simplify_tolerance
+        self.clip_margin = clip_margin
+        self.lazy = lazy
+        self.zoom_to = 1
+        self.packed = None
 
         self.width = None
         self.height = None
@@ -102,6 +119,8 @@ class Geoplot(MapLayer):
         super().configureLayer(ownermap,width,height,boundaries,projection,zoom_to,fmt)
         (self.min_lon,self.min_lat) = boundaries[0]
         (self.max_lon,self.max_lat) = boundaries[1]
+        # zooming is only available in html format
+        self.zoom_to = zoom_to if fmt == "html" else 1
 
     def isSearchable(self):
         return True
@@ -156,6 +175,9 @@ class Geoplot(MapLayer):
         # (x,y) = self.projection.fromLonLat(point)
         # return (self.scale*(x - self.x_axis_min)+ox,oy+self.height-self.scale*(y - self.y_axis_min))
 
+    def transformArray(self,points):
+        return self.getXYFromLonLatArray(points)
+
     def centroid(self,points):
         mean_x = sum([x for (x,_) in points])/len(points)
         mean_y = sum([y for (_,y) in points])/len(points)
@@ -173,13 +195,57 @@ class Geoplot(MapLayer):
         max_y = max([y for (_,y) in points])
         return (max_x-min_x)*(max_y-min_y)
         
-    def simplify(self,points):
-        simp = []
-        simp.append(points[0])
-        for p in points[1:]:
-            if int(p[0]) != int(simp[-1][0]) or int(p[1]) != int(simp[-1][1]):
-                simp.append(p)
-        return simp
+    def simplify(self,points,closed=False,zoom=1):
+        if self.simplify_tolerance is None:
+            return points
+        return Geometry.simplify(points,self.simplify_tolerance/zoom,closed)
+
+    def getClipBox(self,ox,oy):
+        m = self.clip_margin
+        return (ox-m,oy-m,ox+self.width+m,oy+self.height+m)
+
+    def clipRings(self,rings,ox,oy):
+        # clip projected polygon rings to the plot area, returning [] if the outer ring is clipped away
+        if self.clip_margin is None:
+            return rings
+        clipped = [Geometry.clipPolygon(ring,*self.getClipBox(ox,oy)) for ring in rings]
+        if len(clipped[0]) < 3:
+            return []
+        return [ring for ring in clipped if len(ring) >= 3]
+
+    def clipLine(self,points,ox,oy):
+        # clip a projected line to the plot area, returning a list of the parts inside
+        if self.clip_margin is None:
+            return [points]
+        return Geometry.clipLine(points,*self.getClipBox(ox,oy))
+
+    def getZoomLevels(self):
+        zoom = 2
+        levels = []
+        while zoom <= self.zoom_to:
+            levels.append(zoom)
+            zoom *= 2
+        return levels
+
+    def getZoomPaths(self,base_path,path_fn):
+        # compute the path for each zoom level beyond the first, return None if none differ from the base path
+        if self.simplify_tolerance is None:
+            return None
+        paths = [base_path]+[path_fn(zoom) for zoom in self.getZoomLevels()]
+        if all(zpath == base_path for zpath in paths):
+            return None
+        return paths
+
+    def packFeature(self,element,closed,stroke_width,base_rings,rings_fn):
+        # move the path of a line or polygon element into the packed data, with the rings for each zoom level
+        levels = [base_rings]
+        if self.simplify_tolerance is not None:
+            levels += [rings_fn(zoom) for zoom in self.getZoomLevels()]
+        # the browser uses the last level for any higher zoom level, so drop repeated levels from the end
+        while len(levels) > 1 and levels[-1] == levels[-2]:
+            levels.pop()
+        element.removeAttr("d")
+        self.packed.add(element.getId(),closed,stroke_width,levels)
 
     def getLineCenter(self,tps):
         # find the longest line segment and return its center point and angle in radians
@@ -313,22 +379,39 @@ class Geoplot(MapLayer):
                     if self.inarea(point):
                         include = True
 
-                if include:
-                    tps = [self.transform(point,ox,oy) for point in line]
+                if not include:
+                    continue
+
+                parts = self.clipLine(self.transformArray(line),ox,oy)
+                label_tps = None
+                for part in parts:
+                    tps = self.simplify(part)
                     if longest_tps == None or longest_len < self.getLineLength(tps):
                         longest_tps = tps
+                    if label_tps == None or self.getLineLength(label_tps) < self.getLineLength(tps):
+                        label_tps = tps
                     ls = mp.draw(doc,tps)
-                    if label:
-                        self.addLineLabel(tps,label,doc)
                     for (l,sw) in ls:
                         lid = l.getId()
+                        if self.packed:
+                            self.packFeature(l,False,sw,[tps],lambda zoom: [self.simplify(part,zoom=zoom)])
+                            if mpid or category:
+                                self.lines[lid] = { "sw":sw, "id":mpid, "category":category }
+                            lids.append(lid)
+                            continue
                         self.lines[lid] = { "sw":sw }
                         if mpid:
                             self.lines[lid]["id"] = mpid
                         if category:
                             self.lines[lid]["category"] = category
+                        zoom_paths = self.getZoomPaths(l.getAttr("d"),
+                            lambda zoom: l.computeStandardPath(self.simplify(part,zoom=zoom)))
+                        if zoom_paths:
+                            self.lines[lid]["zoom_paths"] = zoom_paths
 
                         lids.append(lid)
+                if label and label_tps:
+                    self.addLineLabel(label_tps,label,doc)
             group_id = doc.closeGroup().getId()
             if popup:
                 (x,y,_) = self.getLineCenter(longest_tps)
@@ -377,19 +460,32 @@ class Geoplot(MapLayer):
                         if self.inarea(point):
                             include = True
                 if include:
-                    plotrings = [self.simplify([self.transform(point,ox,oy) for point in ring]) for ring in poly]
+                    rings = self.clipRings([self.transformArray(ring) for ring in poly],ox,oy)
+                    if not rings:
+                        continue
+                    plotrings = [self.simplify(ring,closed=True) for ring in rings]
                     p = mp.draw(doc,plotrings)
                     if largest_poly == None or self.bbox_area(plotrings[0]) > largest_area:
                         largest_poly = plotrings[0]
                     if label:
                         self.addPolygonLabel(plotrings,label,doc)
                     pid = p.getId()
+                    pids.append(pid)
+                    if self.packed:
+                        self.packFeature(p,True,mp.getStrokeWidth(),plotrings,
+                            lambda zoom: [self.simplify(ring,True,zoom) for ring in rings])
+                        if mpid or category:
+                            self.polygons[pid] = { "sw":mp.getStrokeWidth(), "id":mpid, "category":category }
+                        continue
                     self.polygons[pid] = { "sw":mp.getStrokeWidth() }
+                    zoom_paths = self.getZoomPaths(p.getAttr("d"),
+                        lambda zoom: p.buildPaths(self.simplify(rings[0],True,zoom),[self.simplify(ring,True,zoom) for ring in rings[1:]]))
+                    if zoom_paths:
+                        self.polygons[pid]["zoom_paths"] = zoom_paths
                     if mpid:
                         self.polygons[pid]["id"] = mpid
                     if category:
                         self.polygons[pid]["category"] = category
-                    pids.append(pid)
 
             group_id = doc.closeGroup().getId()
             if popup:
@@ -417,6 +513,12 @@ class Geoplot(MapLayer):
         ox = cx - self.width/2
         oy = cy - self.height/2
 
+        self.packed = None
+        if self.lazy and doc.getFormat() == "html":
+            # index the features down to cells half the size of the visible window at the maximum zoom level
+            depth = 1+int(math.log2(self.zoom_to))
+            self.packed = PackedFeatures(ox,oy,self.width,self.height,depth=depth)
+
         self.drawPolygons(doc,cx,cy,ox,oy)
         self.drawLines(doc,cx,cy,ox,oy)
         self.drawPoints(doc,cx,cy,ox,oy)
@@ -435,6 +537,8 @@ class Geoplot(MapLayer):
             "polygons":self.polygons,
             "labels":self.labels,
             "popups":self.popup_groups }
+        if self.packed:
+            config["lazy"] = self.packed.getConfig()
 
         with open(os.path.join(os.path.split(__file__)[0], "geoplot.js"), "r") as jsfile:
             jscode = jsfile.read()
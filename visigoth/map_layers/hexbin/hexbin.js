@@ -25,15 +25,59 @@ class hexbin {
         this.y = y;
         this.sendfn = sendfn;
         this.config = config;
+        this.zoom_index = 0;
+        this.visible_window = null;
     }
 
     zoom(zoom_level) {
-        
+        if (!this.config.zoom_groups) {
+            return;
+        }
+        this.zoom_index = Math.min(Math.floor(Math.log2(zoom_level)),this.config.zoom_groups.length-1);
+        for(var i=0; i<this.config.zoom_groups.length; i++) {
+            var elt = document.getElementById(this.config.zoom_groups[i]);
+            if (i == this.zoom_index) {
+                elt.removeAttribute("visibility");
+            } else {
+                elt.setAttribute("visibility","hidden");
+            }
+        }
+        this.updateTiles();
+    }
+
+    updateVisibleWindow(obj) {
+        this.visible_window = obj;
+        this.updateTiles();
+    }
+
+    updateTiles() {
+        // hide the tiles of bins at the current zoom level which lie outside the visible window
+        if (!this.config.zoom_tiles || !this.visible_window) {
+            return;
+        }
+        var obj = this.visible_window;
+        var xmin = obj.cx - obj.width/2;
+        var xmax = obj.cx + obj.width/2;
+        var ymin = obj.cy - obj.height/2;
+        var ymax = obj.cy + obj.height/2;
+        var tiles = this.config.zoom_tiles[this.zoom_index];
+        for(var i=0; i<tiles.length; i++) {
+            var tile = tiles[i];
+            var elt = document.getElementById(tile[0]);
+            if (tile[3] < xmin || tile[1] > xmax || tile[4] < ymin || tile[2] > ymax) {
+                elt.setAttribute("visibility","hidden");
+            } else {
+                elt.removeAttribute("visibility");
+            }
+        }
     }
 
     recieve(obj,channel) {
         if (channel == "zoom") {
             this.zoom(obj);
         }
+        if (channel == "visible_window") {
+            this.updateVisibleWindow(obj);
+        }
     }
 }
\ No newline at end of file
@@ -45,8 +45,14 @@ class Hexbin(MapLayer):
         stroke_width(float) : the width (in pixels) to use for bin lines
         draw_empty_bins(bool) : whether to draw hexagonal bins with zero value
         min_freq(int) : only draw bins with this frequency or higher
+        aggregation(str) : how to combine the magnitudes of the points in each bin, "sum", "mean" or "count"
+
+    Notes:
+        When the layer is rendered to html in a map with zoom_to > 1, a finer grid of bins is built for each
+        power-of-two zoom level, so that bins keep the same on-screen size as the map is zoomed in.
+        Sums and counts at finer levels are scaled to the area of a bin at zoom level 1 before colouring.
     """
-    def __init__(self,data,lon=0,lat=1,colour=None,nr_bins_across=10,colour_manager=None,stroke="grey",stroke_width=1, draw_empty_bins=False,min_freq=1):
+    def __init__(self,data,lon=0,lat=1,colour=None,nr_bins_across=10,colour_manager=None,stroke="grey",stroke_width=1, draw_empty_bins=False,min_freq=1,aggregation="sum"):
         super(Hexbin, self).__init__()
         dataset = Dataset(data)
         self.data = dataset.query([lon,lat,colour if colour is not None else Dataset.constant(1)])
@@ -63,6 +69,11 @@ class Hexbin(MapLayer):
         self.boundaries = None
         self.draw_empty_bins = draw_empty_bins
         self.min_freq = min_freq
+        if aggregation not in ("sum","mean","count"):
+            raise Exception("aggregation should be one of \"sum\", \"mean\" or \"count\"")
+        self.aggregation = aggregation
+        self.zoom_to = 1
+        self.pyramid = []
 
     def getBoundaries(self):
         if self.boundaries:
@@ -79,6 +90,7 @@ class Hexbin(MapLayer):
         self.ownermap = ownermap
         self.boundaries = boundaries
         self.projection = projection
+        self.zoom_to = zoom_to if fmt == "html" else 1
         (x0,y0) = projection.fromLonLat(boundaries[0])
         (x1,y1) = projection.fromLonLat(boundaries[1])
         self.se = (x0,y0)
@@ -102,26 +114,90 @@ class Hexbin(MapLayer):
     def getWidth(self):
         return self.width
 
-    def hexacenter(self,col,row):
-        off_sm = self.dlength*math.sin(self.rangle)
-        off_lg = self.dlength*math.cos(self.rangle)
-        yc = (float(row)*(self.dlength+off_sm))+off_sm
+    def getZoomLevels(self):
+        zoom = 1
+        levels = []
+        while zoom <= self.zoom_to:
+            levels.append(zoom)
+            zoom *= 2
+        return levels
+
+    def getGrid(self,zoom):
+        # get the (dlength,nr_bins_across,nr_bins_down) of the grid of bins used at a zoom level
+        dlength = self.dlength/zoom
+        nr_across = 1+(self.nr_bins_across-1)*zoom
+        nr_down = 1+int((self.height)/(dlength*(1+math.sin(self.rangle))))
+        return (dlength,nr_across,nr_down)
+
+    def hexacenter(self,col,row,dlength=None):
+        if dlength is None:
+            dlength = self.dlength
+        off_sm = dlength*math.sin(self.rangle)
+        off_lg = dlength*math.cos(self.rangle)
+        yc = (float(row)*(dlength+off_sm))+off_sm
         xc = (float(col)*(2*off_lg))
         if row % 2 == 1:
             xc += off_lg
         return (xc,yc)
 
-    def transform(self,point):
-        (px1,py1) = self.projection.fromLonLat(point)
-        px = (px1 - self.se[0])*self.scale_x
-        py = (py1 - self.se[1])*self.scale_y
-        return (px,py)
+    def transformArray(self,points):
+        (x0,y0) = self.se
+        scale_x = self.scale_x
+        scale_y = self.scale_y
+        return [((px1 - x0)*scale_x,(py1 - y0)*scale_y) for (px1,py1) in self.projection.fromLonLatArray(points)]
+
+    def binPoints(self,points,values,progress=None):
+        # bin points into the grid at zoom level 1, returning dicts mapping (col,row) to the sum and count of values
+        return self.binPyramid(points,values,[(self.dlength,self.nr_bins_across,self.nr_bins_down)],progress)[0]
 
-    def inHexagon(self,px,py,hx,hy):
-        s = self.dlength
-        x = abs(px - hx)
-        y = abs(py - hy)
-        return x < 3**0.5 * min(s - y, s / 2)
+    def binPyramid(self,points,values,grids,progress=None):
+        # assign each point to the (col,row) of the hexagon containing it in each of the grids, in a single pass
+        # grids is a list of (dlength,nr_bins_across,nr_bins_down), returns a list of (sums,counts) for each grid
+        # where sums and counts are dicts mapping (col,row) to the sum and count of values
+        # points are converted to axial coordinates and rounded in cube coordinates
+        # rows are offset so that odd rows are shifted right by half a hexagon and the center of (0,0) lies at (0,off_sm)
+        params = []
+        for (s,nr_across,nr_down) in grids:
+            params.append((s*math.sin(self.rangle),math.sqrt(3)/(3*s),1/(3*s),2/(3*s),nr_across,nr_down,{},{}))
+        total = len(points)
+        report_every = max(1,total//100)
+        for index in range(0,total,report_every):
+            for ((px,py),value) in zip(points[index:index+report_every],values[index:index+report_every]):
+                for (off_sm,qx,qy,ry,nr_across,nr_down,sums,counts) in params:
+                    y = py - off_sm
+                    fq = qx*px - qy*y
+                    fr = ry*y
+                    fs = -fq-fr
+                    q = round(fq)
+                    r = round(fr)
+                    rs = round(fs)
+                    dq = abs(q-fq)
+                    dr = abs(r-fr)
+                    if dq > dr and dq > abs(rs-fs):
+                        q = -r-rs
+                    elif dr > abs(rs-fs):
+                        r = -q-rs
+                    col = q + (r - (r & 1))//2
+                    if 0 <= col < nr_across and 0 <= r < nr_down:
+                        key = (col,r)
+                        if key in sums:
+                            sums[key] += value
+                            counts[key] += 1
+                        else:
+                            sums[key] = value
+                            counts[key] = 1
+            if progress:
+                progress.report("building",min(1,(index+report_every)/total))
+        return [(sums,counts) for (_,_,_,_,_,_,sums,counts) in params]
+
+    def aggregate(self,sums,counts,freqs):
+        for key in sums:
+            if self.aggregation == "sum":
+                freqs[key] = sums[key]
+            elif self.aggregation == "mean":
+                freqs[key] = sums[key]/counts[key]
+            else:
+                freqs[key] = counts[key]
 
     def buildLayer(self,fmt):
         for row in range(0,self.nr_bins_down):
@@ -130,39 +206,76 @@ class Hexbin(MapLayer):
                 self.freqs[(col,row)] = 0
 
         progress = Progress("hexbin")
-        maxfreq = 0
-        count = 0
-        total = len(self.data)
-        for (lon,lat,value) in self.data:
-            (px,py) = self.transform((lon,lat))
-            py = self.height - py
-            self.points.append((px,py))
-            col_e = (px / self.width) * self.nr_bins_across
-            row_e = (py / self.height) * self.nr_bins_down
-            row_min = max(math.floor(row_e-1),0)
-            row_max = min(math.ceil(row_e+1),self.nr_bins_down-1)
-            col_min = max(math.floor(col_e - 1), 0)
-            col_max = min(math.ceil(col_e + 1), self.nr_bins_across-1)
-            hits = 0
-            for row in range(row_min,row_max+1):
-                for col in range(col_min,col_max+1):
-                    (hx,hy) = self.centers[(col,row)]
-                    if self.inHexagon(px,py,hx,hy):
-                        hits += 1
-                        freq = self.freqs[(col,row)]+value
-                        self.freqs[(col,row)] = freq
-                        if freq > maxfreq:
-                            maxfreq = freq
-            count += 1
-            progress.report("building",(count+1)/total)
+        tpoints = self.transformArray([(lon,lat) for (lon,lat,_) in self.data])
+        height = self.height
+        self.points = [(px,height-py) for (px,py) in tpoints]
+        values = [value for (_,_,value) in self.data]
+        self.pyramid = []
+        if self.zoom_to > 1:
+            # bin the points at every zoom level, keeping the bins with a value in a dict for each level
+            zooms = self.getZoomLevels()
+            grids = [self.getGrid(zoom) for zoom in zooms]
+            binned = self.binPyramid(self.points,values,grids,progress)
+            (sums,counts) = binned[0]
+            for (zoom,grid,(zsums,zcounts)) in zip(zooms[1:],grids[1:],binned[1:]):
+                freqs = {}
+                self.aggregate(zsums,zcounts,freqs)
+                self.pyramid.append((zoom,grid,freqs))
+        else:
+            (sums,counts) = self.binPoints(self.points,values,progress)
+        self.aggregate(sums,counts,self.freqs)
+        maxfreq = max([0]+list(self.freqs.values()))
         progress.complete("complete")
         self.getPalette().allocateColour(0)
         self.getPalette().allocateColour(maxfreq)
         self.getPalette().build()
 
+    def drawLevel(self,doc,ox,oy,zoom,grid,freqs):
+        # draw the bins for a zoom level beyond the first, in zoom x zoom tiles which can be hidden when not visible
+        # returns a list of [tile_id,min_x,min_y,max_x,max_y] for each tile
+        (dlength,nr_across,nr_down) = grid
+        if self.draw_empty_bins:
+            keys = [(col,row) for row in range(0,nr_down) for col in range(0,nr_across)]
+        else:
+            keys = sorted(freqs,key=lambda k:(k[1],k[0]))
+        # colour sums and counts scaled to the area of a bin at zoom level 1, so that colours are comparable across levels
+        scale = zoom*zoom if self.aggregation != "mean" else 1
+        # bins and their outlines are drawn smaller at finer levels, so that they appear the same size when zoomed
+        stroke_width = self.stroke_width/zoom
+        off_lg = dlength*math.cos(self.rangle)
+        tiles = {}
+        for key in keys:
+            freq = freqs.get(key,0)
+            if freq>=self.min_freq or self.draw_empty_bins:
+                (hx,hy) = self.hexacenter(key[0],key[1],dlength)
+                tile = (min(zoom-1,int(zoom*hx/self.width)),min(zoom-1,int(zoom*hy/self.height)))
+                if tile not in tiles:
+                    tiles[tile] = []
+                tiles[tile].append((hx,hy,freq*scale))
+        zoom_tiles = []
+        for tile in sorted(tiles):
+            g = doc.openGroup()
+            min_x = min_y = max_x = max_y = None
+            for (hx,hy,freq) in tiles[tile]:
+                col = self.getPalette().getColour(freq)
+                doc.add(hexagon(ox+hx,oy+hy,dlength,col,self.stroke,stroke_width))
+                min_x = ox+hx-off_lg if min_x is None else min(min_x,ox+hx-off_lg)
+                max_x = ox+hx+off_lg if max_x is None else max(max_x,ox+hx+off_lg)
+                min_y = oy+hy-dlength if min_y is None else min(min_y,oy+hy-dlength)
+                max_y = oy+hy+dlength if max_y is None else max(max_y,oy+hy+dlength)
+            doc.closeGroup()
+            zoom_tiles.append([g.getId(),min_x,min_y,max_x,max_y])
+        return zoom_tiles
+
     def draw(self,doc,cx,cy):
         ox = cx - self.width/2
         oy = cy - self.height/2
+        zoom_groups = []
+        zoom_tiles = []
+        if self.pyramid:
+            g = doc.openGroup()
+            zoom_groups.append(g.getId())
+            zoom_tiles.append([])
         for row in range(0,self.nr_bins_down):
             for col in range(0,self.nr_bins_across):
                 (hx,hy) = self.centers[(col,row)]
@@ -171,9 +284,19 @@ class Hexbin(MapLayer):
                     col = self.getPalette().getColour(freq)
                     h = hexagon(ox+hx,oy+hy,self.dlength,col,self.stroke,self.stroke_width)
                     doc.add(h)
+        if self.pyramid:
+            doc.closeGroup()
+
+        for (zoom,grid,freqs) in self.pyramid:
+            g = doc.openGroup()
+            g.addAttr("visibility","hidden")
+            zoom_tiles.append(self.drawLevel(doc,ox,oy,zoom,grid,freqs))
+            zoom_groups.append(g.getId())
+            doc.closeGroup()
 
         with open(os.path.join(os.path.split(__file__)[0],"hexbin.js"),"r") as jsfile:
             jscode = jsfile.read()
         config = {}
+        if zoom_groups:
+            config = { "zoom_groups":zoom_groups, "zoom_tiles":zoom_tiles }
         Js.registerJs(doc,self,jscode,"hexbin",cx,cy,config)
-        
\ No newline at end of file
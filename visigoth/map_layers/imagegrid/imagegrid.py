@@ -18,13 +18,13 @@
 #   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import base64
 import os
 import os.path
-import io
 import math
+import sys
+from array import array
 
-from visigoth.svg import image
+from visigoth.svg import image, datauri
 from visigoth.map_layers import MapLayer
 from visigoth.utils.js import Js
 from visigoth.utils.image.png_canvas import PngCanvas
@@ -92,32 +92,52 @@ class ImageGrid(MapLayer):
         self.a = a
         for data in [self.r,self.g,self.b,self.a]:
             if data is not None:
-                self.rows = len(r)
+                self.rows = len(data)
                 if self.rows:
-                    self.columns = len(r[0])
+                    self.columns = len(data[0])
                 else:
                     self.columns = 0
                 break
 
-        for data in [self.r,self.g,self.b,self.a]:
-            if data is not None:
-                for row in data:
-                    if len(row) != self.columns:
-                        raise Exception(ImageGrid.INPUT_DATA_FORMAT_ERROR)
-                    for value in row:
-                        if not isinstance(value,int) or value < 0 or value > 255:
-                            raise Exception(ImageGrid.INPUT_DATA_FORMAT_ERROR)
-
-        # if r,g or b arrays are None, set to zero
+        # convert each row to bytes, which also checks that values are integers in the range 0-255
+        # if r,g or b arrays are None, set to zero, if the a (alpha) array is None, set to all 255 (opaque)
+        channels = []
+        for (data,default) in [(self.r,0),(self.g,0),(self.b,0),(self.a,255)]:
+            if data is None:
+                channels.append([bytes([default])*self.columns]*self.rows)
+                continue
+            if len(data) != self.rows:
+                raise Exception(ImageGrid.INPUT_DATA_FORMAT_ERROR)
+            rows = []
+            for row in data:
+                if len(row) != self.columns:
+                    raise Exception(ImageGrid.INPUT_DATA_FORMAT_ERROR)
+                try:
+                    rows.append(bytes(row))
+                except (TypeError,ValueError):
+                    raise Exception(ImageGrid.INPUT_DATA_FORMAT_ERROR)
+            channels.append(rows)
+
+        # pack the (r,g,b,a) values of each cell into an unsigned integer whose native byte order matches RGBA
+        self.cells = []
+        row_rgba = bytearray(4*self.columns)
+        for (r_row,g_row,b_row,a_row) in zip(*channels):
+            row_rgba[0::4] = r_row
+            row_rgba[1::4] = g_row
+            row_rgba[2::4] = b_row
+            row_rgba[3::4] = a_row
+            cells = array("I")
+            cells.frombytes(row_rgba)
+            self.cells.append(cells)
+
         if self.r is None:
-            self.r = [[0 for r in range(self.rows)] for c in range(self.columns)]
+            self.r = [list(row) for row in channels[0]]
         if self.g is None:
-            self.g = [[0 for r in range(self.rows)] for c in range(self.columns)]
+            self.g = [list(row) for row in channels[1]]
         if self.b is None:
-            self.b = [[0 for r in range(self.rows)] for c in range(self.columns)]
-        # a (alpha) array is None, set to all 255 (opaque)
+            self.b = [list(row) for row in channels[2]]
         if self.a is None:
-            self.a = [[255 for r in range(self.rows)] for c in range(self.columns)]
+            self.a = [list(row) for row in channels[3]]
 
     INPUT_DATA_FORMAT_ERROR = "r,g,b and a parameters must be a non-empty list of equally sized non-empty lists containing integer values in the range 0 to 255"
 
@@ -137,19 +157,31 @@ class ImageGrid(MapLayer):
     def getWidth(self):
         return self.width
 
-    def getValueAt(self,lon,lat):
-        ((min_lon, min_lat), (max_lon, max_lat)) = self.region_boundaries
-        if lon < min_lon or lon > max_lon:
-            return None
+    def getRowIndex(self,lat):
+        # get the index of the data row nearest to a latitude, or None if outside the plot area
+        ((_, min_lat), (_, max_lat)) = self.region_boundaries
         if lat < min_lat or lat > max_lat:
             return None
         (y_index, _) = Search.binary_search(self.lats,lat)
         if self.lat_reversed:
             y_index = (len(self.lats)-1)-y_index
+        return y_index
 
+    def getColumnIndex(self,lon):
+        # get the index of the data column nearest to a longitude, or None if outside the plot area
+        ((min_lon, _), (max_lon, _)) = self.region_boundaries
+        if lon < min_lon or lon > max_lon:
+            return None
         (x_index, _) = Search.binary_search(self.lons,lon)
         if self.lon_reversed:
             x_index = (len(self.lons)-1)-x_index
+        return x_index
+
+    def getValueAt(self,lon,lat):
+        y_index = self.getRowIndex(lat)
+        x_index = self.getColumnIndex(lon)
+        if y_index is None or x_index is None:
+            return None
         return (self.r[y_index][x_index],self.g[y_index][x_index],self.b[y_index][x_index],self.a[y_index][x_index])
 
     def draw(self, doc, cx, cy):
@@ -169,28 +201,70 @@ class ImageGrid(MapLayer):
             width_px *= 2
         x_step = (max_e - min_e)/width_px
         y_step = (max_n - min_n)/height_px
-        # create an image canvas and fill out each point
-        c = PngCanvas(height_px, width_px)
-        for x in range(width_px):
-            e = min_e + (x_step/2) + x*x_step
+        eastings = [min_e + (x_step/2) + x*x_step for x in range(width_px)]
+        northings = [max_n - (y_step / 2) - y*y_step for y in range(height_px)]
+
+        # use a palette if the cells (and transparent, for pixels outside the plot area) have at most 256 colours
+        # each row of cell values gets an extra value at the end, for pixels outside the plot area
+        colours = {0}
+        for cells in self.cells:
+            colours.update(cells)
+        if len(colours) <= 256:
+            palette = sorted(colours)
+            lookup = {colour:index for (index,colour) in enumerate(palette)}
+            rows = [bytes(map(lookup.__getitem__,cells))+bytes([lookup[0]]) for cells in self.cells]
+            pixels = bytearray([lookup[0]])*(width_px*height_px)
+            make_line = bytes
+        else:
+            palette = None
+            rows = [cells+array("I",[0]) for cells in self.cells]
+            pixels = array("I",bytes(4*width_px*height_px))
+            make_line = lambda values: array("I",values)
+        outside = self.columns
+
+        # find the nearest cell to each pixel, caching the nearest row and column for each latitude and longitude
+        row_indices = {}
+        column_indices = {}
+        def getRowIndex(lat):
+            if lat not in row_indices:
+                row_indices[lat] = self.getRowIndex(lat)
+            return row_indices[lat]
+        def getColumnIndex(lon):
+            if lon not in column_indices:
+                x_index = self.getColumnIndex(lon)
+                column_indices[lon] = outside if x_index is None else x_index
+            return column_indices[lon]
+
+        if self.projection.isSeparable():
+            # unproject one row and one column of pixels, then assemble the image a row at a time
+            lons = [lon for (lon,_) in self.projection.toLonLatArray([(e,northings[0]) for e in eastings])]
+            lats = [lat for (_,lat) in self.projection.toLonLatArray([(eastings[0],n) for n in northings])]
+            x_indices = [getColumnIndex(lon) for lon in lons]
+            lines = {}
             for y in range(height_px):
-                n = max_n - (y_step / 2) - y*y_step
-                # (e,n) is the easting and northing of each pixel
-                # now get the lon/lat according to the map CRS
-                (lon,lat) = self.projection.toLonLat((e,n))
-                if lon < min_lon or lon > max_lon or lat < min_lat or lat > max_lat:
-                    # transparent pixel
-                    c.addpixel(x,y,0,0,0,0)
-                else:
-                    # obtain the closest (r,g,b,a) in the input data
-                    (r,g,b,a) = self.getValueAt(lon,lat)
-                    c.addpixel(x,y,r,g,b,a)
+                y_index = getRowIndex(lats[y])
+                if y_index is None:
+                    continue
+                if y_index not in lines:
+                    lines[y_index] = make_line(map(rows[y_index].__getitem__,x_indices))
+                pixels[y*width_px:(y+1)*width_px] = lines[y_index]
+        else:
+            blank = rows[0][outside] if rows else 0
+            for x in range(width_px):
+                # get the lon/lat of every pixel in the column according to the map CRS
+                lon_lats = self.projection.toLonLatArray([(eastings[x],n) for n in northings])
+                column = []
+                for (lon,lat) in lon_lats:
+                    y_index = getRowIndex(lat)
+                    column.append(blank if y_index is None else rows[y_index][getColumnIndex(lon)])
+                pixels[x::width_px] = make_line(column)
 
-        file = io.BytesIO()
-        c.write(file)
-        file.seek(0)
+        if palette is not None:
+            png = PngCanvas.encodeIndexed(width_px,height_px,pixels,[colour.to_bytes(4,sys.byteorder) for colour in palette])
+        else:
+            png = PngCanvas.encodeTrueColour(width_px,height_px,pixels.tobytes())
 
-        uri = "data:image/png;charset=US-ASCII;base64," + str(base64.b64encode(file.read()), "utf-8")
+        uri = datauri("image/png",content_bytes=png)
 
         i = image(ox,oy,self.width,self.height,uri)
         i.addAttr("preserveAspectRatio","none")
@@ -44,8 +44,14 @@ class KDE(MapLayer):
         nr_samples_across(int): number of points to sample for contours across the plot
         contour_bands(int): the number of contour bands to create
         colour_manager(ContinuousColourManager) : define the colours used in the plot
+        cutoff(float): ignore the contribution of points further than this many bandwidths from a sample (None to include all points,
+            "auto" to use GAUSSIAN_CUTOFF with the default gaussian kernel and include all points with a custom kernel)
     """
-    def __init__(self,data,lon=0,lat=1,colour=None,kernel=None,bandwidth=1000,nr_samples_across=20,contour_bands=10,colour_manager=None,label_fn=lambda x:"%.2f"%(x),font_height=8,text_attributes={}):
+
+    # the gaussian kernel at 4 bandwidths is around 0.03% of its peak value
+    GAUSSIAN_CUTOFF = 4
+
+    def __init__(self,data,lon=0,lat=1,colour=None,kernel=None,bandwidth=1000,nr_samples_across=20,contour_bands=10,colour_manager=None,label_fn=lambda x:"%.2f"%(x),font_height=8,text_attributes={},cutoff="auto"):
         super(KDE, self).__init__()
         dataset = Dataset(data)
         self.data = dataset.query([lon,lat,colour if colour is not None else Dataset.constant(1)])
@@ -63,6 +69,11 @@ class KDE(MapLayer):
         self.contour_bands = contour_bands
         self.label_fn = label_fn
         self.boundaries = None
+        if cutoff == "auto":
+            cutoff = KDE.GAUSSIAN_CUTOFF if kernel is None else None
+        if cutoff is not None and not cutoff > 0:
+            raise Exception("KDE cutoff must be greater than 0 (or None to include all points)")
+        self.cutoff = cutoff
 
     def getBoundaries(self):
         if not self.boundaries:
@@ -90,6 +101,18 @@ class KDE(MapLayer):
     def getWidth(self):
         return self.width
 
+    # bucket projected (x,y,value) points into a dict keyed on the (column,row) of a grid of square cells
+    @staticmethod
+    def buildIndex(points,cell_size):
+        index = {}
+        for point in points:
+            key = (math.floor(point[0]/cell_size),math.floor(point[1]/cell_size))
+            if key in index:
+                index[key].append(point)
+            else:
+                index[key] = [point]
+        return index
+
     def buildLayer(self,fmt):
 
         progress = Progress("kde")
@@ -97,20 +120,41 @@ class KDE(MapLayer):
         sw = self.boundaries[0]
         ne = self.boundaries[1]
 
+        # project each point once
+        projected = self.projection.fromLonLatArray([(loc_lon,loc_lat) for (loc_lon,loc_lat,_) in self.data])
+        points = [(lx,ly,value) for ((lx,ly),(_,_,value)) in zip(projected,self.data)]
+
+        index = None
+        if self.cutoff is not None:
+            # only points in the cell containing a sample, or in the surrounding cells, can be within the cutoff
+            cell_size = self.cutoff*self.bandwidth
+            max_dist_sq = cell_size**2
+            index = KDE.buildIndex(points,cell_size)
+
+        kernel = self.kernel
+        bandwidth = self.bandwidth
         maxval = 0
         for row in range(0,self.nr_samples_down+1):
             yfrac = row / self.nr_samples_down
             tdata_row = []
-            for column in range(0,self.nr_samples_across+1):
-                xfrac = column / self.nr_samples_across
-                lon = sw[0] + xfrac * (ne[0]-sw[0])
-                lat = ne[1] + yfrac * (sw[1]-ne[1])
-                (sx,sy) = self.projection.fromLonLat((lon,lat))
+            lat = ne[1] + yfrac * (sw[1]-ne[1])
+            # project the sample positions along this row in one call
+            samples = self.projection.fromLonLatArray(
+                [(sw[0] + (column / self.nr_samples_across) * (ne[0]-sw[0]),lat) for column in range(0,self.nr_samples_across+1)])
+            for (sx,sy) in samples:
                 val = 0
-                for (loc_lon,loc_lat,value) in self.data:
-                    (lx,ly) = self.projection.fromLonLat((loc_lon,loc_lat))
-                    dist = math.sqrt((lx-sx)**2+(ly-sy)**2)
-                    val += value*self.kernel(dist/self.bandwidth)
+                if index is None:
+                    for (lx,ly,value) in points:
+                        dist = math.sqrt((lx-sx)**2+(ly-sy)**2)
+                        val += value*kernel(dist/bandwidth)
+                else:
+                    col = math.floor(sx/cell_size)
+                    rw = math.floor(sy/cell_size)
+                    for key in ((col+dc,rw+dr) for dc in (-1,0,1) for dr in (-1,0,1)):
+                        for (lx,ly,value) in index.get(key,()):
+                            dist_sq = (lx-sx)**2+(ly-sy)**2
+                            if dist_sq <= max_dist_sq:
+                                val += value*kernel(math.sqrt(dist_sq)/bandwidth)
                 val = val/(len(self.data)*self.bandwidth)
                 if val > maxval:
                     maxval = val
@@ -40,6 +40,7 @@ class MapLayer(DiagramElement):
         self.visible = True
         self.colour_manager = None
         self.marker_manager = None
+        self.en_origin = None
 
     def setPalette(self, colour_manager):
         self.colour_manager = colour_manager
@@ -125,13 +126,34 @@ class MapLayer(DiagramElement):
         (x, y) = self.projection.fromLonLat((lon, lat))
         return self.getXY((x,y))
 
+    def getXYFromLonLatArray(self,lon_lats):
+        return self.getXYArray(self.projection.fromLonLatArray(lon_lats))
+
+    def getENOrigin(self):
+        # the easting of the west boundary and northing of the north boundary,
+        # cached until the projection or boundaries are reassigned
+        (projection,boundaries,origin) = self.en_origin or (None,None,None)
+        if projection is not self.projection or boundaries is not self.boundaries:
+            on = self.projection.fromLonLat(self.boundaries[1])[1]
+            oe = self.projection.fromLonLat(self.boundaries[0])[0]
+            origin = (oe,on)
+            self.en_origin = (self.projection,self.boundaries,origin)
+        return origin
+
     def getXY(self,e_n):
         (x,y) = e_n
         ox = self.center_x - self.width/2
         oy = self.center_y - self.height/2
-        on = self.projection.fromLonLat(self.boundaries[1])[1]
-        oe = self.projection.fromLonLat(self.boundaries[0])[0]
+        (oe,on) = self.getENOrigin()
         cx = ox + (x - oe) * self.scale_x
         cy = oy + (on - y) * self.scale_y
         return (cx,cy)
 
+    def getXYArray(self,e_ns):
+        ox = self.center_x - self.width/2
+        oy = self.center_y - self.height/2
+        (oe,on) = self.getENOrigin()
+        scale_x = self.scale_x
+        scale_y = self.scale_y
+        return [(ox + (x - oe) * scale_x, oy + (on - y) * scale_y) for (x,y) in e_ns]
+
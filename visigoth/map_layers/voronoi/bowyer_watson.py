@@ -28,8 +28,6 @@ def circumcircle(ax,ay,bx,by,cx,cy):
     ux = 1/D * ((ax**2 + ay**2)*(by-cy)+(bx**2 + by**2)*(cy-ay)+(cx**2 + cy **2)*(ay - by))
     uy = 1/D * ((ax**2 + ay**2)*(cx-bx)+(bx**2 + by**2)*(ax-cx)+(cx**2 + cy **2)*(bx - ax))
     r = math.sqrt((ax-ux)**2+(ay-uy)**2)
-    r2 = math.sqrt((bx-ux)**2+(by-uy)**2)
-    r3 = math.sqrt((cx-ux)**2+(cy-uy)**2)
     return (ux,uy,r)
 
 def in_circumcircle(p,tri):
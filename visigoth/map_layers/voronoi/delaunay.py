@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+
+#    Visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import math
+
+class Delaunay(object):
+    """
+    Compute the Delaunay triangulation of a set of points and its dual, the Voronoi diagram
+
+    Arguments:
+        points (list): a list of (x,y) tuples
+
+    Notes:
+        Points are inserted incrementally (Bowyer-Watson) in a spatially coherent order.  Each new point
+        is located by walking across the triangulation from the most recently created triangle and
+        the cavity of triangles whose circumcircle contains the point is found by searching outwards
+        through triangle neighbours, so that construction takes O(n log n) time for typical inputs.
+        Duplicate points share the triangulation vertex of their first occurrence.  The triangulation is
+        closed off with "ghost" triangles joining each convex hull edge to a vertex at infinity, whose
+        circumcircle is the open half-plane outside the edge, so no triangles along the hull are lost.
+    """
+
+    def __init__(self,points):
+        self.points = [(float(x),float(y)) for (x,y) in points]
+        self.n = len(self.points)
+
+        # triangles are stored in flat lists, triangle t has vertices
+        # vertices[3*t],vertices[3*t+1],vertices[3*t+2] in counter-clockwise order
+        # and neighbours[3*t+i] holds the triangle sharing the edge opposite vertex i (or -1)
+        self.vertices = []
+        self.neighbours = []
+        self.alive = []
+        self.centres = []
+
+        # map from each point index to the index of the vertex used for it (differs only for duplicates)
+        self.vertex_for_point = list(range(self.n))
+        # map from each vertex to one (alive) triangle which includes it
+        self.vertex_triangle = []
+        # index of the vertex at infinity
+        self.ghost = self.n
+        self.last_triangle = 0
+
+        self.triangulate()
+
+    @staticmethod
+    def spatialOrder(points):
+        # order points along a snake path through a grid of bins so that successive
+        # insertions are close together and point location walks remain short
+        n = len(points)
+        if n < 2:
+            return list(range(n))
+        xs = [x for (x,_) in points]
+        ys = [y for (_,y) in points]
+        min_x = min(xs)
+        min_y = min(ys)
+        x_range = (max(xs) - min_x) or 1
+        y_range = (max(ys) - min_y) or 1
+        bins = max(1,int(math.sqrt(n/2)))
+        keys = []
+        for idx in range(n):
+            col = min(bins-1,int(bins*(xs[idx]-min_x)/x_range))
+            row = min(bins-1,int(bins*(ys[idx]-min_y)/y_range))
+            if row % 2:
+                keys.append((row,-col,-xs[idx],idx))
+            else:
+                keys.append((row,col,xs[idx],idx))
+        keys.sort()
+        return [k[-1] for k in keys]
+
+    def addTriangle(self,a,b,c):
+        t = len(self.alive)
+        self.vertices += [a,b,c]
+        self.neighbours += [-1,-1,-1]
+        self.alive.append(True)
+        self.centres.append(None)
+        self.vertex_triangle[a] = t
+        self.vertex_triangle[b] = t
+        self.vertex_triangle[c] = t
+        return t
+
+    def orient(self,a,b,px,py):
+        # positive if (px,py) lies to the left of the directed edge from vertex a to vertex b
+        (ax,ay) = self.coords[a]
+        (bx,by) = self.coords[b]
+        return (bx-ax)*(py-ay) - (by-ay)*(px-ax)
+
+    def ghostEdge(self,t):
+        # return the hull edge (a,b) of ghost triangle t, the ghost vertex lies to the left of a to b
+        vertices = self.vertices
+        base = 3*t
+        k = 0 if vertices[base] == self.ghost else (1 if vertices[base+1] == self.ghost else 2)
+        return (vertices[base+(k+1)%3],vertices[base+(k+2)%3])
+
+    def inCircumcircle(self,t,px,py):
+        coords = self.coords
+        vertices = self.vertices
+        ghost = self.ghost
+        base = 3*t
+        if vertices[base] == ghost or vertices[base+1] == ghost or vertices[base+2] == ghost:
+            # the circumcircle of a ghost triangle is the open half-plane outside its hull edge,
+            # plus the interior of the edge itself
+            (a,b) = self.ghostEdge(t)
+            o = self.orient(a,b,px,py)
+            if o != 0:
+                return o > 0
+            (ax,ay) = coords[a]
+            (bx,by) = coords[b]
+            return (px-ax)*(px-bx) + (py-ay)*(py-by) < 0
+        (ax,ay) = coords[vertices[base]]
+        (bx,by) = coords[vertices[base+1]]
+        (cx,cy) = coords[vertices[base+2]]
+        adx = ax-px
+        ady = ay-py
+        bdx = bx-px
+        bdy = by-py
+        cdx = cx-px
+        cdy = cy-py
+        det = (adx*adx+ady*ady)*(bdx*cdy-cdx*bdy) \
+            - (bdx*bdx+bdy*bdy)*(adx*cdy-cdx*ady) \
+            + (cdx*cdx+cdy*cdy)*(adx*bdy-bdx*ady)
+        return det > 0
+
+    def locate(self,px,py):
+        # walk from the last created triangle towards a triangle whose circumcircle contains (px,py),
+        # ending either at the real triangle containing it or at a ghost triangle if it lies outside the hull
+        vertices = self.vertices
+        neighbours = self.neighbours
+        ghost = self.ghost
+        t = self.last_triangle
+        steps = 0
+        max_steps = len(self.alive)
+        while steps <= max_steps:
+            steps += 1
+            base = 3*t
+            if ghost in vertices[base:base+3]:
+                k = vertices.index(ghost,base,base+3) - base
+                (a,b) = self.ghostEdge(t)
+                o = self.orient(a,b,px,py)
+                if o < 0:
+                    # step back inside the hull
+                    t = neighbours[base+k]
+                elif o > 0 or self.inCircumcircle(t,px,py):
+                    return t
+                else:
+                    # on the line through a collinear hull edge, move along the hull towards the point
+                    (ax,ay) = self.coords[a]
+                    (bx,by) = self.coords[b]
+                    if (px-ax)*(bx-ax) + (py-ay)*(by-ay) > 0:
+                        t = neighbours[base+(k+1)%3]
+                    else:
+                        t = neighbours[base+(k+2)%3]
+                continue
+            for i in range(3):
+                a = vertices[base+(i+1)%3]
+                b = vertices[base+(i+2)%3]
+                if self.orient(a,b,px,py) < 0:
+                    t = neighbours[base+i]
+                    break
+            else:
+                return t
+        # walking failed (should only arise for degenerate input), fall back to a linear scan
+        for t in range(len(self.alive)):
+            if self.alive[t] and self.inCircumcircle(t,px,py):
+                return t
+        return self.last_triangle
+
+    def initialTriangle(self,order):
+        # find three points which are not collinear to start the triangulation, returning their
+        # positions in order, or None if all points are collinear
+        points = self.points
+        first = order[0]
+        (ax,ay) = points[first]
+        second = None
+        for pos in range(1,len(order)):
+            idx = order[pos]
+            (px,py) = points[idx]
+            if second is None:
+                if (px,py) != (ax,ay):
+                    second = pos
+                    (bx,by) = (px,py)
+            elif (bx-ax)*(py-ay) - (by-ay)*(px-ax) != 0:
+                return (0,second,pos)
+        return None
+
+    def triangulate(self):
+        self.coords = self.points
+        self.vertex_triangle = [-1]*(self.n+1)
+        if self.n < 3:
+            return
+
+        order = Delaunay.spatialOrder(self.points)
+        initial = self.initialTriangle(order)
+        if initial is None:
+            return
+
+        # start from a counter-clockwise triangle and a ghost triangle outside each of its edges
+        (a,b,c) = [order[pos] for pos in initial]
+        if self.orient(a,b,*self.points[c]) < 0:
+            (b,c) = (c,b)
+        ghost = self.ghost
+        t = self.addTriangle(a,b,c)
+        g0 = self.addTriangle(c,b,ghost)
+        g1 = self.addTriangle(a,c,ghost)
+        g2 = self.addTriangle(b,a,ghost)
+        vertices = self.vertices
+        neighbours = self.neighbours
+        alive = self.alive
+        neighbours[3*t:3*t+3] = [g0,g1,g2]
+        neighbours[3*g0:3*g0+3] = [g2,g1,t]
+        neighbours[3*g1:3*g1+3] = [g0,g2,t]
+        neighbours[3*g2:3*g2+3] = [g1,g0,t]
+        self.last_triangle = t
+
+        seen = {}
+        for p in [a,b,c]:
+            seen[self.points[p]] = p
+        skip = set(initial)
+
+        for pos in range(len(order)):
+            if pos in skip:
+                continue
+            p = order[pos]
+            pt = self.points[p]
+            if pt in seen:
+                self.vertex_for_point[p] = seen[pt]
+                continue
+            seen[pt] = p
+            (px,py) = pt
+
+            # find the cavity of triangles whose circumcircle contains the point
+            start = self.locate(px,py)
+            cavity = {start}
+            stack = [start]
+            boundary = []
+            while stack:
+                t = stack.pop()
+                base = 3*t
+                for i in range(3):
+                    nt = neighbours[base+i]
+                    if nt in cavity:
+                        continue
+                    if self.inCircumcircle(nt,px,py):
+                        cavity.add(nt)
+                        stack.append(nt)
+                    else:
+                        boundary.append((vertices[base+(i+1)%3],vertices[base+(i+2)%3],nt))
+
+            for t in cavity:
+                alive[t] = False
+
+            # fill the cavity with a fan of triangles around the new point
+            edge_start = {}
+            edge_end = {}
+            for (a,b,nt) in boundary:
+                t = self.addTriangle(a,b,p)
+                # the edge (a,b) is opposite the new point
+                neighbours[3*t+2] = nt
+                nbase = 3*nt
+                for j in range(3):
+                    if vertices[nbase+j] != a and vertices[nbase+j] != b:
+                        neighbours[nbase+j] = t
+                        break
+                edge_start[a] = t
+                edge_end[b] = t
+            for (a,t) in edge_start.items():
+                # triangle (a,b,p) shares edge (p,a) with the triangle whose boundary edge ends at a
+                # and edge (b,p) with the triangle whose boundary edge starts at b
+                ot = edge_end[a]
+                neighbours[3*t+1] = ot
+                neighbours[3*ot] = t
+            self.last_triangle = len(alive)-1
+
+    def isReal(self,t):
+        base = 3*t
+        n = self.n
+        return self.alive[t] and self.vertices[base] < n and self.vertices[base+1] < n and self.vertices[base+2] < n
+
+    def getTriangles(self):
+        """
+        Get the triangles of the Delaunay triangulation
+
+        Returns:
+            list of triangles, each a tuple of three (x,y) tuples
+        """
+        points = self.points
+        vertices = self.vertices
+        return [(points[vertices[3*t]],points[vertices[3*t+1]],points[vertices[3*t+2]])
+                for t in range(len(self.alive)) if self.isReal(t)]
+
+    def getCircumcentre(self,t):
+        centre = self.centres[t]
+        if centre is None:
+            coords = self.coords
+            (ax,ay) = coords[self.vertices[3*t]]
+            (bx,by) = coords[self.vertices[3*t+1]]
+            (cx,cy) = coords[self.vertices[3*t+2]]
+            d = 2 * (ax*(by-cy)+bx*(cy-ay)+cx*(ay-by))
+            a2 = ax*ax+ay*ay
+            b2 = bx*bx+by*by
+            c2 = cx*cx+cy*cy
+            centre = ((a2*(by-cy)+b2*(cy-ay)+c2*(ay-by))/d,(a2*(cx-bx)+b2*(ax-cx)+c2*(bx-ax))/d)
+            self.centres[t] = centre
+        return centre
+
+    def getFan(self,v):
+        # return the triangles around vertex v in counter-clockwise order,
+        # starting after the gap caused by ghost triangles for vertices on the convex hull
+        t0 = self.vertex_triangle[v]
+        if t0 < 0:
+            return []
+        vertices = self.vertices
+        neighbours = self.neighbours
+        fan = []
+        t = t0
+        while True:
+            base = 3*t
+            i = 0 if vertices[base] == v else (1 if vertices[base+1] == v else 2)
+            fan.append(t)
+            t = neighbours[base+(i+1)%3]
+            if t == t0:
+                break
+        real = [self.isReal(t) for t in fan]
+        if all(real):
+            return fan
+        gap = real.index(False)
+        fan = fan[gap:] + fan[:gap]
+        return [t for t in fan if self.isReal(t)]
+
+    def getVoronoiCell(self,index):
+        """
+        Get the Voronoi cell around a point
+
+        Arguments:
+            index (int): the index of the point in the list passed to the constructor
+
+        Returns:
+            list of (x,y) tuples forming the cell polygon in counter-clockwise order
+
+        Notes:
+            cells of points on the convex hull of the input are open, the polygon returned joins the ends
+        """
+        v = self.vertex_for_point[index]
+        return [self.getCircumcentre(t) for t in self.getFan(v)]
+
+    def getVoronoiCells(self):
+        """
+        Get the Voronoi cells around all points
+
+        Returns:
+            list of cell polygons, one for each input point, see getVoronoiCell
+        """
+        return [self.getVoronoiCell(index) for index in range(self.n)]
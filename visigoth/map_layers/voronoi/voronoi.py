@@ -25,7 +25,7 @@ from visigoth.svg import circle,polygon
 from visigoth.map_layers import MapLayer
 from visigoth.utils.mapping import Mapping
 from visigoth.utils.js import Js
-from visigoth.map_layers.voronoi.bowyer_watson import circumcircle, bowyer_watson
+from visigoth.map_layers.voronoi.delaunay import Delaunay
 
 from visigoth.utils.colour import DiscreteColourManager, ContinuousColourManager
 from visigoth.utils.marker import MarkerManager
@@ -104,22 +104,12 @@ class Voronoi(MapLayer):
         for (d,dc) in t:
             self.min_r[d] = min([self.distance(dc,dc2) for (d2,dc2) in t if d != d2])/2
 
-    def dual(self,triangles,center):
-        (x,y) = center
-        def triangle_bisector(triangle):
-            ((ax,ay),(bx,by),(cx,cy)) = triangle
-            (ux,uy,_) = circumcircle(ax,ay,bx,by,cx,cy)
-            return (ux,uy)
-        points = map(triangle_bisector,triangles)
-        points_and_angle = map(lambda p:(math.atan2(p[0]-x,p[1]-y),p),points)
-        return [(p[1][0],p[1][1]) for p in sorted(points_and_angle,key=lambda x:x[0])]
-
     def build(self,fmt):
         super().build(fmt)
         self.data = []
-        for (lon,lat,col,label,size) in self.input_data:
-            prj = self.projection.fromLonLat((lon,lat))
-            self.data.append((prj[0],prj[1],col,label,size))
+        prjs = self.projection.fromLonLatArray([(lon,lat) for (lon,lat,_,_,_) in self.input_data])
+        for ((x,y),(_,_,col,label,size)) in zip(prjs,self.input_data):
+            self.data.append((x,y,col,label,size))
 
         self.min_data_x = min([p[0] for p in self.data])
         self.max_data_x = max([p[0] for p in self.data])
@@ -145,11 +135,9 @@ class Voronoi(MapLayer):
         self.data.append((self.min_data_x - self.x_data_range,self.min_data_y - self.y_data_range,None,"",0))
 
         points=[(x,y) for (x,y,_,_,_) in self.data]
-        delaunay = bowyer_watson(points)
+        cells = Delaunay(points).getVoronoiCells()
 
-        for (x,y,col,label,size) in self.data:
-            triangles = [triangle for triangle in delaunay if (x,y) in list(triangle)]
-            polygon_points = self.dual(triangles,(x,y))
+        for ((x,y,col,label,size),polygon_points) in zip(self.data,cells):
             self.polygons.append((polygon_points,col,label))
 
     def draw(self,doc,cx,cy):      
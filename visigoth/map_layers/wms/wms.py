@@ -263,17 +263,21 @@ class WMS(MapLayer):
                         "height":self.height}
                     if self.date != None:
                         parameters["date"] = self.date
-                    resolved_url = WMS.getMapUrl(url,parameters)
-                    if self.embed_images:
-                        try:
-                            self.content[zoom][(zx,zy)] = HttpCache.fetch(resolved_url)
-                        except:
-                            print("Unable to download WMS image from %s"%(resolved_url))
-                            self.content[zoom][(zx, zy)] = b""
-                    else:
-                        self.content[zoom][(zx, zy)] = resolved_url
+                    self.content[zoom][(zx, zy)] = WMS.getMapUrl(url,parameters)
             zoom *= 2
 
+        if self.embed_images:
+            # prefetch the images for all zoom levels concurrently, then swap each url for the image content
+            urls = [resolved_url for images in self.content.values() for resolved_url in images.values()]
+            fetched = HttpCache.fetchAll(urls,label="Downloading WMS images")
+            for images in self.content.values():
+                for key in images:
+                    resolved_url = images[key]
+                    images[key] = fetched[resolved_url]
+                    if images[key] is None:
+                        print("Unable to download WMS image from %s"%(resolved_url))
+                        images[key] = b""
+
 
     def getBoundaries(self):
         return self.bounds
@@ -24,6 +24,8 @@ import os
 from visigoth.common.image import Image
 from visigoth.utils.httpcache import HttpCache
 from visigoth.utils.js import Js
+from visigoth.utils.image.png_reader import PngReader
+from visigoth.utils.image.png_canvas import PngCanvas
 from visigoth.map_layers import MapLayer
 from visigoth.svg import rectangle
 
@@ -43,10 +45,13 @@ class WMTS(MapLayer):
             image_type(str): the type of the returned images as "jpeg" or "png", can usually be determined from the URL
             attribution(str): set the attribution text for the WMTS provider
             attribution_link(str): set the attribution link for the WMTS provider
-            
+            embed_images(bool): embed the tile images in the output, otherwise link to the tile urls
+            mosaic(bool): combine the tiles for each zoom level into a single image cropped to the map
+
     Note:  this WMTS layer can only currently work with the default Web Mercator (EPSG:3857) projection
+           mosaicking requires embedded PNG tiles, zoom levels with other tiles are drawn tile by tile
     """
-    def __init__(self,url=default_url,image_type=None,attribution=default_attribution, attribution_link=default_attribution_link,embed_images=True):
+    def __init__(self,url=default_url,image_type=None,attribution=default_attribution, attribution_link=default_attribution_link,embed_images=True,mosaic=False):
         super(WMTS, self).__init__()
         self.setInfo(name="WMTS",attribution=attribution,url=attribution_link)
         self.bounds = None
@@ -65,6 +70,7 @@ class WMTS(MapLayer):
         self.content = {}
         self.zoom = 0
         self.embed_images = embed_images
+        self.mosaic = mosaic
     
     def configureLayer(self,ownermap,width,height,boundaries,projection,zoom_to,fmt):
         self.ownermap = ownermap
@@ -148,16 +154,68 @@ class WMTS(MapLayer):
             for tilex in range(txmin,txmax+1):
                 for tiley in range(tymin,tymax+1):
                     url =  self.wmts_url.replace("{z}",str(wmts_zoom)).replace("{x}",str(tilex)).replace("{y}",str(tiley))
-                    if self.embed_images:
-                        try:
-                            self.content[zoom_level]["tiles"][(tilex,tiley)] = HttpCache.fetch(url)
-                        except Exception as ex:
-                            self.content[zoom_level]["tiles"][(tilex, tiley)] = b""
-                    else:
-                        self.content[zoom_level]["tiles"][(tilex, tiley)] = url
+                    self.content[zoom_level]["tiles"][(tilex, tiley)] = url
             zoom_level *= 2
             wmts_zoom += 1
 
+        if self.embed_images:
+            # prefetch the tiles for all zoom levels concurrently, then swap each url for the tile content
+            urls = [url for level in self.content.values() for url in level["tiles"].values()]
+            fetched = HttpCache.fetchAll(urls,label="Downloading WMTS tiles")
+            for level in self.content.values():
+                tiles = level["tiles"]
+                for key in tiles:
+                    tiles[key] = fetched[tiles[key]] or b""
+            if self.mosaic and self.image == "png":
+                for zoom_level in self.content:
+                    self.content[zoom_level]["mosaic"] = self.buildMosaic(zoom_level)
+
+    def buildMosaic(self,zoom_level):
+        # composite the tiles for a zoom level into one image, cropped to the map boundaries
+        # returns (x,y,width,height,png content) in tile pixel coordinates relative to the NW tile,
+        # or None if the tiles could not be decoded
+        level = self.content[zoom_level]
+        tiles = level["tiles"]
+        xtilemin = min([xtile for (xtile,_) in tiles])
+        ytilemin = min([ytile for (_,ytile) in tiles])
+        cols = max([xtile for (xtile,_) in tiles])-xtilemin+1
+        rows = max([ytile for (_,ytile) in tiles])-ytilemin+1
+
+        # the map centre lies at (offset_x,offset_y)*zoom_level in tile pixel coordinates
+        half_width = zoom_level*self.width/(2*level["scale"])
+        half_height = zoom_level*self.height/(2*level["scale"])
+        x0 = max(0,int(math.floor(level["offset_x"]*zoom_level-half_width)))
+        y0 = max(0,int(math.floor(level["offset_y"]*zoom_level-half_height)))
+        x1 = min(cols*256,int(math.ceil(level["offset_x"]*zoom_level+half_width)))
+        y1 = min(rows*256,int(math.ceil(level["offset_y"]*zoom_level+half_height)))
+        if x1 <= x0 or y1 <= y0:
+            return None
+        width = x1-x0
+        height = y1-y0
+
+        pixels = bytearray(width*height*4)
+        for ((xtile,ytile),content) in tiles.items():
+            if not content:
+                continue
+            try:
+                (tile_width,tile_height,tile_pixels) = PngReader.decode(content)
+            except Exception:
+                return None
+            if tile_width != 256 or tile_height != 256:
+                return None
+            # copy the part of the tile within the crop, row by row
+            tx = 256*(xtile-xtilemin)
+            ty = 256*(ytile-ytilemin)
+            cx0 = max(x0,tx)
+            cx1 = min(x1,tx+256)
+            if cx1 <= cx0:
+                continue
+            for y in range(max(y0,ty),min(y1,ty+256)):
+                src = ((y-ty)*256+cx0-tx)*4
+                dst = ((y-y0)*width+cx0-x0)*4
+                pixels[dst:dst+(cx1-cx0)*4] = tile_pixels[src:src+(cx1-cx0)*4]
+        return (x0,y0,width,height,PngCanvas.encodeRGBA(width,height,pixels))
+
     def getBoundaries(self):
         return self.bounds
 
@@ -184,6 +242,13 @@ class WMTS(MapLayer):
             xtilemin = min([xtile for (xtile,_) in tiles])
             ytilemin = min([ytile for (_,ytile) in tiles])
             tilesz = 256.0/zoom
+            mosaic = self.content[zoom].get("mosaic",None)
+            if mosaic is not None:
+                (x0,y0,mosaic_width,mosaic_height,mosaic_content) = mosaic
+                i = Image("image/png",content_bytes=mosaic_content,width=mosaic_width/zoom,height=mosaic_height/zoom)
+                i.draw(doc,ox=ox+x0/zoom,oy=oy+y0/zoom)
+                # the mosaic replaces the individual tiles
+                tiles = {}
             for (xtile,ytile) in tiles:
                 i = None
                 if self.embed_images:
@@ -228,4 +293,3 @@ class WMTS(MapLayer):
         if not self.embed_images:
             config["image_urls_by_zoom"] = image_urls_by_zoom
         Js.registerJs(doc,self,jscode,"wmts",cx,cy,config)
-        
\ No newline at end of file
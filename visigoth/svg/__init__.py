@@ -36,6 +36,8 @@ from .rectangle import rectangle
 from .sector import sector
 from .svgdefinition import svgdefinition
 from .svgdoc import svgdoc
+from .svgwriter import svgwriter
+from .datauri import datauri
 from .svgstyled import svgstyled
 from .text import text
 from .tspan import tspan
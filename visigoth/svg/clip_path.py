@@ -42,4 +42,10 @@ class clip_path(svgdefinition):
         for region in self.regions:
             region.render(svgdoc,cp)
         svgdoc.defs.appendChild(cp)
-        return cp
\ No newline at end of file
+        return cp
+
+    def write(self,svgdoc,writer):
+        writer.openElement("clipPath",{"id":self.getId()})
+        for region in self.regions:
+            region.write(svgdoc,writer)
+        writer.closeElement()
\ No newline at end of file
@@ -33,12 +33,23 @@ class css_snippet(svgdefinition):
         css_snippet.counter += 1
         self.css = css
 
+    # css may be a string, or a list of strings and datauri objects to be concatenated
+    def getCss(self):
+        if isinstance(self.css,str):
+            return self.css
+        return "".join(str(part) for part in self.css)
+
     def render(self,svgdoc):
         doc = svgdoc.doc
         s = doc.createElement("style")
         s.setAttribute("id", self.getId())
         s.setAttribute("type","text/css")
-        marker = svgdoc.getMarker(self.css)
+        marker = svgdoc.getMarker(self.getCss())
         s.appendChild(doc.createTextNode(marker))
         svgdoc.defs.appendChild(s)
         return s
+
+    def write(self,svgdoc,writer):
+        writer.openElement("style",{"id":self.getId(),"type":"text/css"})
+        writer.addRaw(self.css)
+        writer.closeElement()
@@ -23,6 +23,24 @@ from math import cos,sin,pi
 import json
 
 from visigoth.svg.svgstyled import svgstyled
+from visigoth.svg.svgdefinition import svgdefinition
+
+# the path along which a curvedtext is drawn
+class curvedtext_path(svgdefinition):
+
+    def __init__(self,id,path):
+        svgdefinition.__init__(self,id)
+        self.path = path
+
+    def render(self,svgdoc):
+        p = svgdoc.doc.createElement("path")
+        p.setAttribute("id",self.getId())
+        p.setAttribute("d",self.path)
+        svgdoc.defs.appendChild(p)
+        return p
+
+    def write(self,svgdoc,writer):
+        writer.addElement("path",{"id":self.getId(),"d":self.path})
 
 class curvedtext(svgstyled):
 
@@ -44,13 +62,15 @@ class curvedtext(svgstyled):
     def render(self,svgdoc,parent):
         t = super().render(svgdoc,parent)
         doc = svgdoc.doc
-        p = doc.createElement("path")
-        p.setAttribute("id",self.id)
-        p.setAttribute("d",self.path)
-        svgdoc.defs.appendChild(p)
+        curvedtext_path(self.id,self.path).render(svgdoc)
         tp = doc.createElement("textPath")
         tp.setAttribute("xlink:href","#"+self.id)
         tp.setAttribute("startOffset","50%")
         t.appendChild(tp)
         tp.appendChild(doc.createTextNode(self.text))
-        return tp
\ No newline at end of file
+        return tp
+
+    def writeContent(self,svgdoc,writer):
+        # the path is written to the definitions at the end of the document
+        svgdoc.add(curvedtext_path(self.id,self.path))
+        writer.addElement("textPath",{"xlink:href":"#"+self.id,"startOffset":"50%"},self.text)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+#    Visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without 
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or 
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import base64
+
+# represent binary content (held in memory or read from a file) as a base64 encoded data URI
+#
+# when a document is written to a stream (see svgdoc.write) the content is encoded in chunks,
+# without holding the complete encoded URI in memory
+class datauri(object):
+
+    # a multiple of 3 bytes so that the base64 encoded chunks can be concatenated
+    chunk_size = 3*65536
+
+    def __init__(self,mime_type,content_bytes=None,path=None,charset="US-ASCII"):
+        self.mime_type = mime_type
+        self.content_bytes = content_bytes
+        self.path = path
+        self.charset = charset
+        if self.content_bytes is None and self.path is None:
+            raise Exception("datauri requires content_bytes or path")
+
+    def getPrefix(self):
+        prefix = "data:"+self.mime_type+";"
+        if self.charset:
+            prefix += "charset="+self.charset+";"
+        return prefix + "base64,"
+
+    # yield the raw content in chunks
+    def getChunks(self):
+        if self.content_bytes is not None:
+            content = memoryview(self.content_bytes)
+            for offset in range(0,len(content),datauri.chunk_size):
+                yield content[offset:offset+datauri.chunk_size]
+        else:
+            with open(self.path,"rb") as f:
+                while True:
+                    chunk = f.read(datauri.chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    def write(self,out):
+        out.write(self.getPrefix())
+        for chunk in self.getChunks():
+            out.write(str(base64.b64encode(chunk),"utf-8"))
+
+    def __str__(self):
+        return self.getPrefix()+"".join(str(base64.b64encode(chunk),"utf-8") for chunk in self.getChunks())
@@ -30,52 +30,35 @@ class glow(svgdefinition):
     def __init__(self):
         svgdefinition.__init__(self,"glow")
 
-    def render(self,svgdoc):
-        f= svgdoc.doc.createElement("filter")
-        f.setAttribute("id",self.getId())
-
-        f.setAttribute("width","1.5")
-        f.setAttribute("height","1.5")
-        f.setAttribute("x","-0.25")
-        f.setAttribute("y","-0.25")
-        
-        flood = svgdoc.doc.createElement("feFlood")
-        flood.setAttribute("id","outline-color")
-        flood.setAttribute("flood-color","orange")
-        flood.setAttribute("result","base")
-
-        morph = svgdoc.doc.createElement("feMorphology")
-        morph.setAttribute("result","bigger")
-        morph.setAttribute("in","SourceGraphic")
-        morph.setAttribute("operator","dilate")
-        morph.setAttribute("radius","5")
+    # list the filter primitives as (tag,attributes) pairs
+    def getPrimitives(self):
+        return [
+            ("feFlood",{"id":"outline-color","flood-color":"orange","result":"base"}),
+            ("feMorphology",{"result":"bigger","in":"SourceGraphic","operator":"dilate","radius":"5"}),
+            ("feColorMatrix",{"type":"matrix","result":"mask","in":"bigger",
+                "values":"0 0 0 0 0 "+"0 0 0 0 0 "+"0 0 0 0 0 "+"0 0 0 1 0"}),
+            ("feComposite",{"result":"drop","in":"base","in2":"mask","operator":"in"}),
+            # ("feGaussianBlur",{"result":"blurred","in":"drop","stdDeviation":"5"}),
+            ("feBlend",{"in":"SourceGraphic","in2":"drop","mode":"normal"})
+        ]
 
-        cm = svgdoc.doc.createElement("feColorMatrix")
-        cm.setAttribute("type","matrix")
-        cm.setAttribute("result","mask") 
-        cm.setAttribute("in","bigger")
-        cm.setAttribute("values","0 0 0 0 0 "+"0 0 0 0 0 "+"0 0 0 0 0 "+"0 0 0 1 0")
+    def getFilterAttrs(self):
+        return {"id":self.getId(),"width":"1.5","height":"1.5","x":"-0.25","y":"-0.25"}
 
-        comp = svgdoc.doc.createElement("feComposite")
-        comp.setAttribute("result","drop")
-        comp.setAttribute("in","base") 
-        comp.setAttribute("in2","mask") 
-        comp.setAttribute("operator","in") 
-
-        #  bl = svgdoc.doc.createElement("feGaussianBlur")
-        # bl.setAttribute("result","blurred")
-        # bl.setAttribute("in","drop")
-        # bl.setAttribute("stdDeviation","5")
-        
-        mg = svgdoc.doc.createElement("feBlend")
-        mg.setAttribute("in","SourceGraphic")
-        mg.setAttribute("in2","drop")
-        mg.setAttribute("mode","normal")
+    def render(self,svgdoc):
+        f = svgdoc.doc.createElement("filter")
+        attrs = self.getFilterAttrs()
+        for name in attrs:
+            f.setAttribute(name,attrs[name])
+        for (tag,primitive_attrs) in self.getPrimitives():
+            e = svgdoc.doc.createElement(tag)
+            for name in primitive_attrs:
+                e.setAttribute(name,primitive_attrs[name])
+            f.appendChild(e)
+        svgdoc.defs.appendChild(f)
 
-        f.appendChild(flood)
-        f.appendChild(morph)
-        f.appendChild(cm)
-        f.appendChild(comp)
-        # f.appendChild(bl)
-        f.appendChild(mg)
-        svgdoc.defs.appendChild(f)
\ No newline at end of file
+    def write(self,svgdoc,writer):
+        writer.openElement("filter",self.getFilterAttrs())
+        for (tag,primitive_attrs) in self.getPrimitives():
+            writer.addElement(tag,primitive_attrs)
+        writer.closeElement()
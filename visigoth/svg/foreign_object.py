@@ -36,4 +36,7 @@ class foreign_object(svgstyled):
         fo = super().render(svgdoc,parent)
         marker = svgdoc.getMarker(self.content_str)
         fo.appendChild(svgdoc.doc.createTextNode(marker))
-        return fo
\ No newline at end of file
+        return fo
+
+    def writeContent(self, svgdoc, writer):
+        writer.addRaw(self.content_str)
\ No newline at end of file
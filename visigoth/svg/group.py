@@ -34,4 +34,7 @@ class group(svgstyled):
         for t in self.child_elements:
             t.render(svgdoc,g)
         parent.appendChild(g)
-        return g
\ No newline at end of file
+        return g
+    def writeContent(self,svgdoc,writer):
+        for t in self.child_elements:
+            t.write(svgdoc,writer)
@@ -35,22 +35,34 @@ class linear_gradient(svgdefinition):
         self.stopCol = stopCol
         self.orientation = orientation
 
+    def getGradientAttrs(self):
+        attrs = {"id":self.getId()}
+        if self.orientation == "vertical":
+            attrs["x1"] = "0"
+            attrs["x2"] = "0"
+            attrs["y1"] = "1"
+            attrs["y2"] = "0"
+        return attrs
+
+    def getStopAttrs(self):
+        return [{"offset":"0%","stop-color":self.startCol},{"offset":"100%","stop-color":self.stopCol}]
+
     def render(self,svgdoc):
         doc = svgdoc.doc
         lg = doc.createElement("linearGradient")
-        lg.setAttribute("id",self.getId())
-        if self.orientation == "vertical":
-            lg.setAttribute("x1","0")
-            lg.setAttribute("x2","0")
-            lg.setAttribute("y1","1")
-            lg.setAttribute("y2","0")
-        stop0 = doc.createElement("stop")
-        stop0.setAttribute("offset","0%")
-        stop0.setAttribute("stop-color",self.startCol)
-        stop100 = doc.createElement("stop")
-        stop100.setAttribute("offset", "100%")
-        stop100.setAttribute("stop-color", self.stopCol)
-        lg.appendChild(stop0)
-        lg.appendChild(stop100)
+        attrs = self.getGradientAttrs()
+        for name in attrs:
+            lg.setAttribute(name,attrs[name])
+        for stop_attrs in self.getStopAttrs():
+            stop = doc.createElement("stop")
+            for name in stop_attrs:
+                stop.setAttribute(name,stop_attrs[name])
+            lg.appendChild(stop)
         svgdoc.defs.appendChild(lg)
-        return lg
\ No newline at end of file
+        return lg
+
+    def write(self,svgdoc,writer):
+        writer.openElement("linearGradient",self.getGradientAttrs())
+        for stop_attrs in self.getStopAttrs():
+            writer.addElement("stop",stop_attrs)
+        writer.closeElement()
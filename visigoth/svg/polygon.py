@@ -29,13 +29,10 @@ class polygon(svgstyled):
 
     def __init__(self,path,fill=None,stroke="black",stroke_width=1,tooltip="",innerpaths=[]):
         svgstyled.__init__(self,"path",tooltip)
-        s = self.buildPath(path)
+        s = self.buildPaths(path,innerpaths)
 
         if innerpaths:
             self.addAttr("fill-rule","evenodd")
-            for path in innerpaths:
-                s += " "
-                s += self.buildPath(path)
 
         self.addAttr("d",s)
 
@@ -48,6 +45,13 @@ class polygon(svgstyled):
 
 
 
+    def buildPaths(self,path,innerpaths=[]):
+        s = self.buildPath(path)
+        for innerpath in innerpaths:
+            s += " "
+            s += self.buildPath(innerpath)
+        return s
+
     def buildPath(self,points):
         s = 'M'
         sep = ''
@@ -28,6 +28,7 @@ from visigoth.utils.js import Js
 from visigoth.utils.fonts.fontmanager import FontManager
 from visigoth.svg.filters import glow
 from visigoth.svg.css_snippet import css_snippet
+from visigoth.svg.svgwriter import svgwriter
 
 from uuid import uuid4
 
@@ -135,26 +136,64 @@ class svgdoc(object):
     def addPresentationStep(self,index,anchorName):
         self.presentation_steps.append({"index":index,"anchor":anchorName})
 
+    # get the attributes of the root svg element
+    def getRootAttrs(self):
+        return {
+            "xmlns":"http://www.w3.org/2000/svg",
+            "xmlns:xlink":"http://www.w3.org/1999/xlink",
+            "xmlns:svg":"http://www.w3.org/2000/svg",
+            "width":"%d"%(self.width),
+            "height":"%d"%(self.height),
+            "version":"1.1"
+        }
+
+    def getGeneratedBy(self):
+        return "Generated by visigoth v%s (home page: %s) (source code: %s)" \
+            %(self.meta_version,self.meta_home_url,self.meta_repo_url)
+
+    def getBootCode(self):
+        return "function boot() {"+"\n\n".join(self.codez) + "\n\n};\n"
+
+    # get the definitions embedding or linking to the fonts used in the document
+    # call after the document's objects have been rendered or written
+    def getFontDefinitions(self):
+        font_definitions = []
+        if self.embed_fonts == True:
+            for font in self.fonts:
+                (fname, weight, style) = font
+                if FontManager.containsFont(fname,weight,style):
+                    font_definitions.append(css_snippet(FontManager.getCssFontFaceContent(fname,weight,style)))
+
+        if self.embed_fonts == False:
+            font_names = set()
+            for font in self.fonts:
+                (fname, _, _) = font
+                font_names.add(fname)
+            for name in font_names:
+                font_definitions.append(css_snippet(FontManager.getCssFontImport(name)))
+        return font_definitions
+
     def construct(self):
 
         self.doc = Document()
 
         self.root = self.doc.createElement("svg")
-        self.root.setAttribute("xmlns","http://www.w3.org/2000/svg")
-        self.root.setAttribute("xmlns:xlink","http://www.w3.org/1999/xlink")
         self.defs = self.doc.createElement("defs")
-        self.root.appendChild(self.defs)
+        # definitions known before the objects are rendered go in a defs element at the start of the svg element,
+        # as in write, any found while rendering the objects (for example, fonts) go in a second defs element at the end
+        definitions = self.definitions
+        self.definitions = []
+        if definitions:
+            self.root.appendChild(self.defs)
         if self.style:
             style = self.doc.createElement("style")
             styletext = self.doc.createTextNode(self.style)
             style.appendChild(styletext)
             self.root.appendChild(style)
 
-        self.root.setAttribute("xmlns:svg","http://www.w3.org/2000/svg")
-        self.root.setAttribute("xmlns","http://www.w3.org/2000/svg")
-        self.root.setAttribute("width","%d"%(self.width))
-        self.root.setAttribute("height", "%d" % (self.height))
-        self.root.setAttribute("version", "1.1")
+        root_attrs = self.getRootAttrs()
+        for name in root_attrs:
+            self.root.setAttribute(name,root_attrs[name])
         # self.root.setAttribute("onload","pubsubs_publish(\"\",\"load\");")
 
         title = self.diagram.getTitle()
@@ -170,12 +209,11 @@ class svgdoc(object):
             self.root.appendChild(t)
 
         metadesc = self.doc.createElement("desc")
-        metadesc.appendChild(self.doc.createTextNode("Generated by visigoth v%s (home page: %s) (source code: %s)"
-                                              %(self.meta_version,self.meta_home_url,self.meta_repo_url)))
+        metadesc.appendChild(self.doc.createTextNode(self.getGeneratedBy()))
         self.root.appendChild(metadesc)
 
         # add the definitions
-        for o in self.definitions:
+        for o in definitions:
             o.render(self)
 
         # add the objects
@@ -186,20 +224,12 @@ class svgdoc(object):
         for o in self.pop_groups:
             o.render(self,self.root)
 
-        if self.embed_fonts == True:
-            for font in self.fonts:
-                (fname, weight, style) = font
-                if FontManager.containsFont(fname,weight,style):
-                    o = css_snippet(FontManager.getCssFontFace(fname,weight,style))
-                    o.render(self)
-
-        if self.embed_fonts == False:
-            font_names = set()
-            for font in self.fonts:
-                (fname, _, _) = font
-                font_names.add(fname)
-            for name in font_names:
-                o = css_snippet(FontManager.getCssFontImport(name))
+        late_definitions = self.definitions + self.getFontDefinitions()
+        self.definitions = definitions + self.definitions
+        if late_definitions:
+            self.defs = self.doc.createElement("defs")
+            self.root.appendChild(self.defs)
+            for o in late_definitions:
                 o.render(self)
 
         if self.format == "html":
@@ -212,8 +242,7 @@ class svgdoc(object):
             if self.codez:
                 script = self.doc.createElement("script")
                 script.setAttribute("type", "text/ecmascript")
-                code = "function boot() {"+"\n\n".join(self.codez) + "\n\n};\n"
-                marker = self.getMarker(code)
+                marker = self.getMarker(self.getBootCode())
                 script.appendChild(self.doc.createTextNode(marker))
                 head.appendChild(script)
 
@@ -241,3 +270,69 @@ class svgdoc(object):
             xml = xml.replace(marker_uuid,self.markers[marker_uuid])
         return xml
 
+    # serialize the document directly to a text stream (out), as an alternative to render
+    # no DOM is constructed and marker content (CSS, javascript) is written in-line.  If pretty is False
+    # the output is not indented.  Definitions that only become known while the objects are written
+    # (for example, fonts) are written to a second defs element at the end of the svg element
+    def write(self,out,pretty=True):
+        writer = svgwriter(out,pretty)
+        writer.writeDeclaration()
+
+        if self.format == "html":
+            writer.openElement("html")
+            writer.openElement("head")
+            writer.addElement("meta",{"charset":"UTF-8"})
+            if self.codez:
+                writer.openElement("script",{"type":"text/ecmascript"})
+                writer.addRaw(self.getBootCode())
+                writer.closeElement()
+            if self.html_title:
+                writer.addElement("title",txt=self.html_title)
+            writer.closeElement()
+            writer.openElement("body",{"onload":"boot()"})
+
+        writer.openElement("svg",self.getRootAttrs())
+
+        # write the definitions, collecting any further definitions added while writing the objects
+        definitions = self.definitions
+        self.definitions = []
+        if definitions:
+            writer.openElement("defs")
+            for o in definitions:
+                o.write(self,writer)
+            writer.closeElement()
+
+        if self.style:
+            writer.addElement("style",txt=self.style)
+
+        title = self.diagram.getTitle()
+        if title:
+            writer.addElement("title",txt=title)
+
+        description = self.diagram.getDescription()
+        if description:
+            writer.addElement("desc",txt=description)
+
+        writer.addElement("desc",txt=self.getGeneratedBy())
+
+        # write the objects
+        for o in self.objects:
+            o.write(self,writer)
+
+        # write the popup objects
+        for o in self.pop_groups:
+            o.write(self,writer)
+
+        late_definitions = self.definitions + self.getFontDefinitions()
+        self.definitions = definitions + self.definitions
+        if late_definitions:
+            writer.openElement("defs")
+            for o in late_definitions:
+                o.write(self,writer)
+            writer.closeElement()
+
+        writer.closeElement()
+
+        if self.format == "html":
+            writer.closeElement()
+            writer.closeElement()
@@ -22,6 +22,8 @@ from xml.dom.minidom import *
 from math import cos,sin,pi
 import json
 
+from visigoth.svg.datauri import datauri
+
 # base class for SVG objects, holding style information and handing rendering
 class svgstyled(object):
 
@@ -87,6 +89,12 @@ class svgstyled(object):
     def getAttr(self,name):
         return self.attrs[name]
 
+    # remove an SVG attribute, if present
+    def removeAttr(self,name):
+        if name in self.attrs:
+            del self.attrs[name]
+        return self
+
     # add multiple SVG attributes
     def addAttrs(self,attrs):
         if attrs:
@@ -122,6 +130,40 @@ class svgstyled(object):
     def setTooltip(self,tooltip):
         self.tooltip = tooltip
 
+    # construct the attributes to be output for the element
+    def getRenderAttrs(self):
+        attrs = {}
+        for name in self.attrs:
+            value = self.attrs[name]
+            # leave data URIs to be encoded as they are written
+            attrs[name] = value if isinstance(value,datauri) else str(value)
+
+        for evt in self.handlers:
+            fname = self.handlers[evt]
+            attrs["on"+evt] = "return "+fname+"(evt);"
+
+        style = self.getStyleAttr()
+        if style:
+            attrs["style"] = style
+
+        if self.id:
+            attrs["id"] = self.id
+        return attrs
+
+    # get the attributes of the animate elements to be output as children of the element
+    def getAnimationAttrs(self):
+        animation_attrs = []
+        for animation in self.animations:
+            (propertyName,fromValue,toValue,durationSecs) = animation
+            animation_attrs.append({
+                "attributeType":"XML",
+                "attributeName":propertyName,
+                "from":str(fromValue),
+                "to":str(toValue),
+                "dur":str(durationSecs)+"s",
+                "repeatCount":"indefinite"})
+        return animation_attrs
+
     def render(self,svgdoc,parent):
         doc = svgdoc.doc
         if self.tooltip:
@@ -133,16 +175,9 @@ class svgstyled(object):
             parent = g
 
         e = doc.createElement(self.tag)
-        for name in self.attrs:
-            e.setAttribute(name,str(self.attrs[name]))
-
-        for evt in self.handlers:
-            fname = self.handlers[evt]
-            e.setAttribute("on"+evt,"return "+fname+"(evt);")
-
-        style = self.getStyleAttr()
-        if style:
-            e.setAttribute("style",style)
+        attrs = self.getRenderAttrs()
+        for name in attrs:
+            e.setAttribute(name,str(attrs[name]))
 
         parent.appendChild(e)
 
@@ -152,17 +187,37 @@ class svgstyled(object):
         for child in self.children:
             e.appendChild(child)
 
-        for animation in self.animations:
-            (propertyName,fromValue,toValue,durationSecs) = animation
+        for animation_attrs in self.getAnimationAttrs():
             a = doc.createElement("animate")
-            a.setAttribute("attributeType","XML");
-            a.setAttribute("attributeName",propertyName)
-            a.setAttribute("from",str(fromValue))
-            a.setAttribute("to",str(toValue))
-            a.setAttribute("dur",str(durationSecs)+"s")
-            a.setAttribute("repeatCount","indefinite")
+            for name in animation_attrs:
+                a.setAttribute(name,animation_attrs[name])
             e.appendChild(a)
 
-        if self.id:
-            e.setAttribute("id",self.id)
         return e
+
+    # stream the element to an svgwriter (see svgdoc.write), as an alternative to render
+    def write(self,svgdoc,writer):
+        if self.tooltip:
+            writer.openElement("g")
+            writer.addElement("title",txt=self.tooltip)
+
+        writer.openElement(self.tag,self.getRenderAttrs())
+
+        if self.content != '':
+            writer.addText(self.content)
+
+        for child in self.children:
+            writer.addNode(child)
+
+        for animation_attrs in self.getAnimationAttrs():
+            writer.addElement("animate",animation_attrs)
+
+        self.writeContent(svgdoc,writer)
+
+        writer.closeElement()
+        if self.tooltip:
+            writer.closeElement()
+
+    # override to write further content into the element before it is closed
+    def writeContent(self,svgdoc,writer):
+        pass
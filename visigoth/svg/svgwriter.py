@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+#    Visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without 
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or 
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+
+from visigoth.svg.datauri import datauri
+
+# serialize SVG/HTML elements directly to a text stream, without building a DOM
+#
+# the layout produced in pretty mode matches xml.dom.minidom's toprettyxml, except that
+# content is written as it is generated rather than after the whole document is built
+class svgwriter(object):
+
+    def __init__(self,out,pretty=True):
+        self.out = out
+        self.pretty = pretty
+        self.indent = "\t" if pretty else ""
+        self.newl = "\n" if pretty else ""
+        # stack of [tag,has_children,pending_text] for each open element
+        self.stack = []
+
+    @staticmethod
+    def escape(s):
+        return s.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+    def getStream(self):
+        return self.out
+
+    def isPretty(self):
+        return self.pretty
+
+    def writeDeclaration(self):
+        self.out.write('<?xml version="1.0" encoding="utf-8"?>'+self.newl)
+
+    def getIndent(self):
+        return self.indent*len(self.stack)
+
+    # called before any child content is written into the innermost open element
+    def beginContent(self):
+        if not self.stack:
+            return
+        top = self.stack[-1]
+        if not top[1]:
+            self.out.write(">"+self.newl)
+            top[1] = True
+            if top[2] is not None:
+                self.out.write(self.getIndent())
+                self.writeContent(top[2])
+                self.out.write(self.newl)
+                top[2] = None
+
+    def openElement(self,tag,attrs={}):
+        self.beginContent()
+        self.out.write(self.getIndent()+"<"+tag)
+        for name in attrs:
+            self.out.write(" "+name+"=\"")
+            value = attrs[name]
+            if isinstance(value,datauri):
+                # base64 content needs no escaping, stream it
+                value.write(self.out)
+            else:
+                self.out.write(svgwriter.escape(str(value)))
+            self.out.write("\"")
+        self.stack.append([tag,False,None])
+
+    def closeElement(self):
+        (tag,has_children,pending_text) = self.stack.pop()
+        if has_children:
+            self.out.write(self.getIndent()+"</"+tag+">"+self.newl)
+        elif pending_text is not None:
+            self.out.write(">")
+            self.writeContent(pending_text)
+            self.out.write("</"+tag+">"+self.newl)
+        else:
+            self.out.write("/>"+self.newl)
+
+    def addElement(self,tag,attrs={},txt=None):
+        self.openElement(tag,attrs)
+        if txt:
+            self.addText(txt)
+        self.closeElement()
+
+    # add text content to the innermost open element, escaping markup characters
+    def addText(self,txt):
+        self.addRaw(svgwriter.escape(txt))
+
+    # add content to the innermost open element without escaping (for CSS, javascript and HTML content)
+    # the content may be a string or a list of strings and datauri objects, to be written contiguously
+    def addRaw(self,content):
+        if not content:
+            return
+        top = self.stack[-1]
+        if not top[1] and top[2] is None:
+            # defer, a single text child is written inline with the element's tags
+            top[2] = content
+        else:
+            self.beginContent()
+            self.out.write(self.getIndent())
+            self.writeContent(content)
+            self.out.write(self.newl)
+
+    def writeContent(self,content):
+        if isinstance(content,str):
+            self.out.write(content)
+        else:
+            for part in content:
+                if isinstance(part,datauri):
+                    part.write(self.out)
+                else:
+                    self.out.write(part)
+
+    # add a parsed xml.dom.minidom node (for example, an embedded SVG document)
+    def addNode(self,node):
+        self.beginContent()
+        node.writexml(self.out,self.getIndent(),self.indent,self.newl)
+
+
+# buffer text written by an svgwriter, passing it on to a text or binary file object in chunks
+class chunked_output(object):
+
+    def __init__(self,fileobj,chunk_size=65536,encoding="utf-8"):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.binary = not isinstance(fileobj,io.TextIOBase)
+        self.pending = []
+        self.pending_size = 0
+
+    def write(self,s):
+        self.pending.append(s)
+        self.pending_size += len(s)
+        if self.pending_size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            chunk = "".join(self.pending)
+            self.pending = []
+            self.pending_size = 0
+            if self.binary:
+                self.fileobj.write(chunk.encode(self.encoding))
+            else:
+                self.fileobj.write(chunk)
@@ -74,7 +74,8 @@ class text(svgstyled):
             self.addAttr("text-anchor","start")
         return self
 
-    def render(self,svgdoc,parent):
+    # apply default text attributes and note the font used, before rendering or writing
+    def prepare(self,svgdoc):
         dattrs = svgdoc.getDiagram().getDefaultTextAttributes()
         self.addAttrs(dattrs)
 
@@ -90,34 +91,58 @@ class text(svgstyled):
 
         svgdoc.includeFont(font_family,font_weight,font_style)
 
+    def getLinkAttrs(self):
+        attrs = {"href":self.url,"target":"_new"}
+        if self.download:
+            attrs["download"] = self.download
+        return attrs
+
+    # get the rectangle to draw behind the text, if a fill is defined
+    def getBackground(self):
+        if not self.fill:
+            return None
+        l = FontManager.getTextLength(self.text_attributes,self.txt,self.font_height)
+        rx = self.x - self.label_margin
+        ry = self.y - self.font_height - self.label_margin
+        if self.vertical_center:
+            ry = self.y - self.font_height/2 - 5
+        if self.horizontal_center:
+            rx = self.x - l/2 - self.label_margin
+        r = rectangle(rx,ry,l+2*self.label_margin,self.font_height+2*self.label_margin,fill=self.fill)
+
+        if self.rotation != None:
+            r.addAttr("transform","rotate(%f,%f,%f)"%(self.rotation,self.x,self.y))
+        return r
+
+    def render(self,svgdoc,parent):
+        self.prepare(svgdoc)
+
         if self.url:
             doc = svgdoc.doc
             p = doc.createElement("a")
             parent.appendChild(p)
+            attrs = self.getLinkAttrs()
+            for name in attrs:
+                p.setAttribute(name,str(attrs[name]))
+            parent = p
+
+        background = self.getBackground()
+        if background:
+            background.render(svgdoc,parent)
 
-            p.setAttribute("href",self.url)
+        return super().render(svgdoc, parent)
 
-            p.setAttribute("target","_new")
-            if self.download:
-                p.setAttribute("download",self.download)
+    def write(self,svgdoc,writer):
+        self.prepare(svgdoc)
 
-            parent = p
+        if self.url:
+            writer.openElement("a",self.getLinkAttrs())
 
-        if self.fill:            
-            l = FontManager.getTextLength(self.text_attributes,self.txt,self.font_height)
-            rx = self.x - self.label_margin
-            ry = self.y - self.font_height - self.label_margin
-            if self.vertical_center:
-                ry = self.y - self.font_height/2 - 5
-            if self.horizontal_center:
-                rx = self.x - l/2 - self.label_margin
-            r = rectangle(rx,ry,l+2*self.label_margin,self.font_height+2*self.label_margin,fill=self.fill)
-            
-            if self.rotation != None:
-                r.addAttr("transform","rotate(%f,%f,%f)"%(self.rotation,self.x,self.y))
-
-            r.render(svgdoc,parent)
+        background = self.getBackground()
+        if background:
+            background.write(svgdoc,writer)
 
-        return super().render(svgdoc, parent)
-        
-    
\ No newline at end of file
+        super().write(svgdoc,writer)
+
+        if self.url:
+            writer.closeElement()
@@ -38,7 +38,8 @@ class tspan(svgstyled):
     def setUrl(self,url):
         self.url = url
 
-    def render(self,svgdoc,parent):
+    # apply default text attributes and note the font used, before rendering or writing
+    def prepare(self,svgdoc):
         dattrs = svgdoc.getDiagram().getDefaultTextAttributes()
         self.addAttrs(dattrs)
 
@@ -55,9 +56,14 @@ class tspan(svgstyled):
         svgdoc.includeFont(font_family,font_weight,font_style)
 
         if self.url:
-            doc = svgdoc.doc
             self.addAttr("text-decoration","underline")
             self.addAttr("stroke", "blue")
+
+    def render(self,svgdoc,parent):
+        self.prepare(svgdoc)
+
+        if self.url:
+            doc = svgdoc.doc
             p = doc.createElement("a")
             parent.appendChild(p)
             p.setAttribute("href",self.url)
@@ -65,3 +71,14 @@ class tspan(svgstyled):
             parent = p
 
         return super().render(svgdoc, parent)
+
+    def write(self,svgdoc,writer):
+        self.prepare(svgdoc)
+
+        if self.url:
+            writer.openElement("a",{"href":self.url,"target":"_new"})
+
+        super().write(svgdoc,writer)
+
+        if self.url:
+            writer.closeElement()
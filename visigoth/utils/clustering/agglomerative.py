@@ -21,6 +21,7 @@
 import random
 import sys
 import math
+import heapq
 
 class AgglomerativeAlgorithm(object):
 
@@ -34,70 +35,83 @@ class AgglomerativeAlgorithm(object):
         self.max_distance = max_distance
 
     def train(self,data,projection):
-        projected_data = map(lambda x:projection.fromLonLat(x),data)
-        clusters = {}
-        distances = {}
-        cluster_id_counter = 0
-        for (e,n) in projected_data:
-            clusters[cluster_id_counter] = [(e,n)]
-            cluster_id_counter += 1
-        
-        for cid1 in clusters:
-            for cid2 in clusters:
-                if cid1 < cid2:    
-                    p1 = clusters[cid1][0]
-                    p2 = clusters[cid2][0]
-                    d = AgglomerativeAlgorithm.euclidean(p1,p2)
-                    if d < self.max_distance:
-                        distances[(cid1,cid2)] = d
-
-        while len(distances)>0:
-            min_dist = None
-            min_pair = None
-            for pair in distances:
-                dist = distances[pair]
-                if min_dist == None or dist < min_dist:
-                    min_dist = dist
-                    min_pair = pair
-            (cid1,cid2) = min_pair
-            items1 = clusters[cid1]
-            items2 = clusters[cid2]
-            combined_items = items1+items2
-            combined_cid = cluster_id_counter
+        # single linkage clustering, merging the closest pair of clusters until no pair of clusters
+        # contains points closer than max_distance
+        #
+        # the candidate pairs are found using a grid index with cells max_distance wide and then
+        # merged in order of increasing distance from a priority queue, using union-find to track
+        # which cluster each point belongs to
+        points = [projection.fromLonLat(p) for p in data]
+        n = len(points)
+        index = AgglomerativeAlgorithm.buildIndex(points,self.max_distance)
+
+        distances = []
+        for (i,(x,y)) in enumerate(points):
+            col = math.floor(x/self.max_distance)
+            row = math.floor(y/self.max_distance)
+            for key in ((col+dc,row+dr) for dc in (-1,0,1) for dr in (-1,0,1)):
+                for j in index.get(key,()):
+                    if i < j:
+                        d = AgglomerativeAlgorithm.euclidean(points[i],points[j])
+                        if d < self.max_distance:
+                            distances.append((d,i,j))
+        heapq.heapify(distances)
+
+        # each union-find root records the id of its cluster, points have ids 0..n-1 and
+        # each merged cluster gets the next id, consisting of the members of the older cluster followed by the newer
+        parents = list(range(n))
+        cluster_ids = list(range(n))
+        merged = {}
+        cluster_id_counter = n
+
+        def find(i):
+            root = i
+            while parents[root] != root:
+                root = parents[root]
+            while parents[i] != root:
+                (parents[i],i) = (root,parents[i])
+            return root
+
+        while distances:
+            (_,i,j) = heapq.heappop(distances)
+            ri = find(i)
+            rj = find(j)
+            if ri == rj:
+                continue
+            cid1 = min(cluster_ids[ri],cluster_ids[rj])
+            cid2 = max(cluster_ids[ri],cluster_ids[rj])
+            merged[cluster_id_counter] = (cid1,cid2)
+            parents[rj] = ri
+            cluster_ids[ri] = cluster_id_counter
             cluster_id_counter += 1
-            clusters[combined_cid] = combined_items
-            
-            del clusters[cid1]
-            del clusters[cid2]
-            new_distances = {}
-            remove_list = [(cid1,cid2)]
-            for (cid3,cid4) in distances:
-                if (cid3,cid4) != (cid1,cid2):
-                    if cid1 == cid3:
-                        self.recompute_distance(combined_cid,cid1,cid4,distances,new_distances)
-                        remove_list.append((cid3,cid4))
-                    if cid2 == cid3:
-                        self.recompute_distance(combined_cid,cid2,cid4,distances,new_distances)
-                        remove_list.append((cid3,cid4))
-                    if cid1 == cid4:
-                        self.recompute_distance(combined_cid,cid1,cid3,distances,new_distances)
-                        remove_list.append((cid3,cid4))
-                    if cid2 == cid4:
-                        self.recompute_distance(combined_cid,cid2,cid3,distances,new_distances)
-                        remove_list.append((cid3,cid4))    
-                
-            for item in remove_list:
-                del distances[item]
-            for key in new_distances:
-                distances[key] = new_distances[key]
-                    
-        # renumber clusters
-        cluster_num = 0
+
+        # renumber clusters, unmerged points first and then merged clusters in the order they were completed
+        final_cids = sorted(cluster_ids[i] for i in range(n) if parents[i] == i)
         final_clusters = {}
-        for cluster in clusters:
-            final_clusters[cluster_num] = clusters[cluster]   
-            cluster_num += 1     
-        return AgglomerativeModel(projection,final_clusters)
+        for cluster_num in range(len(final_cids)):
+            items = []
+            stack = [final_cids[cluster_num]]
+            while stack:
+                cid = stack.pop()
+                if cid in merged:
+                    (cid1,cid2) = merged[cid]
+                    stack.append(cid2)
+                    stack.append(cid1)
+                else:
+                    items.append(points[cid])
+            final_clusters[cluster_num] = items
+        return AgglomerativeModel(projection,final_clusters,cell_size=self.max_distance)
+
+    @staticmethod
+    def buildIndex(points,cell_size):
+        index = {}
+        for i in range(len(points)):
+            key = (math.floor(points[i][0]/cell_size),math.floor(points[i][1]/cell_size))
+            if key in index:
+                index[key].append(i)
+            else:
+                index[key] = [i]
+        return index
 
     @staticmethod
     def euclidean(p1,p2):
@@ -105,39 +119,62 @@ class AgglomerativeAlgorithm(object):
         (x2,y2) = p2
         return math.sqrt((x1-x2)**2+(y1-y2)**2)        
 
-    def recompute_distance(self,combined_cid,from_cid,to_cid,distances,new_distances):
-        old_dist = distances[self.order_tuple((from_cid,to_cid))]
-        if (to_cid,combined_cid) not in new_distances:
-            new_distances[(to_cid,combined_cid)] = old_dist
-        else:
-            if new_distances[(to_cid,combined_cid)] > old_dist:
-                new_distances[(to_cid,combined_cid)] = old_dist 
-
-    def order_tuple(self,t):
-        (v1,v2) = t
-        if v1 > v2:
-            return (v2,v1)
-        else:
-            return t
-
 class AgglomerativeModel(object):
 
-    def __init__(self,projection,clusters):
+    def __init__(self,projection,clusters,cell_size=1000):
         self.projection = projection
         self.clusters = clusters
+        self.cell_size = cell_size
+
+        # index every cluster point by grid cell to find the closest point quickly
+        self.index = {}
+        for cluster in self.clusters:
+            for (x,y) in self.clusters[cluster]:
+                key = (math.floor(x/cell_size),math.floor(y/cell_size))
+                if key in self.index:
+                    self.index[key].append((x,y,cluster))
+                else:
+                    self.index[key] = [(x,y,cluster)]
+        if self.index:
+            self.min_col = min(col for (col,_) in self.index)
+            self.max_col = max(col for (col,_) in self.index)
+            self.min_row = min(row for (_,row) in self.index)
+            self.max_row = max(row for (_,row) in self.index)
 
     def getClusterCount(self):
         return len(self.clusters)
 
     def score(self,point):
-        ppoint = self.projection.fromLonLat(point)
+        (px,py) = self.projection.fromLonLat(point)
+        if not self.index:
+            return None
+        col = math.floor(px/self.cell_size)
+        row = math.floor(py/self.cell_size)
+        max_ring = max(abs(col-self.min_col),abs(col-self.max_col),abs(row-self.min_row),abs(row-self.max_row))
         min_dist = None
         closest_cluster = None
-        for cluster in self.clusters:
-            cluster_points = self.clusters[cluster]
-            for cluster_point in cluster_points:
-                dist = AgglomerativeAlgorithm.euclidean(ppoint,cluster_point)
-                if min_dist == None or dist < min_dist:
-                    min_dist = dist
-                    closest_cluster = cluster
+        # search rings of cells around the point's cell, any point in ring r+1 is at least r cells away
+        for ring in range(max_ring+1):
+            if min_dist != None and min_dist <= (ring-1)*self.cell_size:
+                break
+            if (2*ring+1)**2 > len(self.index):
+                # cheaper to check every occupied cell than to keep searching mostly empty rings
+                for cell_points in self.index.values():
+                    (min_dist,closest_cluster) = self.checkCell(px,py,cell_points,min_dist,closest_cluster)
+                break
+            if ring == 0:
+                cells = [(col,row)]
+            else:
+                cells = [(col+dc,row+dr) for dc in range(-ring,ring+1) for dr in (-ring,ring)]
+                cells += [(col+dc,row+dr) for dc in (-ring,ring) for dr in range(1-ring,ring)]
+            for cell in cells:
+                (min_dist,closest_cluster) = self.checkCell(px,py,self.index.get(cell,()),min_dist,closest_cluster)
         return closest_cluster
+
+    def checkCell(self,px,py,cell_points,min_dist,closest_cluster):
+        for (x,y,cluster) in cell_points:
+            dist = math.sqrt((px-x)**2+(py-y)**2)
+            if min_dist == None or dist < min_dist:
+                min_dist = dist
+                closest_cluster = cluster
+        return (min_dist,closest_cluster)
@@ -21,41 +21,88 @@
 import random
 import sys
 import math
+from concurrent.futures import ProcessPoolExecutor
 
 from visigoth.utils.term.progress import Progress
 from visigoth.utils.clustering.silhouette import Silhouette
 
 class KMeansAlgorithm(object):
 
-    def __init__(self,nr_attempts=3,cluster_count_min=2,cluster_count_max=10,iterations=200):
+    """
+    Train KMeans models for a range of cluster counts and select the model with the best silhouette score
+
+    Keyword Arguments:
+        nr_attempts (int): the number of models to train for each cluster count
+        cluster_count_min (int): the minimum number of clusters to try
+        cluster_count_max (int): the maximum number of clusters to try
+        iterations (int): the maximum number of iterations to run when training each model
+        tolerance (float): stop training a model when no centroid moves further than this fraction of the data extent
+        init (str): how to choose the initial centroids, "k-means++" or "random"
+        batch_size (int): if set, train each model using mini-batches of this many points
+        sample_size (int): if set, estimate silhouette scores from a random sample of this many points
+        processes (int): the number of worker processes used to train models in parallel
+        seed (int): a random seed to set
+    """
+
+    def __init__(self,nr_attempts=3,cluster_count_min=2,cluster_count_max=10,iterations=200,tolerance=1e-4,
+                 init="k-means++",batch_size=None,sample_size=None,processes=1,seed=None):
         self.nr_attempts = nr_attempts
         self.cmin = cluster_count_min
         self.cmax = cluster_count_max
         self.iterations = iterations
-        
+        self.tolerance = tolerance
+        self.init = init
+        self.batch_size = batch_size
+        self.sample_size = sample_size
+        self.processes = processes
+        self.seed = seed
+
+    @staticmethod
+    def evaluate(points,count,iterations,tolerance,init,batch_size,sample_size,seed):
+        # train a model on projected points and score it, returning (silhouette,centroids)
+        model = KMeans(None,count,iterations,seed=seed,tolerance=tolerance,init=init,batch_size=batch_size)
+        model.trainProjected(points)
+        sil = Silhouette.computeProjected(points,model.getAssignments(),count,
+                                          sample_size=sample_size,seed=seed)
+        return (sil,model.getCentroids())
+
     def train(self,data,projection):
-        sil_max = None
-        best_model = None
-        total_runs = ((self.cmax+1)-self.cmin)*self.nr_attempts
-        progress_frac = 0.0
-        p = Progress("KMeans Cluster")
-        p.report("Starting",progress_frac)
+        points = [projection.fromLonLat(p) for p in data]
+        runs = []
         for count in range(self.cmin,self.cmax+1):
             for attempt in range(0,self.nr_attempts):
-                progress_frac += 1/total_runs
-                model = KMeans(data,count,self.iterations)
-                
-                model.setProjection(projection)
-                model.train()
-
-                s = Silhouette(data,model)
-                sil = s.compute()
-                
-                if sil_max == None or sil > sil_max:
-                    sil_max = sil
-                    best_model = model
-                p.report("trying %d clusters"%(count),progress_frac)
+                seed = None if self.seed is None else self.seed + len(runs)
+                runs.append((points,count,self.iterations,self.tolerance,self.init,self.batch_size,self.sample_size,seed))
+
+        sil_max = None
+        best_run = None
+        p = Progress("KMeans Cluster")
+        p.report("Starting",0.0)
+
+        def note(idx,result):
+            nonlocal sil_max, best_run
+            (sil,centroids) = result
+            if sil_max == None or sil > sil_max:
+                sil_max = sil
+                best_run = (runs[idx][1],centroids)
+            p.report("trying %d clusters"%(runs[idx][1]),(idx+1)/len(runs))
+
+        if self.processes and self.processes > 1:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                futures = [executor.submit(KMeansAlgorithm.evaluate,*run) for run in runs]
+                for idx in range(len(futures)):
+                    note(idx,futures[idx].result())
+        else:
+            for idx in range(len(runs)):
+                note(idx,KMeansAlgorithm.evaluate(*runs[idx]))
+
         p.complete("Complete")
+        if best_run is None:
+            return None
+        (count,centroids) = best_run
+        best_model = KMeans(data,count,self.iterations,seed=self.seed,tolerance=self.tolerance,init=self.init,batch_size=self.batch_size)
+        best_model.setProjection(projection)
+        best_model.setCentroids(centroids)
         return best_model
 
 class KMeans(object):
@@ -68,18 +115,28 @@ class KMeans(object):
 
     Keyword Arguments:
         centers (int): the number of centers to discover
-        iterations (int): the number of algorith iterations to run
+        iterations (int): the maximum number of algorithm iterations to run
         seed (int): a random seed to set
+        tolerance (float): stop when no centroid moves further than this fraction of the data extent (0 to stop only when centroids stop moving)
+        init (str): how to choose the initial centroids, "k-means++" or "random"
+        batch_size (int): if set, update centroids from a random mini-batch of this many points on each iteration
 
     """
 
-    def __init__(self, data, centers=5, iterations=1000,seed=None):
+    def __init__(self, data, centers=5, iterations=1000,seed=None,tolerance=1e-4,init="k-means++",batch_size=None):
         self.input_data = data
         self.data = []
         self.centers = centers
         self.iterations = iterations
         self.seed = seed
-
+        self.tolerance = tolerance
+        self.init = init
+        self.batch_size = batch_size
+        self.centroids = []
+        self.assignments = []
+        self.upper = None
+        self.lower = None
+        self.projection = None
 
     def getClusterCount(self):
         return self.centers
@@ -87,6 +144,12 @@ class KMeans(object):
     def getCentroids(self):
         return self.centroids
 
+    def setCentroids(self,centroids):
+        self.centroids = centroids[:]
+
+    def getAssignments(self):
+        return self.assignments
+
     def setProjection(self,projection):
         self.projection = projection
 
@@ -102,42 +165,172 @@ class KMeans(object):
         return math.sqrt((x1-x2)**2+(y1-y2)**2)
 
     def findNearestCentroid(self,point):
+        (x,y) = point
         mind = None
         minc = None
         for centroid_idx in range(0,len(self.centroids)):
-            centroid = self.centroids[centroid_idx]
-            d = self.euclidean(point,centroid)
+            (cx,cy) = self.centroids[centroid_idx]
+            # squared distance is sufficient for comparisons
+            d = (x-cx)*(x-cx)+(y-cy)*(y-cy)
             if mind == None or d < mind:
                  mind = d
                  minc = centroid_idx
         return minc
 
+    def assign(self,points):
+        findNearestCentroid = self.findNearestCentroid
+        return [findNearestCentroid(point) for point in points]
+
+    def nearestTwo(self,point):
+        # return the index of the nearest centroid, the distance to it and the distance to the second nearest
+        (x,y) = point
+        d1 = d2 = math.inf
+        c1 = None
+        for (centroid_idx,(cx,cy)) in enumerate(self.centroids):
+            dx = x-cx
+            dy = y-cy
+            d = dx*dx+dy*dy
+            if d < d1:
+                d2 = d1
+                d1 = d
+                c1 = centroid_idx
+            elif d < d2:
+                d2 = d
+        return (c1,math.sqrt(d1),math.sqrt(d2))
+
     def iterate(self):
-        clusters = {c:[] for c in range(self.centers)}
-        for datapoint in self.data:
-            clusters[self.findNearestCentroid(datapoint)].append(datapoint)
+        # assign every point to its nearest centroid and move each centroid to the mean of its points
+        # returns the largest distance moved by any centroid
+        #
+        # Hamerly's bounds avoid most distance computations: upper[i] bounds the distance from point i
+        # to its assigned centroid and lower[i] bounds the distance to any other centroid, so the
+        # assignment cannot change while upper[i] is no more than lower[i] or half the distance
+        # from the assigned centroid to its nearest neighbour
+        data = self.data
+        centroids = self.centroids
+        if self.upper is None:
+            self.assignments = []
+            self.upper = []
+            self.lower = []
+            for point in data:
+                (c,d1,d2) = self.nearestTwo(point)
+                self.assignments.append(c)
+                self.upper.append(d1)
+                self.lower.append(d2)
+        else:
+            assignments = self.assignments
+            upper = self.upper
+            lower = self.lower
+            half_gaps = [min([self.euclidean(centroids[c1],centroids[c2]) for c2 in range(self.centers) if c2 != c1],default=math.inf)/2
+                         for c1 in range(self.centers)]
+            candidates = [i for (i,u,l,a) in zip(range(len(data)),upper,lower,assignments) if u > l and u > half_gaps[a]]
+            for i in candidates:
+                a = assignments[i]
+                (x,y) = data[i]
+                (cx,cy) = centroids[a]
+                upper[i] = math.sqrt((x-cx)*(x-cx)+(y-cy)*(y-cy))
+                if upper[i] > lower[i] and upper[i] > half_gaps[a]:
+                    (assignments[i],upper[i],lower[i]) = self.nearestTwo(data[i])
+
+        xsums = [0.0]*self.centers
+        ysums = [0.0]*self.centers
+        counts = [0]*self.centers
+        for ((x,y),cluster) in zip(data,self.assignments):
+            xsums[cluster] += x
+            ysums[cluster] += y
+            counts[cluster] += 1
 
         # update centroids
-        for cluster in clusters:
-            assignments = clusters[cluster]
-            if assignments:
-                count = len(assignments)
-                xmean = sum([x for (x,y) in assignments])/count
-                ymean = sum([y for (x,y) in assignments])/count
-                self.centroids[cluster] = (xmean,ymean)
+        shifts = [0.0]*self.centers
+        for cluster in range(self.centers):
+            count = counts[cluster]
+            if count:
+                centroid = (xsums[cluster]/count,ysums[cluster]/count)
+                shifts[cluster] = self.euclidean(centroid,centroids[cluster])
+                centroids[cluster] = centroid
+
+        # loosen the bounds by the distance the centroids moved
+        max_shift = max(shifts)
+        if max_shift > 0:
+            # the lower bound of points assigned to the centroid which moved furthest
+            # only needs to allow for the next largest move
+            furthest = shifts.index(max_shift)
+            next_shift = max(shifts[:furthest]+shifts[furthest+1:],default=0.0)
+            self.upper = [u+shifts[a] for (u,a) in zip(self.upper,self.assignments)]
+            self.lower = [l-(next_shift if a == furthest else max_shift) for (l,a) in zip(self.lower,self.assignments)]
+        return max_shift
+
+    def iterateBatch(self,counts):
+        # update centroids from a random mini-batch, using a per-centroid learning rate
+        # returns the largest distance moved by any centroid
+        batch = [self.data[self.rng.randrange(len(self.data))] for _ in range(self.batch_size)]
+        moved = [False]*self.centers
+        old_centroids = self.centroids[:]
+        for (point,cluster) in zip(batch,self.assign(batch)):
+            counts[cluster] += 1
+            rate = 1/counts[cluster]
+            (cx,cy) = self.centroids[cluster]
+            self.centroids[cluster] = (cx+(point[0]-cx)*rate,cy+(point[1]-cy)*rate)
+            moved[cluster] = True
+        return max([self.euclidean(self.centroids[c],old_centroids[c]) for c in range(self.centers) if moved[c]],default=0.0)
+
+    def initCentroids(self):
+        if self.init == "random":
+            return [(self.minx+self.rng.random()*(self.maxx-self.minx),
+                self.miny+self.rng.random()*(self.maxy-self.miny)) for c in range(self.centers)]
+
+        # k-means++, pick each new centroid from the points with probability proportional to
+        # the squared distance from the point to the nearest centroid already chosen
+        centroids = [self.data[self.rng.randrange(len(self.data))]]
+        (cx,cy) = centroids[0]
+        dists = [(x-cx)*(x-cx)+(y-cy)*(y-cy) for (x,y) in self.data]
+        while len(centroids) < self.centers:
+            total = sum(dists)
+            if total <= 0:
+                # fewer distinct points than centers, pick any point
+                centroids.append(self.data[self.rng.randrange(len(self.data))])
+                continue
+            target = self.rng.random()*total
+            idx = 0
+            cumulative = dists[0]
+            while cumulative < target and idx < len(dists)-1:
+                idx += 1
+                cumulative += dists[idx]
+            centroids.append(self.data[idx])
+            (cx,cy) = self.data[idx]
+            dists = [min(d,(x-cx)*(x-cx)+(y-cy)*(y-cy)) for (d,(x,y)) in zip(dists,self.data)]
+        return centroids
 
     def train(self):
+        self.trainProjected([self.projection.fromLonLat(p) for p in self.input_data])
+
+    def trainProjected(self,points):
+        """
+        Train the model on points which have already been projected
 
-        self.data = [self.projection.fromLonLat(p) for p in self.input_data]
+        Arguments:
+            points(list) : list of (x,y) pairs to cluster
+        """
+        self.data = points
 
         self.minx = min([x for (x,y) in self.data])
         self.miny = min([y for (x,y) in self.data])
         self.maxx = max([x for (x,y) in self.data])
         self.maxy = max([y for (x,y) in self.data])
-        self.rng = random.Random()
+        self.rng = random.Random(self.seed)
 
-        self.centroids = [(self.minx+self.rng.random()*(self.maxx-self.minx),
-            self.miny+self.rng.random()*(self.maxy-self.miny)) for c in range(self.centers)]
+        self.centroids = self.initCentroids()
+        self.upper = None
+        self.lower = None
 
+        limit = self.tolerance * max(self.maxx-self.minx,self.maxy-self.miny)
+        counts = [0]*self.centers
         for i in range(self.iterations):
-            self.iterate()
\ No newline at end of file
+            if self.batch_size:
+                shift = self.iterateBatch(counts)
+            else:
+                shift = self.iterate()
+            if shift <= limit:
+                break
+
+        self.assignments = self.assign(self.data)
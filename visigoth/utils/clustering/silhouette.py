@@ -32,11 +32,17 @@ class Silhouette(object):
         data(list) : list of (lon,lat) pairs to evaluate
         model : a cluster model implementing the score method
 
+    Keyword Arguments:
+        sample_size(int) : if set, estimate the score from a random sample of this many points
+        seed(int) : a random seed to use when sampling
+
     """
 
-    def __init__(self, data, model):
+    def __init__(self, data, model, sample_size=None, seed=None):
         self.data = data
         self.model = model
+        self.sample_size = sample_size
+        self.seed = seed
 
     def computeMeanDistance(self,point,otherpoints):
         totaldist = 0.0
@@ -47,29 +53,58 @@ class Silhouette(object):
         return totaldist/len(otherpoints)
 
     def compute(self):
-        clusters = self.model.getClusterCount()
-        assignments = {cluster:[] for cluster in range(clusters)}
-        for point in self.data:
-            cluster = self.model.score(point)
-            assignments[cluster].append(point)
+        # project each point once and score it once
+        points = [self.model.projection.fromLonLat(point) for point in self.data]
+        assignments = [self.model.score(point) for point in self.data]
+        return Silhouette.computeProjected(points,assignments,self.model.getClusterCount(),
+                                          sample_size=self.sample_size,seed=self.seed)
+
+    @staticmethod
+    def computeProjected(points,assignments,cluster_count,sample_size=None,seed=None):
+        """
+        Compute the silhouette score for points which have already been projected
+
+        Arguments:
+            points(list) : list of (x,y) pairs
+            assignments(list) : the cluster index assigned to each point
+            cluster_count(int) : the number of clusters
+
+        Keyword Arguments:
+            sample_size(int) : if set, estimate the score from a random sample of this many points
+            seed(int) : a random seed to use when sampling
+
+        Returns:
+            the mean silhouette score
+        """
+        if not points:
+            return 0.0
+        members = [[] for cluster in range(cluster_count)]
+        for (point,cluster) in zip(points,assignments):
+            members[cluster].append(point)
+
+        indices = range(len(points))
+        if sample_size is not None and sample_size < len(points):
+            indices = random.Random(seed).sample(indices,sample_size)
 
         s_tot = 0
-        for point in self.data:
-            cluster = self.model.score(point)
-            sameclusterpoints = assignments[cluster][:]
-            sameclusterpoints.remove(point)
-            if not len(sameclusterpoints):
+        for idx in indices:
+            (px,py) = points[idx]
+            cluster = assignments[idx]
+            sameclusterpoints = members[cluster]
+            if len(sameclusterpoints) < 2:
                 continue
-            sil_a = self.computeMeanDistance(point,sameclusterpoints)
+            # the point's distance to itself is zero, so exclude only it from the count
+            sil_a = sum(math.sqrt((x-px)**2+(y-py)**2) for (x,y) in sameclusterpoints)/(len(sameclusterpoints)-1)
 
-            otherclusters = list(range(clusters))
-            otherclusters.remove(cluster)
             sil_b = None
-            for othercluster in otherclusters:
-                otherclusterpoints = assignments[othercluster]
-                b_cand = self.computeMeanDistance(point,otherclusterpoints)
+            for othercluster in range(cluster_count):
+                otherclusterpoints = members[othercluster]
+                if othercluster == cluster or not otherclusterpoints:
+                    continue
+                b_cand = sum(math.sqrt((x-px)**2+(y-py)**2) for (x,y) in otherclusterpoints)/len(otherclusterpoints)
                 if b_cand > 0.0 and (sil_b == None or b_cand < sil_b):
                     sil_b = b_cand
 
-            s_tot += (sil_b - sil_a)/max(sil_a,sil_b)
-        return s_tot / len(self.data)
\ No newline at end of file
+            if sil_b is not None:
+                s_tot += (sil_b - sil_a)/max(sil_a,sil_b)
+        return s_tot / len(indices)
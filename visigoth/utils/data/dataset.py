@@ -40,6 +40,9 @@ class SumFunction(object):
         else:
             return acc
 
+    def accumulateAll(self,acc,vals):
+        return acc+sum(val for val in vals if val is not None)
+
     def finalise(self,acc):
         return acc
 
@@ -57,6 +60,9 @@ class MinFunction(object):
         else:
             return acc
 
+    def accumulateAll(self,acc,vals):
+        return self.accumulate(acc,min((val for val in vals if val is not None),default=None))
+
     def finalise(self,acc):
         return acc
 
@@ -74,6 +80,9 @@ class MaxFunction(object):
         else:
             return acc
 
+    def accumulateAll(self,acc,vals):
+        return self.accumulate(acc,max((val for val in vals if val is not None),default=None))
+
     def finalise(self,acc):
         return acc
 
@@ -88,6 +97,9 @@ class CountFunction(object):
     def accumulate(self,acc):
         return acc + 1
 
+    def accumulateAll(self,acc,vals):
+        return acc + len(vals)
+
     def finalise(self,acc):
         return acc
 
@@ -106,6 +118,9 @@ class CountNoneFunction(object):
         else:
             return acc
 
+    def accumulateAll(self, acc, vals):
+        return acc + sum(1 for val in vals if val is None)
+
     def finalise(self, acc):
         return acc
 
@@ -125,25 +140,162 @@ class AggregationFunction(object):
         else:
             self.accumulators[key] = self.fn.accumulate(self.accumulators[key])
 
+    # accumulate the values of the column for all rows in a group in one call
+    # (for functions without a column, vals has one entry per row)
+    def aggregateAll(self,key,vals):
+        if key not in self.accumulators:
+            self.accumulators[key] = self.fn.initialValue()
+
+        if hasattr(self.fn,"accumulateAll"):
+            self.accumulators[key] = self.fn.accumulateAll(self.accumulators[key],vals)
+        elif self.column != None:
+            for val in vals:
+                self.accumulators[key] = self.fn.accumulate(self.accumulators[key],val)
+        else:
+            for _ in vals:
+                self.accumulators[key] = self.fn.accumulate(self.accumulators[key])
+
     def finalise(self,key):
         return (self.fn.finalise(self.accumulators[key]),)
-        
-class EqualityFilter(object):
 
-    def __init__(self,column,literal):
+class Filter(object):
+
+    def __init__(self,column):
         self.column = column
-        self.literal = literal
 
     def allow(self,datum):
-        return datum[self.column] == self.literal
+        return self.test(datum[self.column])
+
+    # return the indices of the values which pass the filter, considering only the given indices (or all if None)
+    def select(self,values,indices):
+        test = self.test
+        if indices is None:
+            return [index for (index,value) in enumerate(values) if test(value)]
+        return [index for index in indices if test(values[index])]
+
+class EqualityFilter(Filter):
+
+    def __init__(self,column,literal):
+        Filter.__init__(self,column)
+        self.literal = literal
+
+    def test(self,value):
+        return value == self.literal
+
+    def select(self,values,indices):
+        literal = self.literal
+        if indices is None:
+            return [index for (index,value) in enumerate(values) if value == literal]
+        return [index for index in indices if values[index] == literal]
+
+class ComparisonFilter(Filter):
+
+    operators = {
+        "!=": lambda v,l: v != l,
+        "<": lambda v,l: v < l,
+        "<=": lambda v,l: v <= l,
+        ">": lambda v,l: v > l,
+        ">=": lambda v,l: v >= l
+    }
+
+    def __init__(self,column,op,literal):
+        Filter.__init__(self,column)
+        self.op = ComparisonFilter.operators[op]
+        self.ordering = op != "!="
+        self.literal = literal
+
+    def test(self,value):
+        # None values never pass an ordering comparison
+        if self.ordering and value is None:
+            return False
+        return self.op(value,self.literal)
+
+class RangeFilter(Filter):
+
+    def __init__(self,column,min_value=None,max_value=None):
+        Filter.__init__(self,column)
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def test(self,value):
+        if value is None:
+            return False
+        if self.min_value is not None and value < self.min_value:
+            return False
+        if self.max_value is not None and value > self.max_value:
+            return False
+        return True
+
+class SetFilter(Filter):
+
+    def __init__(self,column,literals,exclude=False):
+        Filter.__init__(self,column)
+        try:
+            self.literals = frozenset(literals)
+        except TypeError:
+            # unhashable values, fall back to a linear search
+            self.literals = list(literals)
+        self.exclude = exclude
+
+    def test(self,value):
+        try:
+            found = value in self.literals
+        except TypeError:
+            # unhashable value (for example a list), compare with each literal
+            found = any(value == literal for literal in self.literals)
+        return found != self.exclude
+
+class PredicateFilter(Filter):
+
+    def __init__(self,column,predicate):
+        Filter.__init__(self,column)
+        self.predicate = predicate
+
+    def test(self,value):
+        return self.predicate(value)
 
 class Dataset(object):
 
+    """
+    Wrap input data for querying
+
+    Arguments:
+        data: a list of rows (each row a list, tuple or dict), a dict mapping column names to lists of values,
+              or a pandas DataFrame or pyarrow Table
+
+    Notes:
+        data is stored by column - the values of a column are extracted from the rows when the column is first
+        queried and retained for subsequent queries.  Where columns are supplied as a dict of lists of different
+        lengths, the shorter columns are padded with None, as for rows which are missing a value.
+    """
+
     def __init__(self,data):
-        self.data = data
+        self.data = None
+        self.column_names = None
+        self.column_values = {}
+        if isinstance(data,dict):
+            self.loadColumns(data)
+        elif hasattr(data,"columns") and hasattr(data,"to_dict"):
+            # pandas DataFrame
+            self.loadColumns({name:data[name].tolist() for name in data.columns})
+        elif hasattr(data,"to_pydict"):
+            # pyarrow Table
+            self.loadColumns(data.to_pydict())
+        else:
+            self.data = data
+            self.nr_rows = len(data)
+
+    def loadColumns(self,columns):
+        self.column_names = list(columns.keys())
+        self.column_values = {name:list(columns[name]) for name in self.column_names}
+        self.nr_rows = max([len(values) for values in self.column_values.values()],default=0)
+        for name in self.column_names:
+            values = self.column_values[name]
+            if len(values) < self.nr_rows:
+                values += [None]*(self.nr_rows-len(values))
 
     def __len__(self):
-        return len(self.data)
+        return self.nr_rows
 
     @staticmethod
     def constant(val):
@@ -173,9 +325,25 @@ class Dataset(object):
     def filter(column,op,literal):
         if op == "=" or op == "==":
             return EqualityFilter(column,literal)
+        if op in ComparisonFilter.operators:
+            return ComparisonFilter(column,op,literal)
+        if op == "in":
+            return SetFilter(column,literal)
+        if op == "not in":
+            return SetFilter(column,literal,exclude=True)
         raise Exception("invalid filter operation:"+op)
 
+    @staticmethod
+    def range(column,min_value=None,max_value=None):
+        return RangeFilter(column,min_value,max_value)
+
+    @staticmethod
+    def predicate(column,fn):
+        return PredicateFilter(column,fn)
+
     def getColumns(self):
+        if self.column_names is not None:
+            return self.column_names[:]
         columns = []
         for row in self.data:
             if isinstance(row,tuple) or isinstance(row,list):
@@ -187,56 +355,88 @@ class Dataset(object):
                         columns.append(key)
         return columns
 
+    # get the list of values for a column, extracting them from the rows if necessary
+    def getColumn(self,column):
+        if column in self.column_values:
+            return self.column_values[column]
+        if self.data is None:
+            if isinstance(column,int) and column < len(self.column_names):
+                # refer to columns by position
+                return self.column_values[self.column_names[column]]
+            return [None]*self.nr_rows
+
+        values = []
+        append = values.append
+        for datum in self.data:
+            if isinstance(datum,dict):
+                append(datum.get(column))
+            elif isinstance(column,int) and column < len(datum):
+                append(datum[column])
+            else:
+                append(None)
+        self.column_values[column] = values
+        return values
+
     def isDiscrete(self,column):
         # FIXME currently mark a column as discrete if values are of type str
         # we need also to consider int columns of "low" cardinality as discrete
-        for datum in self.data:
-            if isinstance(datum,dict) and not column in datum:
+        for value in self.getColumn(column):
+            if value is None:
                 continue
-            if datum[column] == None:
-                continue
-            if isinstance(datum[column],str):
-                return True
-            else:
-                return False
+            return isinstance(value,str)
         return False
 
+    # get the values of a column (or None/Constant) for the rows at the given indices (or all rows if None)
+    def getValues(self,column,indices):
+        nr_rows = self.nr_rows if indices is None else len(indices)
+        if column is None:
+            return [None]*nr_rows
+        if isinstance(column,Constant):
+            return [column.value()]*nr_rows
+        values = self.getColumn(column)
+        if indices is None:
+            return values
+        return [values[index] for index in indices]
+
     def query(self,columns=[],unique=False,filters=[],aggregations=[],flatten=False):
-        rows = []
         if columns == []:
             unique = True
-        for datum in self.data:
-            row = []
-            filtered = False
-            for filter in filters:
-                if not filter.allow(datum):
-                    filtered = True
-                    break
-            if filtered:
-                continue
-            for column in columns:
-                if column is None:
-                    row.append(None)
-                elif isinstance(column,Constant):
-                    row.append(column.value())  
-                elif isinstance(column,int) and column < len(datum):
-                    row.append(datum[column])
-                elif column in datum:
-                    row.append(datum[column])
-                else:
-                    row.append(None)
-            tup = tuple(row)   
-            if not unique or tup not in rows: 
-                rows.append(tup)
-            for aggregation in aggregations:
-                aggregation.aggregate(tup,datum)
+
+        indices = None
+        for filter in filters:
+            indices = filter.select(self.getColumn(filter.column),indices)
+
+        nr_rows = self.nr_rows if indices is None else len(indices)
+        if columns:
+            keys = list(zip(*[self.getValues(column,indices) for column in columns]))
+        else:
+            keys = [()]*nr_rows
 
         if aggregations:
-            rows2 = []
-            for tup in rows:
-                if tup not in rows2:
-                    rows2.append(tup)
-            rows = rows2
+            if columns:
+                groups = {}
+                for (position,key) in enumerate(keys):
+                    if key in groups:
+                        groups[key].append(position)
+                    else:
+                        groups[key] = [position]
+            else:
+                groups = {():range(nr_rows)} if nr_rows else {}
+
+            for aggregation in aggregations:
+                values = self.getValues(aggregation.column,indices)
+                for key in groups:
+                    positions = groups[key]
+                    if len(groups) == 1:
+                        aggregation.aggregateAll(key,values)
+                    else:
+                        aggregation.aggregateAll(key,[values[position] for position in positions])
+            rows = list(groups)
+        elif unique:
+            # a dict retains the order in which each unique row was first encountered
+            rows = list(dict.fromkeys(keys))
+        else:
+            rows = keys
 
         results = []
         for tup in rows:
@@ -247,4 +447,4 @@ class Dataset(object):
                 results += result
             else:
                 results.append(result)
-        return results
\ No newline at end of file
+        return results
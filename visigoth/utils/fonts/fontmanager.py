@@ -20,12 +20,12 @@
 
 import json
 import os.path
-import base64
 import zipfile
 import sqlite3
 import tempfile
 
 from visigoth.utils.httpcache import HttpCache
+from visigoth.svg.datauri import datauri
 
 class FontManager(object):
 
@@ -124,6 +124,17 @@ class FontManager(object):
                     
     @staticmethod
     def getCssFontFace(name,weight,style):
+        return "".join(str(part) for part in FontManager.getCssFontFaceContent(name,weight,style))
+
+    @staticmethod
+    def getCssFontFaceContent(name,weight,style):
+        """
+        Get the CSS font-face definition for a font, with the font data as a datauri
+
+        Returns:
+            a list of strings and a visigoth.svg.datauri, to be concatenated.  The font file is only read and
+            encoded when the definition is written
+        """
         conn = sqlite3.connect(FontManager.db_path)
 
         key = FontManager.getFontKey(name,weight,style)
@@ -147,15 +158,15 @@ class FontManager(object):
                 path=HttpCache.fetch(url,returnPath=True)
                 mimetype = "font/ttf"
 
-        with open(path,"r+b") as fontfile:
-                uri="data:"+mimetype+";charset=US-ASCII;base64,"+str(base64.b64encode(fontfile.read()),"utf-8")
-                return """
+        return ["""
                 @font-face {
                         font-family: '%s';
                         font-weight: %s;
                         font-style: %s;
-                        src: url('%s');
-                }"""%(name,weight,style,uri)
+                        src: url('"""%(name,weight,style),
+                datauri(mimetype,path=path),
+                """');
+                }"""]
 
     @staticmethod
     def getCssFontImport(name):
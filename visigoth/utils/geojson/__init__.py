@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from visigoth.utils.geojson.coordinates import Coordinates
+from visigoth.utils.geojson.geometry_cache import GeometryCache
 from visigoth.utils.geojson.geojson_reader import GeojsonReader
 from visigoth.utils.geojson.geojson_writer import GeojsonWriter
 from visigoth.utils.geojson.geojson_transform import GeoJsonTransformer
\ No newline at end of file
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+#    visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without 
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or 
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+from array import array
+from itertools import islice
+
+class Coordinates(object):
+    """
+    A compact read-only sequence of (lon,lat) tuples, stored in an array of doubles
+
+    Arguments:
+        values (array.array|memoryview): flat array of the ordinates of each position in turn (of type double)
+
+    Keyword Arguments:
+        dimension (int): the number of ordinates stored for each position, 2 for (lon,lat) or more if altitude etc are included
+
+    Notes:
+        Iterating or indexing yields (lon,lat) tuples so instances can be used wherever a list of (lon,lat) tuples is expected,
+        use getPositions to retrieve the complete positions including any further ordinates
+    """
+
+    __slots__ = ["values","dimension"]
+
+    # instances are mutable (the values array is exposed), so they are not hashable
+    __hash__ = None
+
+    def __init__(self,values=None,dimension=2):
+        self.values = values if values is not None else array("d")
+        self.dimension = dimension
+
+    @staticmethod
+    def fromPositions(positions):
+        """
+        Create from a list of positions, ignoring any position with a missing lon or lat
+
+        Arguments:
+            positions (list): list of [lon,lat] or [lon,lat,altitude,...] lists (or tuples)
+
+        Returns:
+            Coordinates instance, retaining altitude and any further ordinates that every position has
+        """
+        positions = [position for position in positions if position[0] is not None and position[1] is not None]
+        dimension = min(map(len,positions),default=2)
+        values = array("d")
+        if dimension == 2:
+            for position in positions:
+                values.append(position[0])
+                values.append(position[1])
+        else:
+            for position in positions:
+                values.extend(position[:dimension])
+        return Coordinates(values,dimension)
+
+    def getValues(self):
+        return self.values
+
+    def getDimension(self):
+        return self.dimension
+
+    def getPositions(self):
+        """
+        Get the complete positions
+
+        Returns:
+            list of tuples, each containing the lon, lat and any further ordinates of a position
+        """
+        values = self.values
+        dimension = self.dimension
+        return [tuple(values[offset:offset+dimension]) for offset in range(0,len(values),dimension)]
+
+    def __len__(self):
+        return len(self.values) // self.dimension
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("Coordinates index out of range")
+        offset = self.dimension*index
+        return (self.values[offset],self.values[offset+1])
+
+    def __iter__(self):
+        dimension = self.dimension
+        return zip(islice(self.values,0,None,dimension),islice(self.values,1,None,dimension))
+
+    def __eq__(self,other):
+        if isinstance(other,Coordinates):
+            return self.dimension == other.dimension and self.values == other.values
+        return list(self) == [tuple(p) for p in other]
+
+    def __reduce__(self):
+        # values may be a memoryview onto a memory mapped cache file, which cannot be pickled
+        values = self.values
+        if not isinstance(values,array):
+            values = array("d")
+            values.frombytes(self.values.cast("B"))
+        return (Coordinates,(values,self.dimension))
+
+    def __repr__(self):
+        return "Coordinates(%s)" % str(list(self))
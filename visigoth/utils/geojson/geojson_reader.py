@@ -20,62 +20,159 @@
 
 import json
 import logging
+import re
+
+from visigoth.utils.geojson.coordinates import Coordinates
+from visigoth.utils.geojson.geometry_cache import GeometryCache
 
 class GeojsonReader(object):
 
     """
     Create a Geojson reader
 
+    Keyword Arguments:
+        filter_box (tuple): (min_lon,min_lat,max_lon,max_lat) only read features with at least one point inside this box
+        include_properties (list): only retain these properties from each feature (retain all if None)
+        chunk_size (int): the number of characters to read from the file at a time
+        use_cache (bool): store extracted geometry in a GeometryCache and load it from there when the file is unchanged
+
+    Notes:
+        Files are parsed incrementally, one feature at a time, so that the memory required is proportional
+        to the retained data rather than the size of the file.  Filtering by box and property is applied as
+        each feature is parsed.  Coordinates are returned as Coordinates instances backed by compact arrays.
     """
 
-    def __init__(self):
+    def __init__(self,filter_box=None,include_properties=None,chunk_size=1048576,use_cache=False):
         super(GeojsonReader, self).__init__()
+        self.filter_box = filter_box
+        self.include_properties = include_properties
+        self.chunk_size = chunk_size
+        self.use_cache = use_cache
 
     def extract(self,path):
-        with open(path) as f:
-            data = json.loads(f.read())
+        """
+        Read points, lines and polygons from a geojson file
+
+        Arguments:
+            path (str): path to the geojson file
+
+        Returns:
+            (points,lines,polys) tuple, each a list of (properties,coordinates) pairs
+        """
+        cache_options = None
+        if self.use_cache:
+            filter_box = list(self.filter_box) if self.filter_box else None
+            include_properties = sorted(self.include_properties) if self.include_properties is not None else None
+            cache_options = ["geojson",filter_box,include_properties]
+            cached = GeometryCache.load(path,cache_options)
+            if cached:
+                (self.points,self.lines,self.polys) = cached
+                return cached
+
         self.points = []
         self.lines = []
         self.polys = []
-        gt = data["type"]
-        if gt == "FeatureCollection":
-            for feature in data["features"]:
-                self.processFeature(feature)
-        if gt == "Feature":
-            props = {}
-            if "properties" in data:
-                props = data["properties"]
-            geometry = data["geometry"]
-            self.processGeometry(geometry,props)
+        collections = {"point":self.points,"line":self.lines,"polygon":self.polys}
+        for (kind,props,coordinates) in self.iterate(path):
+            collections[kind].append((props,coordinates))
+
+        if self.use_cache:
+            GeometryCache.store(path,cache_options,(self.points,self.lines,self.polys))
         return (self.points,self.lines,self.polys)
 
+    def iterate(self,path):
+        """
+        Lazily read points, lines and polygons from a geojson file
+
+        Arguments:
+            path (str): path to the geojson file
+
+        Returns:
+            generator yielding (kind,properties,coordinates) for each geometry, where kind is "point", "line" or "polygon"
+        """
+        for feature in self.iterFeatures(path):
+            yield from self.processFeature(feature)
+
+    def iterFeatures(self,path):
+        """
+        Lazily read the features from a geojson file, applying any box filter and property selection
+
+        Arguments:
+            path (str): path to the geojson file
+
+        Returns:
+            generator yielding each feature as a dict
+        """
+        with open(path) as f:
+            for feature in JsonFeatureStream(f,self.chunk_size):
+                if not isinstance(feature,dict) or feature.get("type") != "Feature":
+                    yield feature
+                    continue
+                if self.filter_box and not self.inFilterBox(feature):
+                    continue
+                if self.include_properties is not None and feature.get("properties"):
+                    feature["properties"] = {key:value for (key,value) in feature["properties"].items() if key in self.include_properties}
+                yield feature
+
+    def inFilterBox(self,feature):
+        (min_lon,min_lat,max_lon,max_lat) = self.filter_box
+        geometry = feature.get("geometry")
+        if not geometry:
+            return False
+        # reject quickly using the bounding box, if the feature or geometry provides one
+        bbox = feature.get("bbox",geometry.get("bbox"))
+        if bbox and len(bbox) == 4:
+            if bbox[0] > max_lon or bbox[2] < min_lon or bbox[1] > max_lat or bbox[3] < min_lat:
+                return False
+        for position in GeojsonReader.iterPositions(geometry):
+            lon = position[0]
+            lat = position[1]
+            if lon is not None and lat is not None and min_lon <= lon <= max_lon and min_lat <= lat <= max_lat:
+                return True
+        return False
+
+    @staticmethod
+    def iterPositions(geometry):
+        if geometry.get("type") == "GeometryCollection":
+            for geom in geometry["geometries"]:
+                yield from GeojsonReader.iterPositions(geom)
+            return
+        stack = [geometry.get("coordinates",[])]
+        while stack:
+            coords = stack.pop()
+            if coords and isinstance(coords[0],list):
+                stack.extend(coords)
+            elif len(coords) >= 2:
+                yield coords
+
     def processFeature(self,data):
         gt = data["type"]
         if gt == "Feature":
             props = {}
-            if "properties" in data:
+            if "properties" in data and data["properties"] is not None:
                 props = data["properties"]
             geometry = data["geometry"]
-            self.processGeometry(geometry,props)
+            if geometry:
+                yield from self.processGeometry(geometry,props)
         else:
             logging.getLogger("GeojsonReader").warning("Unable to process geojson data of type=%s"%(gt))
 
     def processGeometry(self,geometry,props):
         gtype = geometry["type"]
         if gtype == "Point":
-            self.processGeoJSONPoint(geometry,props)
+            yield from self.processGeoJSONPoint(geometry,props)
         if gtype == "MultiPoint":
-            self.processGeoJSONMultiPoint(geometry,props)
+            yield from self.processGeoJSONMultiPoint(geometry,props)
         if gtype == "LineString":
-            self.processGeoJSONLineString(geometry,props)
+            yield from self.processGeoJSONLineString(geometry,props)
         if gtype == "MultiLineString":
-            self.processGeoJSONMultiLineString(geometry,props)
+            yield from self.processGeoJSONMultiLineString(geometry,props)
         if gtype == "Polygon":
-            self.processGeoJSONPolygon(geometry,props)
+            yield from self.processGeoJSONPolygon(geometry,props)
         if gtype == "MultiPolygon":
-            self.processGeoJSONMultiPolygon(geometry,props)
+            yield from self.processGeoJSONMultiPolygon(geometry,props)
         if gtype == "GeometryCollection":
-            self.processGeoJSONGeometryCollection(geometry,props)
+            yield from self.processGeoJSONGeometryCollection(geometry,props)
 
     def processGeoJSONPolygon(self,geometry,props):
         coordinates = geometry["coordinates"]
@@ -83,7 +180,7 @@ class GeojsonReader(object):
         for area in coordinates:
             ring = self.processPolygon(area)
             rings.append(ring)
-        self.polys.append((props,[rings]))
+        yield ("polygon",props,[rings])
 
     def processGeoJSONMultiPolygon(self,geometry,props):
         coordinates = geometry["coordinates"]
@@ -94,56 +191,116 @@ class GeojsonReader(object):
                 ring = self.processPolygon(area)
                 rings.append(ring)
             polys.append(rings)
-        self.polys.append((props,polys))
+        yield ("polygon",props,polys)
 
     def processGeoJSONPoint(self,geometry,props):
         coordinates = geometry["coordinates"]
-        point  = self.processPoint(coordinates)
-        if point:
-            self.points.append((props,[point]))
+        points = Coordinates.fromPositions([coordinates])
+        if len(points):
+            yield ("point",props,points)
 
     def processGeoJSONMultiPoint(self,geometry,props):
         coordinates = geometry["coordinates"]
-        points = []
-        for coords in coordinates:
-            p  = self.processPoint(coords)
-            if p:
-                points.append(p)
-        self.points.append((props,points))
+        yield ("point",props,Coordinates.fromPositions(coordinates))
 
     def processGeoJSONLineString(self,geometry,props):
         coordinates = geometry["coordinates"]
-        line = []
-        for coord in coordinates:
-            point  = self.processPoint(coord)
-            if point:
-                line.append(point)
-        self.lines.append((props,[line]))
+        yield ("line",props,[Coordinates.fromPositions(coordinates)])
 
     def processGeoJSONMultiLineString(self,geometry,props):
         coordinates = geometry["coordinates"]
         lines = []
         for l in coordinates:
-            line = []
-            for coord in l:
-                point  = self.processPoint(coord)
-                if point:
-                    line.append(point)
-            lines.append(line)
-        self.lines.append((props,lines))
+            lines.append(Coordinates.fromPositions(l))
+        yield ("line",props,lines)
 
     def processGeoJSONGeometryCollection(self,geometry,props):
         for geom in geometry["geometries"]:
-            self.processGeometry(geom,props)
+            yield from self.processGeometry(geom,props)
 
     def processPolygon(self,area):
-        poly = []
-        for point in area:
-            poly.append(point)
-        return poly
+        return Coordinates.fromPositions(area)
+
+
+class JsonFeatureStream(object):
+
+    """
+    Iterate over the features in a geojson FeatureCollection read incrementally from a text stream.
+    A file containing a single Feature yields that feature.
+    """
+
+    WHITESPACE = re.compile(r"[ \t\n\r]*")
+    NUMBER_CHARS = re.compile(r"[0-9.eE+\-]*")
+
+    def __init__(self,f,chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def __iter__(self):
+        top = {}
+        self.expect("{")
+        if not self.consume("}"):
+            while True:
+                key = self.decode()
+                self.expect(":")
+                if key == "features":
+                    self.expect("[")
+                    if not self.consume("]"):
+                        while True:
+                            yield self.decode()
+                            if self.consume("]"):
+                                break
+                            self.expect(",")
+                else:
+                    top[key] = self.decode()
+                if not self.consume(","):
+                    self.expect("}")
+                    break
+        if top.get("type") == "Feature":
+            yield top
+
+    def fill(self,size):
+        # discard the text already consumed and append more from the file
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+
+    def skipWhitespace(self):
+        while True:
+            self.pos = JsonFeatureStream.WHITESPACE.match(self.buffer,self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return
+            self.fill(self.chunk_size)
+
+    def consume(self,token):
+        self.skipWhitespace()
+        if self.buffer.startswith(token,self.pos):
+            self.pos += len(token)
+            return True
+        return False
 
-    def processPoint(self,coords):
-        if (coords[0] != None and coords[1] != None):
-            return coords
-        return None
+    def expect(self,token):
+        if not self.consume(token):
+            raise ValueError("Invalid geojson, expected '%s' near: %s" % (token,self.buffer[self.pos:self.pos+40]))
 
+    def decode(self):
+        self.skipWhitespace()
+        while True:
+            try:
+                (value,end) = self.decoder.raw_decode(self.buffer,self.pos)
+                # a number split across chunks decodes as a truncated prefix (for example "1." as 1),
+                # so a value followed by nothing but number characters may continue in the next chunk
+                if self.eof or JsonFeatureStream.NUMBER_CHARS.match(self.buffer,end).end() < len(self.buffer):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # read at least as much again as the buffered value so that large values are not re-parsed too often
+            self.fill(max(self.chunk_size,len(self.buffer)-self.pos))
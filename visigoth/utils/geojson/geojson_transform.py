@@ -24,39 +24,21 @@ from visigoth.utils.geojson import GeojsonReader, GeojsonWriter
 
 class GeoJsonTransformer(object):
 
-    def __init__(self,filter_box=None,decimal_places=None,include_properties=None):
+    def __init__(self,filter_box=None,decimal_places=None,include_properties=None,ndjson=False,processes=1):
         self.filter_box=filter_box
         self.decimal_places = decimal_places
         self.include_properties = include_properties
+        self.ndjson = ndjson
+        self.processes = processes
 
     def transform_file(self,input_path,output_path):
-        gjr = GeojsonReader()
+        # the box filter and property selection are applied by the reader as each feature is parsed
+        # and features are streamed through to the writer without collecting them in memory
+        gjr = GeojsonReader(filter_box=self.filter_box,include_properties=self.include_properties)
         gjw = GeojsonWriter()
-        (points, lines, polys) = gjr.extract(input_path)
-
-        filterfn = None
-        if self.filter_box:
-            min_lon = self.filter_box[0]
-            min_lat = self.filter_box[1]
-            max_lon = self.filter_box[2]
-            max_lat = self.filter_box[3]
-
-            def filterfn(lonlats):
-                for (lon, lat) in lonlats:
-                    if lon >= min_lon and lon <= max_lon and lat >= min_lat and lat <= max_lat:
-                        return True
-                return False
-
-        propertyfilter = None
-        if self.include_properties != None:
-            def propertyfilter(properties):
-                removal_keys = [key for key in properties if key not in self.include_properties]
-                for key in removal_keys:
-                    del properties[key]
-
-        gjw.export(output_path, points, lines, polys, featurefilter=filterfn,
-                   decimal_places=self.decimal_places,
-                   propertyfilter=propertyfilter)
+        with open(output_path,"w") as f:
+            gjw.write(f, gjr.iterate(input_path), decimal_places=self.decimal_places,
+                      ndjson=self.ndjson, processes=self.processes)
 
 if __name__ == '__main__':
 
@@ -66,12 +48,14 @@ if __name__ == '__main__':
     parser.add_argument("--filter_box",nargs=4,type=float,default=None)
     parser.add_argument("--decimal_places",type=int, default=3)
     parser.add_argument("--include_properties", default="")
+    parser.add_argument("--ndjson", action="store_true", help="write newline delimited features")
+    parser.add_argument("--processes", type=int, default=1, help="number of worker processes to encode features")
 
     args = parser.parse_args()
     include_properties=None
     if args.include_properties != "":
         include_properties=args.include_properties.split(",")
 
-    transformer = GeoJsonTransformer(boundaries=args.filter_box,decimal_places=args.decimal_places,include_properties=include_properties)
-    transformer.transform_file(args.input_geojson_file,args.output_geojson_file)
-
+    transformer = GeoJsonTransformer(filter_box=args.filter_box,decimal_places=args.decimal_places,include_properties=include_properties,
+                                     ndjson=args.ndjson,processes=args.processes)
+    transformer.transform_file(args.input_geojson_path,args.output_geojson_path)
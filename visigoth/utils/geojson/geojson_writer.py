@@ -18,72 +18,172 @@
 #   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+
 import json
-import re
+import math
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 
+from visigoth.utils.geojson.coordinates import Coordinates
 
 class GeojsonWriter(object):
 
+    """
+    Create a Geojson writer
+
+    Notes:
+        Features are encoded and written one at a time (or one chunk at a time when using worker processes).
+        Coordinates are rounded to the requested number of decimal places as they are encoded.
+    """
+
+    GEOMETRY_TYPES = {"point":"MultiPoint","line":"MultiLineString","polygon":"MultiPolygon"}
+
     def __init__(self):
         pass
 
-    def export(self,path, multipoints, multilines, multipolys, featurefilter=None, propertyfilter=None, decimal_places=5):
-        exported = {}
-        exported["type"] = "FeatureCollection"
-        features = []
-
-        for multipoint in multipoints:
-            properties = multipoint[0]
-            coordinates = multipoint[1]
-            flat_coords = [(lon,lat) for (lon,lat) in coordinates]
-            if featurefilter and not featurefilter(flat_coords):
-                continue
-            if propertyfilter:
-                propertyfilter(properties)
-            geometry = { "type":"MultiPoint", "coordinates":coordinates }
-            feature = { "type":"Feature", "properties":properties, "geometry":geometry }
-            features.append(feature)
-
-        for multiline in multilines:
-            properties = multiline[0]
-            coordinates = multiline[1]
-            flat_coords = [(lon,lat) for l1 in coordinates for (lon,lat) in l1]
-            if featurefilter and not featurefilter(flat_coords):
-                continue
-            if propertyfilter:
-                propertyfilter(properties)
-            geometry = { "type":"MultiLineString", "coordinates":coordinates }
-            feature = { "type":"Feature", "properties":properties, "geometry":geometry }
-            features.append(feature)
-
-        for multipoly in multipolys:
-            properties = multipoly[0]
-            coordinates = multipoly[1]
-            flat_coords = [(lon,lat) for l1 in coordinates for l2 in l1 for (lon,lat) in l2]
-            if featurefilter and not featurefilter(flat_coords):
-                continue
-            if propertyfilter:
-                propertyfilter(properties)
-            geometry = { "type":"MultiPolygon", "coordinates":coordinates }
-            feature = { "type":"Feature", "properties":properties, "geometry":geometry }
-            features.append(feature)
-
-        exported["features"] = features
-
-        jgs = json.dumps(exported)
-
-        # by default JSON floats are encoded at double precision by python's json encoder
-        # postprocess to modify the precision using regexp
-
-        # build a pattern to match higher precision floating point numbers
-        threshold = decimal_places+1
-        pat = re.compile(r"\d+\.\d{%d,}"%(threshold))
-
-        # and a function to perform the substitution
-        def mround(match):
-            return ("{:.%df}"%(decimal_places)).format(float(match.group()))
-
-        # write the modified string to a file
-        f = open(path, 'w')
-        f.write(re.sub(pat, mround, jgs))
-        f.close()
+    def export(self,path, multipoints, multilines, multipolys, featurefilter=None, propertyfilter=None, decimal_places=5, ndjson=False, processes=1):
+        """
+        Export points, lines and polygons to a geojson file
+
+        Arguments:
+            path (str): path of the file to write
+            multipoints (list): list of (properties,points) pairs
+            multilines (list): list of (properties,lines) pairs
+            multipolys (list): list of (properties,polygons) pairs
+
+        Keyword Arguments:
+            featurefilter (function): function which is passed the list of (lon,lat) of each feature, return False to exclude the feature
+            propertyfilter (function): function which may modify the properties dict of each feature
+            decimal_places (int): round coordinates to this many decimal places (None to retain full precision)
+            ndjson (bool): write newline delimited features instead of a FeatureCollection
+            processes (int): the number of worker processes used to encode features
+        """
+        def features():
+            for (kind,collection) in [("point",multipoints),("line",multilines),("polygon",multipolys)]:
+                for (properties,coordinates) in collection:
+                    if featurefilter and not featurefilter(GeojsonWriter.flatten(kind,coordinates)):
+                        continue
+                    if propertyfilter:
+                        propertyfilter(properties)
+                    yield (kind,properties,coordinates)
+
+        with open(path,"w") as f:
+            self.write(f,features(),decimal_places=decimal_places,ndjson=ndjson,processes=processes)
+
+    def write(self,f,features,decimal_places=5,ndjson=False,processes=1,chunk_size=1000):
+        """
+        Write features to a text stream
+
+        Arguments:
+            f (file): text stream to write to
+            features (iterable): iterable yielding (kind,properties,coordinates) where kind is "point", "line" or "polygon"
+                (for example GeojsonReader.iterate)
+
+        Keyword Arguments:
+            decimal_places (int): round coordinates to this many decimal places (None to retain full precision)
+            ndjson (bool): write newline delimited features instead of a FeatureCollection
+            processes (int): the number of worker processes used to encode features
+            chunk_size (int): the number of features passed to a worker process at a time
+        """
+        separator = "\n" if ndjson else ", "
+        if not ndjson:
+            f.write('{"type": "FeatureCollection", "features": [')
+        first = True
+        for text in self.encodeChunks(features,decimal_places,separator,processes,chunk_size):
+            if not first:
+                f.write(separator)
+            f.write(text)
+            first = False
+        if ndjson:
+            if not first:
+                f.write("\n")
+        else:
+            f.write("]}")
+
+    def encodeChunks(self,features,decimal_places,separator,processes,chunk_size):
+        features = iter(features)
+        if not processes or processes <= 1:
+            for (kind,properties,coordinates) in features:
+                yield GeojsonWriter.encodeFeature(kind,properties,coordinates,decimal_places)
+            return
+        # keep a bounded number of chunks in flight so that memory use does not depend on the input size
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            pending = deque()
+            while True:
+                chunk = list(islice(features,chunk_size))
+                if chunk:
+                    pending.append(executor.submit(GeojsonWriter.encodeChunk,chunk,decimal_places,separator))
+                if pending and (not chunk or len(pending) >= 2*processes):
+                    text = pending.popleft().result()
+                    if text:
+                        yield text
+                if not chunk and not pending:
+                    break
+
+    @staticmethod
+    def encodeChunk(chunk,decimal_places,separator):
+        return separator.join(GeojsonWriter.encodeFeature(kind,properties,coordinates,decimal_places)
+                              for (kind,properties,coordinates) in chunk)
+
+    @staticmethod
+    def encodeFeature(kind,properties,coordinates,decimal_places):
+        def encodePoints(points):
+            if isinstance(points,Coordinates):
+                values = points.getValues()
+                dimension = points.getDimension()
+            else:
+                values = [value for point in points for value in point[:2]]
+                dimension = 2
+            if not len(values):
+                return "[]"
+            numbers = iter(GeojsonWriter.encodeNumbers(values,decimal_places))
+            return "[[" + "], [".join(map(", ".join,zip(*[numbers]*dimension))) + "]]"
+
+        if kind == "point":
+            encoded = encodePoints(coordinates)
+        elif kind == "line":
+            encoded = "[" + ", ".join(encodePoints(line) for line in coordinates) + "]"
+        else:
+            encoded = "[" + ", ".join("[" + ", ".join(encodePoints(ring) for ring in poly) + "]" for poly in coordinates) + "]"
+        return '{"type": "Feature", "properties": ' + json.dumps(properties) \
+            + ', "geometry": {"type": "' + GeojsonWriter.GEOMETRY_TYPES[kind] + '", "coordinates": ' + encoded + '}}'
+
+    @staticmethod
+    def encodeNumbers(values,decimal_places):
+        # encode numbers as the json module would, rounding only where the representation
+        # has more than the requested number of decimal places
+        try:
+            reprs = list(map(float.__repr__,values))
+        except TypeError:
+            # not all values are floats
+            return [GeojsonWriter.encodeNumber(value,decimal_places) for value in values]
+        if decimal_places is None:
+            return [s if "n" not in s else GeojsonWriter.encodeNumber(v,None) for (s,v) in zip(reprs,values)]
+        limit = decimal_places+1
+        round_format = ("%%.%df" % decimal_places).__mod__
+        return [(round_format(v) if len(s)-s.find(".") > limit else s)
+                if "e" not in s and "n" not in s else GeojsonWriter.encodeNumber(v,decimal_places)
+                for (s,v) in zip(reprs,values)]
+
+    @staticmethod
+    def encodeNumber(value,decimal_places):
+        if not isinstance(value,float) or not math.isfinite(value):
+            return json.dumps(value)
+        s = float.__repr__(value)
+        if decimal_places is None:
+            return s
+        (mantissa,e,exponent) = s.partition("e")
+        dot = mantissa.find(".")
+        if dot >= 0 and len(mantissa)-dot-1 > decimal_places:
+            return ("%%.%df" % decimal_places) % float(mantissa)+e+exponent
+        return s
+
+    @staticmethod
+    def flatten(kind,coordinates):
+        if kind == "point":
+            return [(lon,lat) for (lon,lat) in coordinates]
+        elif kind == "line":
+            return [(lon,lat) for l1 in coordinates for (lon,lat) in l1]
+        else:
+            return [(lon,lat) for l1 in coordinates for l2 in l1 for (lon,lat) in l2]
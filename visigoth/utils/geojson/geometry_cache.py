@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+#    visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without 
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or 
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import os
+import os.path
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import tempfile
+from array import array
+
+from visigoth.utils.geojson.coordinates import Coordinates
+
+class GeometryCache(object):
+
+    """
+    An on-disk cache of geometry extracted from vector files.
+
+    Notes:
+        Each cache file holds a JSON table of the properties and structure of each geometry, an array of offsets
+        and a single packed array of float64 coordinate values.  Cache files are memory mapped when loaded so that the
+        coordinates are not copied and pages are shared between processes rendering from the same file.
+        Cache files are keyed by the source file's path, modification time and size, and the options used to read it.
+        Storing geometry removes any entries for the same path and options made from an earlier version of the file.
+    """
+
+    cache_dir = os.path.join(tempfile.gettempdir(),"visigoth_geometry_cache")
+
+    MAGIC = b"VGGC"
+    VERSION = 1
+    # magic, version, byte order, padding, table length, offset count, value count
+    HEADER = struct.Struct("=4sI2s6xQQQ")
+
+    @staticmethod
+    def configureCacheDirectory(cache_dir):
+        GeometryCache.cache_dir = cache_dir
+
+    @staticmethod
+    def getCachePrefix(path,options):
+        # cache file names start with a digest of the path and options, shared by all versions of the file
+        key = json.dumps([os.path.abspath(path),options])
+        return hashlib.md5(key.encode("utf-8")).hexdigest()+"_"
+
+    @staticmethod
+    def getCachePath(path,options):
+        st = os.stat(path)
+        key = json.dumps([st.st_mtime_ns,st.st_size,GeometryCache.VERSION])
+        return os.path.join(GeometryCache.cache_dir,GeometryCache.getCachePrefix(path,options)+hashlib.md5(key.encode("utf-8")).hexdigest()+".geom")
+
+    @staticmethod
+    def load(path,options):
+        """
+        Load geometry for a source file from the cache
+
+        Arguments:
+            path (str): path to the source file
+            options: JSON serialisable value describing the options used to read the file
+
+        Returns:
+            (points,lines,polys) tuple in the format returned by GeojsonReader.extract or None if not cached
+        """
+        try:
+            cache_path = GeometryCache.getCachePath(path,options)
+            if not os.path.exists(cache_path):
+                return None
+            with open(cache_path,"rb") as f:
+                mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            view = memoryview(mm)
+            (magic,version,byteorder,table_len,nr_offsets,nr_values) = GeometryCache.HEADER.unpack_from(view)
+            if magic != GeometryCache.MAGIC or version != GeometryCache.VERSION or byteorder != sys.byteorder[0:2].encode("ascii"):
+                return None
+            pos = GeometryCache.HEADER.size
+            if pos+GeometryCache.pad(table_len)+8*nr_offsets+8*nr_values != len(view):
+                # truncated or otherwise corrupt
+                return None
+            table = json.loads(bytes(view[pos:pos+table_len]).decode("utf-8"))
+            pos += GeometryCache.pad(table_len)
+            offsets = view[pos:pos+8*nr_offsets].cast("q")
+            pos += 8*nr_offsets
+            values = view[pos:pos+8*nr_values].cast("d")
+        except (OSError,ValueError,struct.error):
+            return None
+
+        def ring(index):
+            return Coordinates(values[offsets[index]:offsets[index+1]])
+
+        points = []
+        lines = []
+        polys = []
+        for (kind,props,structure) in table:
+            if kind == "point":
+                points.append((props,ring(structure)))
+            elif kind == "line":
+                lines.append((props,[ring(index) for index in structure]))
+            else:
+                polys.append((props,[[ring(index) for index in poly] for poly in structure]))
+        return (points,lines,polys)
+
+    @staticmethod
+    def store(path,options,extracted):
+        """
+        Store geometry for a source file in the cache
+
+        Arguments:
+            path (str): path to the source file
+            options: JSON serialisable value describing the options used to read the file
+            extracted (tuple): (points,lines,polys) tuple in the format returned by GeojsonReader.extract
+        """
+        (points,lines,polys) = extracted
+        values = array("d")
+        offsets = array("q",[0])
+
+        def add(coordinates):
+            if isinstance(coordinates,Coordinates) and coordinates.getDimension() == 2:
+                values.extend(coordinates.getValues())
+            else:
+                for (lon,lat) in coordinates:
+                    values.append(lon)
+                    values.append(lat)
+            offsets.append(len(values))
+            return len(offsets)-2
+
+        table = []
+        for (props,coordinates) in points:
+            table.append(("point",props,add(coordinates)))
+        for (props,coordinates) in lines:
+            table.append(("line",props,[add(line) for line in coordinates]))
+        for (props,coordinates) in polys:
+            table.append(("polygon",props,[[add(ring) for ring in poly] for poly in coordinates]))
+
+        try:
+            table_bytes = json.dumps(table).encode("utf-8")
+        except (TypeError,ValueError):
+            # properties which cannot be stored as JSON, do not cache
+            return
+
+        if not os.path.exists(GeometryCache.cache_dir):
+            os.makedirs(GeometryCache.cache_dir,exist_ok=True)
+        cache_path = GeometryCache.getCachePath(path,options)
+        # write to a temporary file then rename, so that readers never see a partially written file
+        (fd,tmp_path) = tempfile.mkstemp(dir=GeometryCache.cache_dir,suffix=".tmp")
+        try:
+            with os.fdopen(fd,"wb") as f:
+                f.write(GeometryCache.HEADER.pack(GeometryCache.MAGIC,GeometryCache.VERSION,sys.byteorder[0:2].encode("ascii"),
+                                                  len(table_bytes),len(offsets),len(values)))
+                f.write(table_bytes)
+                f.write(b"\0"*(GeometryCache.pad(len(table_bytes))-len(table_bytes)))
+                f.write(offsets.tobytes())
+                f.write(values.tobytes())
+            os.replace(tmp_path,cache_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        # remove entries for earlier versions of the source file
+        prefix = GeometryCache.getCachePrefix(path,options)
+        for name in os.listdir(GeometryCache.cache_dir):
+            if name.startswith(prefix) and name.endswith(".geom") and name != os.path.basename(cache_path):
+                try:
+                    os.remove(os.path.join(GeometryCache.cache_dir,name))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def pad(length):
+        # round up to a multiple of 8 bytes, keeping the arrays that follow aligned
+        return (length+7)//8*8
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from visigoth.utils.geometry.geometry import Geometry
+from visigoth.utils.geometry.packed_features import PackedFeatures
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+#    Visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+class Geometry(object):
+    """
+    Simplify and clip lines and polygon rings expressed as lists of (x,y) tuples, typically in pixel coordinates
+    """
+
+    @staticmethod
+    def simplify(points,tolerance,closed=False):
+        """
+        Simplify a line or ring using the Douglas-Peucker algorithm
+
+        Arguments:
+            points (list): list of (x,y) tuples
+            tolerance (float): remove vertices that lie closer than this distance to the simplified shape
+
+        Keyword Arguments:
+            closed (bool): treat the points as a closed ring, the result retains at least 3 vertices
+
+        Returns:
+            list of (x,y) tuples, a subset of the input points.  A repeated closing point is removed from rings.
+        """
+        points = list(points)
+        if closed and len(points) > 1 and points[0] == points[-1]:
+            points = points[:-1]
+        n = len(points)
+        if n < 3 or (closed and n <= 3):
+            return points
+        tolerance_sq = tolerance*tolerance
+        if not closed:
+            keep = [False]*n
+            keep[0] = keep[-1] = True
+            Geometry.markVertices(points,0,n-1,tolerance_sq,keep)
+            return [points[i] for i in range(n) if keep[i]]
+
+        # split the ring at the vertex furthest from the first vertex and simplify both halves
+        (x0,y0) = points[0]
+        split = max(range(1,n),key=lambda i:(points[i][0]-x0)**2+(points[i][1]-y0)**2)
+        ring = points + [points[0]]
+        keep = [False]*(n+1)
+        keep[0] = keep[split] = keep[n] = True
+        Geometry.markVertices(ring,0,split,tolerance_sq,keep)
+        Geometry.markVertices(ring,split,n,tolerance_sq,keep)
+        if keep.count(True) < 4:
+            # keep a third vertex so that the ring does not collapse to a line
+            (index,_) = max(Geometry.furthest(ring,0,split),Geometry.furthest(ring,split,n),key=lambda f:f[1])
+            keep[index] = True
+        return [points[i] for i in range(n) if keep[i]]
+
+    @staticmethod
+    def furthest(points,first,last):
+        # find the vertex between first and last furthest from the segment joining them,
+        # returning its index and squared distance
+        (ax,ay) = points[first]
+        (bx,by) = points[last]
+        dx = bx-ax
+        dy = by-ay
+        length_sq = dx*dx+dy*dy
+        max_index = -1
+        max_dist_sq = -1
+        for i in range(first+1,last):
+            (px,py) = points[i]
+            if length_sq:
+                t = ((px-ax)*dx+(py-ay)*dy)/length_sq
+                if t < 0:
+                    t = 0
+                elif t > 1:
+                    t = 1
+                ex = ax+t*dx-px
+                ey = ay+t*dy-py
+            else:
+                ex = ax-px
+                ey = ay-py
+            dist_sq = ex*ex+ey*ey
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                max_index = i
+        return (max_index,max_dist_sq)
+
+    @staticmethod
+    def markVertices(points,first,last,tolerance_sq,keep):
+        # Douglas-Peucker, using an explicit stack to avoid deep recursion on long lines
+        stack = [(first,last)]
+        while stack:
+            (first,last) = stack.pop()
+            if last - first < 2:
+                continue
+            (index,dist_sq) = Geometry.furthest(points,first,last)
+            if dist_sq > tolerance_sq:
+                keep[index] = True
+                stack.append((first,index))
+                stack.append((index,last))
+
+    @staticmethod
+    def clipPolygon(points,x_min,y_min,x_max,y_max):
+        """
+        Clip a polygon ring to a rectangle using the Sutherland-Hodgman algorithm
+
+        Arguments:
+            points (list): list of (x,y) tuples describing the ring
+            x_min (float): the left edge of the rectangle
+            y_min (float): the top edge of the rectangle
+            x_max (float): the right edge of the rectangle
+            y_max (float): the bottom edge of the rectangle
+
+        Returns:
+            list of (x,y) tuples describing the clipped ring, empty if the ring lies outside the rectangle
+        """
+        if not points:
+            return []
+        xs = [x for (x,_) in points]
+        ys = [y for (_,y) in points]
+        (ring_x_min,ring_x_max,ring_y_min,ring_y_max) = (min(xs),max(xs),min(ys),max(ys))
+        if ring_x_min >= x_min and ring_x_max <= x_max and ring_y_min >= y_min and ring_y_max <= y_max:
+            return list(points)
+        if ring_x_max < x_min or ring_x_min > x_max or ring_y_max < y_min or ring_y_min > y_max:
+            return []
+
+        output = list(points)
+        for (axis,bound,is_min) in [(0,x_min,True),(0,x_max,False),(1,y_min,True),(1,y_max,False)]:
+            if not output:
+                break
+            ring = output
+            output = []
+            prev = ring[-1]
+            prev_inside = prev[axis] >= bound if is_min else prev[axis] <= bound
+            for cur in ring:
+                cur_inside = cur[axis] >= bound if is_min else cur[axis] <= bound
+                if cur_inside != prev_inside:
+                    output.append(Geometry.intersect(prev,cur,axis,bound))
+                if cur_inside:
+                    output.append(cur)
+                prev = cur
+                prev_inside = cur_inside
+        return output
+
+    @staticmethod
+    def intersect(p0,p1,axis,bound):
+        # find where the segment p0-p1 crosses the line where the coordinate on axis equals bound
+        t = (bound-p0[axis])/(p1[axis]-p0[axis])
+        if axis == 0:
+            return (bound,p0[1]+t*(p1[1]-p0[1]))
+        else:
+            return (p0[0]+t*(p1[0]-p0[0]),bound)
+
+    @staticmethod
+    def clipLine(points,x_min,y_min,x_max,y_max):
+        """
+        Clip a line to a rectangle using the Liang-Barsky algorithm
+
+        Arguments:
+            points (list): list of (x,y) tuples describing the line
+            x_min (float): the left edge of the rectangle
+            y_min (float): the top edge of the rectangle
+            x_max (float): the right edge of the rectangle
+            y_max (float): the bottom edge of the rectangle
+
+        Returns:
+            list of lines (each a list of (x,y) tuples) formed by the parts of the line inside the rectangle
+        """
+        if not points:
+            return []
+        xs = [x for (x,_) in points]
+        ys = [y for (_,y) in points]
+        if min(xs) >= x_min and max(xs) <= x_max and min(ys) >= y_min and max(ys) <= y_max:
+            return [list(points)]
+
+        lines = []
+        current = None
+        for i in range(len(points)-1):
+            (x0,y0) = points[i]
+            (x1,y1) = points[i+1]
+            dx = x1-x0
+            dy = y1-y0
+            t0 = 0.0
+            t1 = 1.0
+            for (p,q) in [(-dx,x0-x_min),(dx,x_max-x0),(-dy,y0-y_min),(dy,y_max-y0)]:
+                if p == 0:
+                    if q < 0:
+                        # parallel to and outside this edge
+                        t0 = 1.0
+                        t1 = 0.0
+                        break
+                else:
+                    r = q/p
+                    if p < 0:
+                        if r > t0:
+                            t0 = r
+                    elif r < t1:
+                        t1 = r
+            if t0 >= t1:
+                # outside the rectangle, or only touching its boundary at a single point
+                current = None
+                continue
+            start = points[i] if t0 == 0 else (x0+t0*dx,y0+t0*dy)
+            end = points[i+1] if t1 == 1 else (x0+t1*dx,y0+t1*dy)
+            if current is None or t0 > 0:
+                current = [start]
+                lines.append(current)
+            if end != current[-1]:
+                current.append(end)
+            if t1 < 1:
+                current = None
+        return [line for line in lines if len(line) > 1]
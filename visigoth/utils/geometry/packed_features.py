@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+#    Visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import base64
+import math
+
+class PackedFeatures(object):
+    """
+    Pack the geometry of lines and polygons into a compact block of data with a spatial index, for decoding in the browser
+
+    Arguments:
+        x (float): the x coordinate of the top left corner of the area containing the features
+        y (float): the y coordinate of the top left corner of the area containing the features
+        width (float): the width of the area
+        height (float): the height of the area
+
+    Keyword Arguments:
+        depth (int): the number of levels in the spatial index below the root
+        precision (int): coordinates are rounded to 1/precision
+
+    Notes:
+        Coordinates are rounded to integers, relative to (x,y), and stored as varints in a base64 string.  For each
+        feature the data holds a header value (closed + 2*number of levels of detail), the bounding box as
+        min_x, min_y, width and height, then the rings for each level of detail.  Each level holds the number of rings
+        and for each ring the number of points followed by the point coordinates, as deltas from the previous point
+        (starting from the bounding box corner).  Signed values are zigzag encoded, mapping 0,-1,1,-2... to 0,1,2,3...
+
+        The spatial index is a loose quadtree.  At level k of the index the area is divided into 2^k x 2^k cells, and
+        each feature is assigned to the deepest level where its bounding box fits inside a cell.  It is stored in the
+        cell containing the top left corner of its bounding box, so it lies within a 2 x 2 block of cells from there.
+        Features that do not fit in a cell at level 1 are kept in a root list.
+    """
+
+    def __init__(self,x,y,width,height,depth=4,precision=100):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.precision = precision
+        self.data = bytearray()
+        self.ids = []
+        self.stroke_widths = []
+        self.index = {}
+        self.root = []
+
+    def add(self,feature_id,closed,stroke_width,levels):
+        """
+        Add a feature
+
+        Arguments:
+            feature_id (str): the id of the SVG element that displays the feature
+            closed (bool): True if the rings are closed (polygons), False for lines
+            stroke_width (float): the stroke width of the feature at zoom level 1
+            levels (list): a list of rings for each level of detail, where each ring is a list of (x,y) points
+        """
+        precision = self.precision
+        x0 = self.x
+        y0 = self.y
+        levels = [[[(round((x-x0)*precision),round((y-y0)*precision)) for (x,y) in ring] for ring in rings] for rings in levels]
+        xs = [x for rings in levels for ring in rings for (x,_) in ring]
+        ys = [y for rings in levels for ring in rings for (_,y) in ring]
+        if not xs:
+            return
+        # allow for the stroke extending beyond the geometry when indexing
+        pad = math.ceil((stroke_width or 0)*precision/2)
+        bbox = (min(xs)-pad,min(ys)-pad,max(xs)+pad,max(ys)+pad)
+
+        data = self.data
+        PackedFeatures.encodeValue(data,(1 if closed else 0)+2*len(levels))
+        PackedFeatures.encodeSigned(data,bbox[0])
+        PackedFeatures.encodeSigned(data,bbox[1])
+        PackedFeatures.encodeValue(data,bbox[2]-bbox[0])
+        PackedFeatures.encodeValue(data,bbox[3]-bbox[1])
+        for rings in levels:
+            self.encodeRings(rings,bbox[0],bbox[1])
+
+        self.indexFeature(len(self.ids),[v/precision for v in bbox])
+        self.ids.append(feature_id)
+        self.stroke_widths.append(stroke_width)
+
+    def indexFeature(self,feature_index,bbox):
+        (min_x,min_y,max_x,max_y) = bbox
+        w = max_x - min_x
+        h = max_y - min_y
+        for level in range(self.depth,0,-1):
+            cw = self.width/2**level
+            ch = self.height/2**level
+            if w <= cw and h <= ch:
+                key = "%d,%d,%d"%(level,math.floor(min_x/cw),math.floor(min_y/ch))
+                if key not in self.index:
+                    self.index[key] = []
+                self.index[key].append(feature_index)
+                return
+        self.root.append(feature_index)
+
+    def encodeRings(self,rings,last_x,last_y):
+        data = self.data
+        PackedFeatures.encodeValue(data,len(rings))
+        for ring in rings:
+            PackedFeatures.encodeValue(data,len(ring))
+            for (ix,iy) in ring:
+                for delta in (ix-last_x,iy-last_y):
+                    value = delta*2 if delta >= 0 else -delta*2-1
+                    if value < 128:
+                        data.append(value)
+                    else:
+                        PackedFeatures.encodeValue(data,value)
+                last_x = ix
+                last_y = iy
+
+    @staticmethod
+    def encodeSigned(data,value):
+        PackedFeatures.encodeValue(data,value*2 if value >= 0 else -value*2-1)
+
+    @staticmethod
+    def encodeValue(data,value):
+        # append an unsigned integer as a varint, 7 bits per byte with the high bit set on all but the last byte
+        while value > 127:
+            data.append((value & 127) | 128)
+            value >>= 7
+        data.append(value)
+
+    def getConfig(self):
+        """
+        Get the packed features as a JSON serialisable dict
+
+        Returns:
+            dict with keys "x","y","width","height","depth","precision","data","ids","stroke_widths","index" and "root"
+
+        Notes:
+            Features are referred to by their position in the ids list.  Index cells are keyed by "level,column,row".
+        """
+        return {
+            "x":self.x,
+            "y":self.y,
+            "width":self.width,
+            "height":self.height,
+            "depth":self.depth,
+            "precision":self.precision,
+            "data":str(base64.b64encode(self.data),"utf-8"),
+            "ids":self.ids,
+            "stroke_widths":self.stroke_widths,
+            "index":self.index,
+            "root":self.root
+        }
@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
-from visigoth.utils.httpcache.httpcache import HttpCache
\ No newline at end of file
+from visigoth.utils.httpcache.httpcache import HttpCache
+from visigoth.utils.httpcache.connection_pool import ConnectionPool
\ No newline at end of file
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+#    Visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without 
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or 
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import http.client
+import socket
+import sys
+import threading
+import urllib.parse
+import urllib.request
+from urllib.error import HTTPError
+
+class ConnectionPool(object):
+    """
+    Keep-alive HTTP/HTTPS connections, pooled by scheme, host and port (and SSL context for HTTPS)
+
+    Keyword Arguments:
+        max_idle_per_host (int): the maximum number of idle connections kept open for each host
+
+    Notes:
+        redirects are followed.  Requests for URLs which are not http or https, or which should be routed
+        through a proxy (according to the environment), are passed to urllib instead.
+    """
+
+    user_agent = "Python-urllib/%d.%d" % sys.version_info[:2]
+    redirect_codes = (301,302,303,307,308)
+    max_redirects = 10
+
+    def __init__(self,max_idle_per_host=8):
+        self.max_idle_per_host = max_idle_per_host
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.proxies = urllib.request.getproxies()
+
+    def close(self):
+        """
+        Close all idle connections
+        """
+        with self.lock:
+            idle = self.idle
+            self.idle = {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def acquire(self,key,timeout,context):
+        with self.lock:
+            connections = self.idle.get(key,[])
+            conn = connections.pop() if connections else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(None if timeout is socket._GLOBAL_DEFAULT_TIMEOUT else timeout)
+            return (conn,True)
+        (scheme,host,port,_) = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host,port,timeout=timeout,context=context)
+        else:
+            conn = http.client.HTTPConnection(host,port,timeout=timeout)
+        return (conn,False)
+
+    @staticmethod
+    def getPoolKey(url,context):
+        # an https connection is only reused for requests using the SSL context it was opened with
+        # (the pooled connection references the context, so its id cannot be reused by another context)
+        parts = urllib.parse.urlsplit(url)
+        return (parts.scheme,parts.hostname,parts.port,id(context) if parts.scheme == "https" else None)
+
+    def release(self,key,conn):
+        with self.lock:
+            connections = self.idle.setdefault(key,[])
+            if len(connections) < self.max_idle_per_host:
+                connections.append(conn)
+                return
+        conn.close()
+
+    def isProxied(self,url):
+        scheme = urllib.parse.urlsplit(url).scheme
+        return scheme in self.proxies and not urllib.request.proxy_bypass(urllib.parse.urlsplit(url).hostname or "")
+
+    def request(self,url,data=None,headers={},timeout=None,context=None,progress=None):
+        """
+        Make a request (POST if data is supplied, otherwise GET) and read the response
+
+        Arguments:
+            url (str): the URL to request
+
+        Keyword Arguments:
+            data (bytes): data to POST
+            headers (dict): request headers
+            timeout (float): timeout in seconds
+            context (ssl.SSLContext): SSL context for https connections
+            progress (function): called with (bytes read, content length or 0) as the response is read
+
+        Returns:
+            (content,response headers) tuple
+
+        Raises:
+            urllib.error.HTTPError for responses with status 300 or above which are not redirects
+        """
+        if timeout is None:
+            timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+        if urllib.parse.urlsplit(url).scheme not in ("http","https") or self.isProxied(url):
+            return self.requestUrllib(url,data,headers,timeout,context,progress)
+        for _ in range(ConnectionPool.max_redirects+1):
+            (status,reason,response_headers,content) = self.requestOnce(url,data,headers,timeout,context,progress)
+            if status in ConnectionPool.redirect_codes and "Location" in response_headers:
+                url = urllib.parse.urljoin(url,response_headers["Location"])
+                if status == 303 or (status in (301,302) and data is not None):
+                    data = None
+                continue
+            if status >= 300:
+                raise HTTPError(url,status,reason,response_headers,None)
+            return (content,response_headers)
+        raise HTTPError(url,status,"Too many redirects",response_headers,None)
+
+    def requestOnce(self,url,data,headers,timeout,context,progress):
+        parts = urllib.parse.urlsplit(url)
+        key = ConnectionPool.getPoolKey(url,context)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?"+parts.query
+        request_headers = {"User-Agent":ConnectionPool.user_agent}
+        if data is not None:
+            request_headers["Content-Type"] = "application/x-www-form-urlencoded"
+        request_headers.update(headers)
+        method = "POST" if data is not None else "GET"
+
+        while True:
+            (conn,reused) = self.acquire(key,timeout,context)
+            try:
+                conn.request(method,path,body=data,headers=request_headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected,ConnectionResetError,BrokenPipeError) as ex:
+                conn.close()
+                if reused:
+                    # the server closed an idle connection, try again with a new connection
+                    continue
+                raise ex
+            except Exception as ex:
+                conn.close()
+                raise ex
+            break
+
+        try:
+            length = int(response.getheader("Content-Length","0") or "0")
+            if progress is None:
+                content = response.read()
+            else:
+                blocks = []
+                nbytes = 0
+                while True:
+                    block = response.read(65536)
+                    if not block:
+                        break
+                    blocks.append(block)
+                    nbytes += len(block)
+                    progress(nbytes,length)
+                content = b"".join(blocks)
+        except Exception as ex:
+            conn.close()
+            raise ex
+
+        if response.will_close:
+            conn.close()
+        else:
+            self.release(key,conn)
+        return (response.status,response.reason,response.headers,content)
+
+    def requestUrllib(self,url,data,headers,timeout,context,progress):
+        request = urllib.request.Request(url,data=data,headers=headers)
+        with urllib.request.urlopen(request,timeout=timeout,context=context) as u:
+            length = int(u.headers.get("Content-Length","0") or "0")
+            blocks = []
+            nbytes = 0
+            while True:
+                block = u.read(65536)
+                if not block:
+                    break
+                blocks.append(block)
+                nbytes += len(block)
+                if progress is not None:
+                    progress(nbytes,length)
+            return (b"".join(blocks),u.headers)
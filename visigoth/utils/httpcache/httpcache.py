@@ -18,16 +18,25 @@
 #   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 #   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-from urllib import request
 import urllib.parse
+import urllib.request
+from urllib.error import HTTPError
 import os
+import os.path
 import json
 import sys
 import tempfile
-import os.path
-
+import time
+import threading
 import hashlib
 import ssl
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 ctx = ssl.create_default_context()
 try:
@@ -36,45 +45,174 @@ except:
     pass
 
 from visigoth.utils.term.progress import Progress
+from visigoth.utils.httpcache.connection_pool import ConnectionPool
 
 class HttpCache(object):
 
     cache_dir = os.path.join(tempfile.gettempdir(),"visigothis_cache")
 
+    # limits for the disk and memory tiers of the cache, see configureCache
+    max_size = 1024*1024*1024
+    memory_max_size = 64*1024*1024
+    ttl = None
+
+    # defaults for concurrent fetching, see fetchAll
+    max_workers = 8
+    max_workers_per_host = 4
+    retries = 2
+    timeout = 30
+
+    # memory tier, mapping from cache path to (content,expiry time) in least to most recently used order
+    memory_cache = OrderedDict()
+    memory_size = 0
+    memory_lock = threading.Lock()
+
+    # running total of the size of the disk tier in bytes, None until the cache directory is first scanned
+    disk_size = None
+    disk_lock = threading.Lock()
+
+    stats = {"memory_hits":0,"disk_hits":0,"misses":0,"revalidations":0,"evictions":0,"bytes_downloaded":0}
+    stats_lock = threading.Lock()
+
+    # keep-alive connections shared by all downloads
+    pool = ConnectionPool(max_idle_per_host=max_workers_per_host)
+
     @staticmethod
     def configureCacheDirectory(cache_dir):
         HttpCache.cache_dir = cache_dir
+        with HttpCache.disk_lock:
+            HttpCache.disk_size = None
+        HttpCache.clearMemory()
 
     @staticmethod
-    def meteredFetch(label,url,path,data=None):
-        p = Progress("Downloading")
-        def hook(a,b,c):
-            progress_frac = a*b / c
-            p.report("",progress_frac)
-        try:
-            urllib.request.urlretrieve(url,path,hook,data)
-            sys.stdout.write("\n")
-        except Exception as ex:
-            if str(ex).find("signature type") > 0:
-                p.report("", 0.0)
-                with urllib.request.urlopen(url, None, context=ctx) as u:
-                    response = u.read()
-                    with open(path, "wb") as fout:
-                        fout.write(response)
-                p.report("", 1.0)
-                sys.stdout.write("\n")
-            else:
-                raise ex
+    def configureCache(max_size=1024*1024*1024,memory_max_size=64*1024*1024,ttl=None):
+        """
+        Configure the limits of the cache
+
+        Keyword Arguments:
+            max_size (int): the maximum size of the cache directory in bytes, or None for no limit
+            memory_max_size (int): the maximum size of the in-memory cache in bytes, or 0 to disable it
+            ttl (float): the time in seconds for which fetched content is used without revalidation, or None to never expire
+
+        Notes:
+            when the cache directory exceeds max_size, least recently used entries are evicted until it is
+            back under 90% of max_size.  Expired entries are revalidated with the server using their ETag or
+            Last-Modified headers where available and otherwise downloaded again.  The ttl applies to entries
+            fetched after this call.
+        """
+        HttpCache.max_size = max_size
+        HttpCache.memory_max_size = memory_max_size
+        HttpCache.ttl = ttl
+        with HttpCache.memory_lock:
+            HttpCache.trimMemory()
+
+    @staticmethod
+    def configureConcurrency(max_workers=8,max_workers_per_host=4,retries=2,timeout=30):
+        HttpCache.max_workers = max_workers
+        HttpCache.max_workers_per_host = max_workers_per_host
+        HttpCache.retries = retries
+        HttpCache.timeout = timeout
+        HttpCache.pool.max_idle_per_host = max_workers_per_host
+
+    @staticmethod
+    def getStats():
+        """
+        Get statistics on the use of the cache by this process
+
+        Returns:
+            dict with keys memory_hits, disk_hits, misses, revalidations, evictions, bytes_downloaded,
+            memory_size (bytes held in the memory tier) and disk_size (estimated size of the cache directory in bytes,
+            or None if not yet known)
+        """
+        with HttpCache.stats_lock:
+            stats = dict(HttpCache.stats)
+        stats["memory_size"] = HttpCache.memory_size
+        stats["disk_size"] = HttpCache.disk_size
+        return stats
+
+    @staticmethod
+    def resetStats():
+        with HttpCache.stats_lock:
+            for key in HttpCache.stats:
+                HttpCache.stats[key] = 0
+
+    @staticmethod
+    def count(key,n=1):
+        with HttpCache.stats_lock:
+            HttpCache.stats[key] += n
+
+    @staticmethod
+    def clearMemory():
+        with HttpCache.memory_lock:
+            HttpCache.memory_cache.clear()
+            HttpCache.memory_size = 0
+
+    @staticmethod
+    def getMemory(cachepath,now):
+        with HttpCache.memory_lock:
+            entry = HttpCache.memory_cache.get(cachepath)
+            if entry is None:
+                return None
+            (content,expires) = entry
+            if expires is not None and now >= expires:
+                del HttpCache.memory_cache[cachepath]
+                HttpCache.memory_size -= len(content)
+                return None
+            HttpCache.memory_cache.move_to_end(cachepath)
+            return content
+
+    @staticmethod
+    def putMemory(cachepath,content,expires):
+        if len(content) > HttpCache.memory_max_size:
+            return
+        with HttpCache.memory_lock:
+            old = HttpCache.memory_cache.pop(cachepath,None)
+            if old is not None:
+                HttpCache.memory_size -= len(old[0])
+            HttpCache.memory_cache[cachepath] = (content,expires)
+            HttpCache.memory_size += len(content)
+            HttpCache.trimMemory()
+
+    @staticmethod
+    def trimMemory():
+        # evict least recently used entries from the memory tier, the caller must hold memory_lock
+        while HttpCache.memory_cache and HttpCache.memory_size > HttpCache.memory_max_size:
+            (_,(content,_)) = HttpCache.memory_cache.popitem(last=False)
+            HttpCache.memory_size -= len(content)
+
+    @staticmethod
+    def acquireLock(name,blocking=True):
+        # lock a file in the cache directory, serialising access between threads and processes
+        # returns the open lock file, or None if blocking is False and the lock is held elsewhere
+        f = open(os.path.join(HttpCache.cache_dir,".lock."+name),"a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(f,fcntl.LOCK_EX if blocking else fcntl.LOCK_EX|fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                return None
+        return f
+
+    @staticmethod
+    def releaseLock(f):
+        if fcntl is not None:
+            fcntl.flock(f,fcntl.LOCK_UN)
+        f.close()
 
+    @staticmethod
+    def getLockName(cachepath):
+        # entries share one of 256 lock files according to the first two digits of their digest
+        return os.path.basename(cachepath)[:2]
 
     @staticmethod
-    def fetch(url,data=None,mimeType='application/json',suffix="",returnPath=False):
+    def getCachePath(url,data=None,mimeType='application/json',suffix=""):
         cachepath = url.replace("/","_")
         cachepath = cachepath.replace(":","_")
         cachepath = cachepath.replace("?","_")
         cachepath = cachepath.replace("&","_")
         cachepath = cachepath.replace("=","_")
 
+        enc_data = None
         if data:
             if mimeType == 'application/json':
                 enc_data = json.dumps(data).encode("ascii")
@@ -83,28 +221,333 @@ class HttpCache(object):
             hash_object = hashlib.md5(enc_data)
             cachepath += "."+hash_object.hexdigest()
 
-        if not os.path.exists(HttpCache.cache_dir):
-            os.mkdir(HttpCache.cache_dir)
-
         cachekey_digest = hashlib.md5(bytes(cachepath,"utf-8")).hexdigest()
         cachepath = os.path.join(HttpCache.cache_dir,cachekey_digest)
 
         if suffix:
             cachepath += suffix
+        return (cachepath,enc_data)
 
+    @staticmethod
+    def readMeta(cachepath):
+        # return the metadata for an entry, None if the entry does not exist, or an empty dict for
+        # entries without metadata (written by an earlier version), which are treated as never expiring
         if not os.path.exists(cachepath):
-            if not data:
-                HttpCache.meteredFetch("Downloading...",url,cachepath)
+            return None
+        try:
+            with open(cachepath+".meta","r") as f:
+                return json.loads(f.read())
+        except (OSError,ValueError):
+            return {}
+
+    @staticmethod
+    def isFresh(meta,now):
+        expires = meta.get("expires",None)
+        return expires is None or now < expires
+
+    @staticmethod
+    def writeTemp(content):
+        # write content to a temporary file in the cache directory, returning its path
+        (fd,tmp_path) = tempfile.mkstemp(dir=HttpCache.cache_dir,prefix=".tmp.")
+        try:
+            with os.fdopen(fd,"wb") as f:
+                f.write(content)
+        except Exception as ex:
+            os.remove(tmp_path)
+            raise ex
+        return tmp_path
+
+    @staticmethod
+    def store(cachepath,content,meta):
+        # write to temporary files without holding the entry lock, then rename them into place under the lock
+        # so that readers never observe a partially written entry.  The metadata is renamed first, so that
+        # an entry interrupted part way through is seen as missing rather than fresh
+        encoded_meta = json.dumps(meta).encode("utf-8")
+        tmp_paths = []
+        try:
+            tmp_paths.append(HttpCache.writeTemp(encoded_meta))
+            tmp_paths.append(HttpCache.writeTemp(content))
+            lock = HttpCache.acquireLock(HttpCache.getLockName(cachepath))
+            try:
+                os.replace(tmp_paths[0],cachepath+".meta")
+                os.replace(tmp_paths[1],cachepath)
+            finally:
+                HttpCache.releaseLock(lock)
+        except Exception as ex:
+            for tmp_path in tmp_paths:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise ex
+        return len(content)+len(encoded_meta)
+
+    @staticmethod
+    def retrieve(url,enc_data=None,headers={},timeout=None,metered=False):
+        # download a url, returning (content,response headers), or None if a conditional request reports
+        # that the cached content is still valid
+        try:
+            return HttpCache.request(url,enc_data,headers,timeout,metered,ctx if enc_data else None)
+        except HTTPError as ex:
+            if ex.code == 304:
+                return None
+            raise ex
+        except Exception as ex:
+            if str(ex).find("signature type") > 0:
+                return HttpCache.request(url,enc_data,headers,timeout,metered,ctx)
+            raise ex
+
+    @staticmethod
+    def request(url,enc_data,headers,timeout,metered,context):
+        progress = None
+        if metered:
+            p = Progress("Downloading")
+            def progress(nbytes,length):
+                if length:
+                    p.report("",nbytes/length)
+        (content,response_headers) = HttpCache.pool.request(url,enc_data,headers,timeout,context,progress)
+        if metered:
+            sys.stdout.write("\n")
+        HttpCache.count("bytes_downloaded",len(content))
+        return (content,response_headers)
+
+    @staticmethod
+    def updateDiskSize(nbytes):
+        with HttpCache.disk_lock:
+            if HttpCache.disk_size is None:
+                HttpCache.disk_size = sum(size for (_,size,_) in HttpCache.scan())
             else:
-                # req = urllib.request.Request(url,context=ctx)
-                # req.add_header('Content-Type', mimeType)
+                HttpCache.disk_size += nbytes
+            over = HttpCache.max_size is not None and HttpCache.disk_size > HttpCache.max_size
+        if over:
+            HttpCache.evict()
+
+    @staticmethod
+    def scan():
+        # list the entries in the cache directory as (last used time,size including metadata,path)
+        entries = []
+        for name in os.listdir(HttpCache.cache_dir):
+            if name.startswith(".") or name.endswith(".meta"):
+                continue
+            path = os.path.join(HttpCache.cache_dir,name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            size = st.st_size
+            try:
+                size += os.path.getsize(path+".meta")
+            except OSError:
+                pass
+            entries.append((st.st_mtime,size,path))
+        return entries
+
+    @staticmethod
+    def evict(target_size=None):
+        """
+        Evict least recently used entries from the cache directory
+
+        Keyword Arguments:
+            target_size (int): evict entries until the cache directory is no larger than this size in bytes (defaults to 90% of max_size)
+
+        Notes:
+            if another thread or process is already evicting entries, this call returns immediately
+        """
+        if target_size is None:
+            target_size = 0 if HttpCache.max_size is None else int(0.9*HttpCache.max_size)
+        if not os.path.exists(HttpCache.cache_dir):
+            return
+        lock = HttpCache.acquireLock("evict",blocking=False)
+        if lock is None:
+            return
+        try:
+            entries = HttpCache.scan()
+            entries.sort()
+            total = sum(size for (_,size,_) in entries)
+            for (_,size,path) in entries:
+                if total <= target_size:
+                    break
+                entry_lock = HttpCache.acquireLock(HttpCache.getLockName(path))
+                try:
+                    for remove_path in [path+".meta",path]:
+                        try:
+                            os.remove(remove_path)
+                        except OSError:
+                            pass
+                finally:
+                    HttpCache.releaseLock(entry_lock)
+                total -= size
+                HttpCache.count("evictions")
+            with HttpCache.disk_lock:
+                HttpCache.disk_size = total
+        finally:
+            HttpCache.releaseLock(lock)
+
+    @staticmethod
+    def isRetryable(ex):
+        # retry server errors, rate limiting and network failures but not other client errors (eg not found)
+        if isinstance(ex,HTTPError):
+            return ex.code >= 500 or ex.code == 429
+        return True
+
+    @staticmethod
+    def fetchAll(urls,max_workers=None,max_workers_per_host=None,retries=None,timeout=None,label="Downloading"):
+        """
+        Fetch a number of URLs concurrently, using the cache
+
+        Arguments:
+            urls (list): list of URLs to fetch
+
+        Keyword Arguments:
+            max_workers (int): the maximum number of concurrent downloads
+            max_workers_per_host (int): the maximum number of concurrent downloads from any one host
+            retries (int): the number of times to retry a failed download
+            timeout (float): timeout in seconds for each download attempt
+            label (str): label to use when reporting progress
+
+        Returns:
+            dict mapping from each URL to its content (bytes), or to None if the URL could not be fetched
+
+        Notes:
+            the defaults for the keyword arguments can be set using configureConcurrency
+        """
+        max_workers = max_workers or HttpCache.max_workers
+        max_workers_per_host = max_workers_per_host or HttpCache.max_workers_per_host
+        retries = HttpCache.retries if retries is None else retries
+        timeout = timeout or HttpCache.timeout
+
+        urls = list(dict.fromkeys(urls))
+        results = {}
+        if not urls:
+            return results
+
+        host_limits = {}
+        for url in urls:
+            host = urllib.parse.urlparse(url).netloc
+            if host not in host_limits:
+                host_limits[host] = threading.BoundedSemaphore(max_workers_per_host)
+
+        def fetchOne(url):
+            limit = host_limits[urllib.parse.urlparse(url).netloc]
+            attempt = 0
+            while True:
+                try:
+                    with limit:
+                        return HttpCache.fetch(url,timeout=timeout,metered=False)
+                except Exception as ex:
+                    if attempt >= retries or not HttpCache.isRetryable(ex):
+                        raise ex
+                    time.sleep(0.5*(2**attempt))
+                    attempt += 1
+
+        p = Progress(label)
+        with ThreadPoolExecutor(max_workers=min(max_workers,len(urls))) as executor:
+            futures = {executor.submit(fetchOne,url):url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except Exception:
+                    results[url] = None
+                p.report("",len(results)/len(urls))
+        failed = sum(1 for content in results.values() if content is None)
+        p.complete("%d fetched, %d failed" % (len(urls)-failed,failed))
+        return results
+
+    @staticmethod
+    def fetch(url,data=None,mimeType='application/json',suffix="",returnPath=False,timeout=None,metered=True,ttl=None):
+        """
+        Fetch the content of a URL, using the cache
+
+        Arguments:
+            url (str): the URL to fetch
+
+        Keyword Arguments:
+            data (object): data to POST (JSON encoded if mimeType is application/json)
+            mimeType (str): the type of data
+            suffix (str): a suffix to append to the path of the cached file
+            returnPath (bool): return the path of the cached file rather than its content
+            timeout (float): timeout in seconds for the download
+            metered (bool): report the progress of the download
+            ttl (float): the time in seconds for which the content is used without revalidation (defaults to the ttl set by configureCache)
+
+        Returns:
+            the content (bytes) or path to the cached file (str)
+        """
+        (cachepath,enc_data) = HttpCache.getCachePath(url,data,mimeType,suffix)
+        now = time.time()
+        if not returnPath:
+            content = HttpCache.getMemory(cachepath,now)
+            if content is not None:
+                HttpCache.count("memory_hits")
+                return content
+
+        if ttl is None:
+            ttl = HttpCache.ttl
+
+        os.makedirs(HttpCache.cache_dir,exist_ok=True)
+        stored_bytes = 0
+        content = None
+        # the entry lock is held only while checking and reading the cache files, not during downloads
+        lock = HttpCache.acquireLock(HttpCache.getLockName(cachepath))
+        try:
+            meta = HttpCache.readMeta(cachepath)
+            fresh = meta is not None and HttpCache.isFresh(meta,now)
+            if fresh:
+                HttpCache.count("disk_hits")
+                # the modification time records when the entry was last used
+                os.utime(cachepath)
+                if not returnPath:
+                    with open(cachepath,"rb") as f:
+                        content = f.read()
+        finally:
+            HttpCache.releaseLock(lock)
+
+        if not fresh:
+            (content,meta,stored_bytes) = HttpCache.download(url,enc_data,cachepath,meta,now,ttl,timeout,metered,returnPath)
+
+        if stored_bytes or HttpCache.disk_size is None:
+            HttpCache.updateDiskSize(stored_bytes)
 
-                with urllib.request.urlopen(url,enc_data,context=ctx) as u:
-                    response=u.read()
-                    with open(cachepath,"wb") as fout:
-                        fout.write(response)
         if returnPath:
             return cachepath
-        else:
-            with open(cachepath,"rb") as f:
-                return f.read()
+        HttpCache.putMemory(cachepath,content,meta.get("expires",None))
+        return content
+
+    @staticmethod
+    def download(url,enc_data,cachepath,meta,now,ttl,timeout,metered,returnPath):
+        # download a missing or expired entry and store it, returning (content,metadata,bytes stored)
+        headers = {}
+        if meta and not enc_data:
+            if meta.get("etag",None):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified",None):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        response = HttpCache.retrieve(url,enc_data,headers,timeout,metered)
+        expires = now+ttl if ttl is not None else None
+        if response is None:
+            # not modified, only possible in reply to a conditional request
+            meta = dict(meta,expires=expires)
+            tmp_path = HttpCache.writeTemp(json.dumps(meta).encode("utf-8"))
+            content = None
+            lock = HttpCache.acquireLock(HttpCache.getLockName(cachepath))
+            try:
+                if os.path.exists(cachepath):
+                    os.replace(tmp_path,cachepath+".meta")
+                    os.utime(cachepath)
+                    if not returnPath:
+                        with open(cachepath,"rb") as f:
+                            content = f.read()
+                    HttpCache.count("revalidations")
+                    return (content,meta,0)
+            finally:
+                HttpCache.releaseLock(lock)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            # the entry was evicted while being revalidated, download it again
+            return HttpCache.download(url,enc_data,cachepath,None,now,ttl,timeout,metered,returnPath)
+        HttpCache.count("misses")
+        (content,response_headers) = response
+        meta = {"url":url,
+                "etag":response_headers.get("ETag",None),
+                "last_modified":response_headers.get("Last-Modified",None),
+                "expires":expires}
+        return (content,meta,HttpCache.store(cachepath,content,meta))
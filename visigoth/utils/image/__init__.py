@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
-from visigoth.utils.image.png_canvas import PngCanvas
\ No newline at end of file
+from visigoth.utils.image.png_canvas import PngCanvas
+from visigoth.utils.image.png_reader import PngReader
\ No newline at end of file
@@ -25,198 +25,256 @@
 # do with it what you wish.
 #
 
+import io
+import struct
+import sys
 from zlib import crc32, compressobj
 
 
 class PngCanvas(object):
-    
-    def __init__(self,height,width,text_attributes={}):
+    """
+    An RGBA canvas which can be written as a PNG image
+
+    Arguments:
+        height (int): the height of the canvas in pixels
+        width (int): the width of the canvas in pixels
+
+    Keyword Arguments:
+        text_attributes (dict): text key/values to include in the PNG as iTXt chunks
+        compression_level (int): zlib compression level (0-9)
+        filters (tuple): the PNG filter types considered for each scanline of a truecolour image,
+            0=None, 1=Sub, 2=Up, 3=Average, 4=Paeth (Paeth is computed byte by byte and is much slower)
+        chunk_size (int): the maximum size of each IDAT chunk
+
+    Notes:
+        pixels are stored in a flat bytearray, 4 bytes (r,g,b,a) per pixel, row by row, initialised to transparent black.
+        When written, an indexed image is produced if the canvas contains at most 256 colours, otherwise
+        a truecolour image with alpha.  Compressed data is written in chunks as it is produced.
+    """
+
+    png_magic = b"\x89\x50\x4E\x47\x0D\x0A\x1A\x0A"
+
+    # maps each filtered byte to its magnitude as a signed value, used to choose the filter for each scanline
+    magnitudes = bytes(min(v,256-v) for v in range(256))
+
+    def __init__(self,height,width,text_attributes={},compression_level=9,filters=(0,1,2,3),chunk_size=65536):
         self.height = height
         self.width = width
-        self.bits = 8
-        # data format is (r,g,b,a,index), initialise to black
-        self.data = [(0,0,0,0,0) for i in range(0,width*height)]
-        self.colors=(1 << self.bits)
-        self.crc = 0
-        self.allocated_colours = []
-        self.png_magic = b"\x89\x50\x4E\x47\x0D\x0A\x1A\x0A"
-        self.compressor = compressobj(9)
-        self.buffer = None
-        self.text_attributes=text_attributes
-
-    def init_colour_manager(self,colour_manager):
-        self.plt = []
-        self.trns = []
-        for (r,g,b,t) in colour_manager:
-            self.plt.append((r<<16)|(g<<8)|b)
-            self.trns.append(t)
-        for p in range(0,256-len(colour_manager)):
-            self.plt.append(0)
-            self.trns.append(255)
-    
+        self.pixels = bytearray(width*height*4)
+        self.text_attributes = text_attributes
+        self.compression_level = compression_level
+        self.filters = filters
+        self.chunk_size = chunk_size
+
     def addpixel(self,x,y,r,g,b,a):
         """Add a pixel with a given colour (r,g,b,a) to the canvas, coordinate system is left-right (x) and top-bottom (y)"""
-        index = None
-        if self.allocated_colours is not None:
-            # we are still attempting to use colour indexes rather than RGBA
-            try:
-                # see if an existing index is allocated
-                index = self.allocated_colours.index((r,g,b,a))
-            except Exception as ex:
-                # we need a new index for this colour combination
-                index = len(self.allocated_colours)
-                self.allocated_colours.append((r,g,b,a))
-                # check if we exceed 256 indices, the maximum allowed
-                if len(self.allocated_colours) > 256:
-                    # too many, so remove the allocated colours and fall back to RGBA
-                    self.allocated_colours = None # overflow colour_manager
-                    index = None
-        self.data[x + (y * self.width)] = (r,g,b,a,index)
-        
+        offset = (x + (y * self.width))*4
+        self.pixels[offset:offset+4] = bytes((r,g,b,a))
+
     def pixel(self,x,y):
-        return self.data[x+(y*self.width)]
+        """Get the (r,g,b,a) colour of a pixel"""
+        offset = (x + (y * self.width))*4
+        return tuple(self.pixels[offset:offset+4])
+
+    def set_row(self,y,rgba,x=0):
+        """Set pixels along row y starting at column x from RGBA bytes (4 bytes per pixel)"""
+        offset = (x + (y * self.width))*4
+        if x < 0 or offset + len(rgba) > (y+1)*self.width*4:
+            raise Exception("Row data does not fit within the canvas")
+        self.pixels[offset:offset+len(rgba)] = rgba
+
+    def blit(self,x,y,width,height,rgba):
+        """Copy a rectangle of RGBA bytes (4 bytes per pixel, row by row) with top left corner at (x,y), clipped to the canvas"""
+        x0 = max(0,x)
+        x1 = min(self.width,x+width)
+        if x1 <= x0:
+            return
+        for row in range(max(0,y),min(self.height,y+height)):
+            src = ((row-y)*width+x0-x)*4
+            dst = (row*self.width+x0)*4
+            self.pixels[dst:dst+(x1-x0)*4] = rgba[src:src+(x1-x0)*4]
 
     def write(self, file):
-        if self.allocated_colours is not None:
-            self.init_colour_manager(self.allocated_colours)
-            
-        self.fd = file
+        """Write the canvas as a PNG image to a binary file object"""
+        colours = memoryview(self.pixels).cast("I")
+        distinct = set(colours)
+        if len(distinct) <= 256:
+            # view each pixel as a native integer and look up its palette index
+            palette = sorted(distinct)
+            lookup = {colour:index for (index,colour) in enumerate(palette)}
+            entries = [colour.to_bytes(4,sys.byteorder) for colour in palette]
+            width = self.width
+            rows = (bytes(map(lookup.__getitem__,colours[y*width:(y+1)*width])) for y in range(self.height))
+            PngCanvas.writeImage(file,self.width,self.height,rows,entries,self.compression_level,(0,),
+                                 self.chunk_size,self.text_attributes)
+        else:
+            row_size = self.width*4
+            rows = (self.pixels[y*row_size:(y+1)*row_size] for y in range(self.height))
+            PngCanvas.writeImage(file,self.width,self.height,rows,None,self.compression_level,self.filters,
+                                 self.chunk_size,self.text_attributes)
 
-        self.resetcrc()
+    def tobytes(self):
+        """Get the canvas as PNG content"""
+        f = io.BytesIO()
+        self.write(f)
+        return f.getvalue()
 
-        self.fd.write(self.png_magic)
+    @staticmethod
+    def writeChunk(file,name,data):
+        file.write(struct.pack(">L",len(data)))
+        file.write(name)
+        file.write(data)
+        file.write(struct.pack(">L",crc32(data,crc32(name))))
 
-        self.beginchunk(b"IHDR", 0x0d)
-        self.writelongcrc(self.width)  # width
-        self.writelongcrc(self.height)  # height
-        self.writebytecrc(self.bits)  # bit depth
-        if self.allocated_colours is not None:
-            self.writebytecrc(3)  # color type = indexed
-        else:
-            self.writebytecrc(6)  # color type = truecolor RGBA
-        self.writebytecrc(0)  # compression
-        self.writebytecrc(0)  # filter
-        self.writebytecrc(0)  # interlace
-        self.endchunk()
-
-        if self.allocated_colours is not None:
-            self.beginchunk(b"PLTE", self.colors * 3);
-            i = 0
-            while i < self.colors:
-                j = 0
-                while j < 3:
-                    self.writebytecrc((self.plt[i] >> ((2 - j) * 8)) & 0xFF)
-                    j += 1
-                i += 1
-            self.endchunk()
-
-            self.beginchunk(b"tRNS", self.colors);
-            i = 0
-            while i < self.colors:
-                self.writebytecrc(self.trns[i])
-                i += 1
-            self.endchunk()
-
-        i = 0
-        data = bytearray()
-        while i < self.height:
-            data += bytes([0])
-            k = 0
-            while k < self.width:
-                (r, g, b, a, c) = self.pixel(k, i)
-                if self.allocated_colours:
-                    data += bytes([c])
+    @staticmethod
+    def writeImage(file,width,height,rows,palette=None,compression_level=9,filters=(0,),chunk_size=65536,text_attributes={}):
+        """
+        Write a PNG image, compressing and writing scanlines as they are produced
+
+        Arguments:
+            file (file): binary file object to write to
+            width (int): image width in pixels
+            height (int): image height in pixels
+            rows (iterable): scanlines, either palette indices (1 byte per pixel) or RGBA (4 bytes per pixel)
+
+        Keyword Arguments:
+            palette (list): list of (r,g,b,a) bytes for each palette index, or None for a truecolour RGBA image
+            compression_level (int): zlib compression level (0-9)
+            filters (tuple): the PNG filter types to consider for each scanline
+            chunk_size (int): the maximum size of each IDAT chunk
+            text_attributes (dict): text key/values to include as iTXt chunks
+        """
+        file.write(PngCanvas.png_magic)
+        colour_type = 6 if palette is None else 3
+        PngCanvas.writeChunk(file,b"IHDR",struct.pack(">LLBBBBB",width,height,8,colour_type,0,0,0))
+        if palette is not None:
+            PngCanvas.writeChunk(file,b"PLTE",b"".join(entry[:3] for entry in palette))
+            PngCanvas.writeChunk(file,b"tRNS",bytes(entry[3] for entry in palette))
+
+        compressor = compressobj(compression_level)
+        pending = bytearray()
+        bpp = 4 if palette is None else 1
+        scanline_filter = PngFilter(width*bpp,bpp,filters)
+        for row in rows:
+            pending += compressor.compress(scanline_filter.filter(row))
+            while len(pending) >= chunk_size:
+                PngCanvas.writeChunk(file,b"IDAT",bytes(pending[:chunk_size]))
+                del pending[:chunk_size]
+        pending += compressor.flush()
+        for offset in range(0,len(pending),chunk_size):
+            PngCanvas.writeChunk(file,b"IDAT",bytes(pending[offset:offset+chunk_size]))
+
+        for key in text_attributes:
+            # keyword, null separator, no compression (flag and method), empty language tag and translated keyword
+            data = key.encode("utf-8") + bytes(5) + text_attributes[key].encode("utf-8")
+            PngCanvas.writeChunk(file,b"iTXt",data)
+
+        PngCanvas.writeChunk(file,b"IEND",b"")
+
+    @staticmethod
+    def encodeRGBA(width,height,pixels,compression_level=6):
+        """Encode RGBA pixels (4 bytes per pixel, row by row) as PNG content, using a palette if there are at most 256 colours"""
+        canvas = PngCanvas(height,width,compression_level=compression_level)
+        canvas.pixels[:] = pixels
+        return canvas.tobytes()
+
+    @staticmethod
+    def encodeIndexed(width,height,indices,palette,compression_level=6):
+        """Encode palette indices (1 byte per pixel, row by row) as PNG content, palette is a list of (r,g,b,a) bytes"""
+        f = io.BytesIO()
+        rows = (indices[y*width:(y+1)*width] for y in range(height))
+        PngCanvas.writeImage(f,width,height,rows,palette,compression_level)
+        return f.getvalue()
+
+    @staticmethod
+    def encodeTrueColour(width,height,pixels,compression_level=6,filters=(0,1,2,3)):
+        """Encode RGBA pixels (4 bytes per pixel, row by row) as PNG content"""
+        f = io.BytesIO()
+        rows = (pixels[y*width*4:(y+1)*width*4] for y in range(height))
+        PngCanvas.writeImage(f,width,height,rows,None,compression_level,filters)
+        return f.getvalue()
+
+
+class PngFilter(object):
+    """
+    Apply PNG filters to successive scanlines, choosing for each scanline the filter which
+    minimises the sum of the magnitudes of the filtered bytes (treated as signed values)
+
+    Notes:
+        the Sub, Up and Average filters are computed over whole scanlines at once by treating them as
+        large integers and operating on each byte without carries between them
+    """
+
+    def __init__(self,stride,bpp,filters):
+        self.stride = stride
+        self.bpp = bpp
+        self.filters = filters
+        self.prev = bytes(stride)
+        self.lo = int.from_bytes(b"\x7f"*stride,"big")
+        self.hi = int.from_bytes(b"\x80"*stride,"big")
+
+    def subtract(self,x,y):
+        # subtract each byte of y from the corresponding byte of x, modulo 256
+        return ((x | self.hi) - (y & self.lo)) ^ ((x ^ ~y) & self.hi)
+
+    def filter(self,row):
+        # return the filter type byte followed by the filtered scanline
+        row = bytes(row)
+        if self.filters == (0,):
+            return b"\x00"+row
+        stride = self.stride
+        candidates = []
+        value = prev_value = left = None
+        for filter_type in self.filters:
+            if filter_type == 0:
+                filtered = row
+            else:
+                if value is None:
+                    value = int.from_bytes(row,"big")
+                    prev_value = int.from_bytes(self.prev,"big")
+                    left = value >> (8*self.bpp)
+                if filter_type == 1:
+                    filtered = self.subtract(value,left).to_bytes(stride,"big")
+                elif filter_type == 2:
+                    filtered = self.subtract(value,prev_value).to_bytes(stride,"big")
+                elif filter_type == 3:
+                    average = (left & prev_value) + (((left ^ prev_value) >> 1) & self.lo)
+                    filtered = self.subtract(value,average).to_bytes(stride,"big")
+                elif filter_type == 4:
+                    filtered = self.paeth(row)
                 else:
-                    data += bytes([r, g, b, a])
-                k += 1
-            i += 1
-
-        self.write_compressedchunk(b'IDAT',data)
-
-        if self.text_attributes:
-            for key in self.text_attributes.keys():
-                val = self.text_attributes[key]
-                keybytes = key.encode("utf-8")
-                valbytes = val.encode("utf-8")
-                chunklen = len(keybytes)+len(valbytes)+5
-                self.beginchunk(b"iTXt", chunklen)
-                self.writebuffercrc(keybytes)
-                self.writebytecrc(0) # NULL terminator for key
-                self.writebytecrc(0) # Compression = 0
-                self.writebytecrc(0) # Compression method: 0
-                # Language tag: ""
-                self.writebytecrc(0) # NULL
-                # Translated tag: ""
-                self.writebytecrc(0) # NULL
-                self.writebuffercrc(valbytes)
-                self.endchunk()
-
-        self.beginchunk(b"IEND", 0)
-        self.endchunk()
-    
-    def resetcrc(self):
-        self.crc = 0
-
-    def writebytes(self, bytes):
-        self.fd.write(bytes)
-
-    def writelong(self,l):
-        self.writebytes(bytes([(l>>24)&0xFF,(l>>16)&0xFF,(l>>8)&0xFF,l&0xFF]))
-        
-    def writelongcrc(self,l):
-        c3 = bytes([(l>>24)&0xFF])
-        c2 = bytes([(l>>16)&0xFF])
-        c1 = bytes([(l>>8)&0xFF])
-        c0 = bytes([l&0xFF])
-        self.crc = crc32(c3,self.crc)
-        self.writebytes(c3)
-        self.crc = crc32(c2,self.crc)
-        self.writebytes(c2)
-        self.crc = crc32(c1,self.crc)
-        self.writebytes(c1)
-        self.crc = crc32(c0,self.crc)
-        self.writebytes(c0)
-
-    def writewordcrc(self,s):
-        c1 = bytes([(s>>8)&0xFF])
-        c0 = bytes([s&0xFF])
-        self.crc = crc32(c1,self.crc)
-        self.writebytes(c1)
-        self.crc = crc32(c0,self.crc)
-        self.writebytes(c0)
-
-    def writebytecrc(self,c):
-        c = bytes([c])
-        self.crc = crc32(c,self.crc)
-        self.writebytes(c)
-
-    def writebuffercrc(self,bytes):
-        self.crc = crc32(bytes,self.crc)
-        self.writebytes(bytes)
-
-    def beginchunk(self,name,len):
-        self.writelong(len)
-        self.resetcrc()
-        self.crc = crc32(name,self.crc)
-        self.writebytes(name)
-
-    def endchunk(self):
-        self.writelong(self.crc)
-
-    def write_compressedchunk(self,name,data):
-        cdata = self.compressor.compress(data) + self.compressor.flush()
-        self.writelong(len(cdata))
-        self.resetcrc()
-        self.writebuffercrc(name)
-        self.writebuffercrc(cdata)
-        self.writelong(self.crc)
+                    raise Exception("Invalid PNG filter type %d" % filter_type)
+            candidates.append((sum(filtered.translate(PngCanvas.magnitudes)),filter_type,filtered))
+        self.prev = row
+        (_,filter_type,filtered) = min(candidates)
+        return bytes([filter_type])+filtered
+
+    def paeth(self,row):
+        bpp = self.bpp
+        prev = self.prev
+        out = bytearray(row)
+        for i in range(bpp):
+            out[i] = (row[i] - prev[i]) & 0xFF
+        for i in range(bpp,self.stride):
+            a = row[i-bpp]
+            b = prev[i]
+            c = prev[i-bpp]
+            pa = abs(b-c)
+            pb = abs(a-c)
+            pc = abs(a+b-c-c)
+            if pa <= pb and pa <= pc:
+                out[i] = (row[i] - a) & 0xFF
+            elif pb <= pc:
+                out[i] = (row[i] - b) & 0xFF
+            else:
+                out[i] = (row[i] - c) & 0xFF
+        return bytes(out)
 
 
 if __name__ == '__main__':
     w = 100
     h = 100
     cnv = PngCanvas(w, h, {"Foo123":"FooBar"})
-    for i in range(w):
-        for j in range(h):
-            cnv.addpixel(i,j,255-i,j,255-j,255)
-    cnv.write(open("test.png","wb"))
\ No newline at end of file
+    for j in range(h):
+        cnv.set_row(j,b"".join(bytes((255-i,j,255-j,255)) for i in range(w)))
+    cnv.write(open("test.png","wb"))
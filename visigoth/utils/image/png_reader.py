@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+#    Visigoth: A lightweight Python3 library for rendering data visualizations in SVG
+#    Copyright (C) 2020  Niall McCarroll
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a copy of this software
+#   and associated documentation files (the "Software"), to deal in the Software without 
+#   restriction, including without limitation the rights to use, copy, modify, merge, publish,
+#   distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included in all copies or 
+#   substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+#   BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+#   NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+#   DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import struct
+import sys
+import zlib
+from array import array
+
+class PngReader(object):
+    """
+    Decode PNG images to RGBA pixels
+
+    Notes:
+        supports non-interlaced images of all colour types and bit depths, 16 bit samples are reduced to 8 bits.
+        Transparency is read for palette images only.
+    """
+
+    png_magic = b"\x89\x50\x4E\x47\x0D\x0A\x1A\x0A"
+
+    # bytes per sample for each colour type
+    channels = {0:1, 2:3, 3:1, 4:2, 6:4}
+
+    @staticmethod
+    def decode(content):
+        """
+        Decode a PNG image
+
+        Arguments:
+            content (bytes): the content of the PNG file
+
+        Returns:
+            (width,height,pixels) tuple where pixels is a bytearray with 4 bytes (r,g,b,a) per pixel, row by row
+
+        Raises:
+            Exception if the content is not a supported PNG image
+        """
+        if content[:8] != PngReader.png_magic:
+            raise Exception("Not a PNG image")
+        pos = 8
+        idat = []
+        palette = None
+        trns = None
+        header = None
+        while pos < len(content):
+            (length,name) = struct.unpack(">L4s",content[pos:pos+8])
+            data = content[pos+8:pos+8+length]
+            pos += 12+length
+            if name == b"IHDR":
+                header = struct.unpack(">LLBBBBB",data)
+            elif name == b"PLTE":
+                palette = data
+            elif name == b"tRNS":
+                trns = data
+            elif name == b"IDAT":
+                idat.append(data)
+            elif name == b"IEND":
+                break
+        if header is None:
+            raise Exception("PNG image has no IHDR chunk")
+        (width,height,bit_depth,colour_type,_,_,interlace) = header
+        if interlace:
+            raise Exception("Interlaced PNG images are not supported")
+        if colour_type not in PngReader.channels:
+            raise Exception("Unsupported PNG colour type %d" % colour_type)
+
+        raw = zlib.decompress(b"".join(idat))
+        channels = PngReader.channels[colour_type]
+        stride = (width*channels*bit_depth+7)//8
+        bpp = max(1,channels*bit_depth//8)
+        rows = PngReader.unfilter(raw,height,stride,bpp)
+
+        if colour_type == 3:
+            if palette is None:
+                raise Exception("Palette PNG image has no PLTE chunk")
+            to_rgba = PngReader.paletteConverter(palette,trns)
+        else:
+            to_rgba = {0:PngReader.convertGrey, 2:PngReader.convertRGB,
+                       4:PngReader.convertGreyAlpha, 6:PngReader.convertRGBA}[colour_type]
+
+        pixels = bytearray(width*height*4)
+        row_size = width*4
+        for y in range(height):
+            row = rows[y]
+            if bit_depth == 16:
+                row = row[0::2]
+            elif bit_depth < 8:
+                row = PngReader.unpackBits(row,bit_depth,width*channels,colour_type != 3)
+            pixels[y*row_size:(y+1)*row_size] = to_rgba(row,width)
+        return (width,height,pixels)
+
+    @staticmethod
+    def unfilter(raw,height,stride,bpp):
+        # reverse the filter applied to each scanline, returning a list of unfiltered scanlines
+        # the Sub and Up filters are applied to whole scanlines at once by treating them as large integers
+        # and adding bytes without carries between them
+        mask_lo = int.from_bytes(b"\x7f"*stride,"big")
+        mask_hi = int.from_bytes(b"\x80"*stride,"big")
+
+        def add(x,y):
+            return ((x & mask_lo) + (y & mask_lo)) ^ ((x ^ y) & mask_hi)
+
+        rows = []
+        prev = bytes(stride)
+        for y in range(height):
+            pos = y*(stride+1)
+            filter_type = raw[pos]
+            line = raw[pos+1:pos+1+stride]
+            if filter_type == 0:
+                row = line
+            elif filter_type == 1:
+                value = int.from_bytes(line,"big")
+                shift = bpp
+                while shift < stride:
+                    value = add(value,value >> (8*shift))
+                    shift *= 2
+                row = value.to_bytes(stride,"big")
+            elif filter_type == 2:
+                row = add(int.from_bytes(line,"big"),int.from_bytes(prev,"big")).to_bytes(stride,"big")
+            elif filter_type == 3:
+                out = bytearray(line)
+                for i in range(bpp):
+                    out[i] = (out[i] + (prev[i] >> 1)) & 0xFF
+                for i in range(bpp,stride):
+                    out[i] = (out[i] + ((out[i-bpp] + prev[i]) >> 1)) & 0xFF
+                row = bytes(out)
+            elif filter_type == 4:
+                out = bytearray(line)
+                for i in range(bpp):
+                    out[i] = (out[i] + prev[i]) & 0xFF
+                for i in range(bpp,stride):
+                    a = out[i-bpp]
+                    b = prev[i]
+                    c = prev[i-bpp]
+                    pa = abs(b-c)
+                    pb = abs(a-c)
+                    pc = abs(a+b-c-c)
+                    if pa <= pb and pa <= pc:
+                        out[i] = (out[i] + a) & 0xFF
+                    elif pb <= pc:
+                        out[i] = (out[i] + b) & 0xFF
+                    else:
+                        out[i] = (out[i] + c) & 0xFF
+                row = bytes(out)
+            else:
+                raise Exception("Invalid PNG filter type %d" % filter_type)
+            rows.append(row)
+            prev = row
+        return rows
+
+    @staticmethod
+    def unpackBits(row,bit_depth,count,scale):
+        # expand samples packed into bytes to one byte per sample, scaling greyscale samples to 0-255
+        per_byte = 8//bit_depth
+        mask = (1 << bit_depth)-1
+        factor = 255//mask if scale else 1
+        table = [bytes(((b >> (8-bit_depth*(k+1))) & mask)*factor for k in range(per_byte)) for b in range(256)]
+        return b"".join(map(table.__getitem__,row))[:count]
+
+    @staticmethod
+    def paletteConverter(palette,trns):
+        entries = []
+        for i in range(len(palette)//3):
+            alpha = trns[i] if trns is not None and i < len(trns) else 255
+            entries.append(palette[3*i:3*i+3]+bytes([alpha]))
+        entries += [b"\x00\x00\x00\xff"]*(256-len(entries))
+        # map each index to the native integer whose bytes are the (r,g,b,a) entry
+        lookup = [int.from_bytes(entry,sys.byteorder) for entry in entries]
+        def convert(row,width):
+            return array("I",map(lookup.__getitem__,row)).tobytes()
+        return convert
+
+    @staticmethod
+    def convertGrey(row,width):
+        out = bytearray(width*4)
+        out[0::4] = row
+        out[1::4] = row
+        out[2::4] = row
+        out[3::4] = b"\xff"*width
+        return out
+
+    @staticmethod
+    def convertGreyAlpha(row,width):
+        out = bytearray(width*4)
+        grey = row[0::2]
+        out[0::4] = grey
+        out[1::4] = grey
+        out[2::4] = grey
+        out[3::4] = row[1::2]
+        return out
+
+    @staticmethod
+    def convertRGB(row,width):
+        out = bytearray(width*4)
+        out[0::4] = row[0::3]
+        out[1::4] = row[1::3]
+        out[2::4] = row[2::3]
+        out[3::4] = b"\xff"*width
+        return out
+
+    @staticmethod
+    def convertRGBA(row,width):
+        return row
@@ -34,6 +34,21 @@ class Projection(object):
     def toLonLat(self,e_n):
         pass
 
+    def fromLonLatArray(self,lon_lats):
+        # project a sequence of (lon,lat) tuples, subclasses may override with a faster implementation
+        fromLonLat = self.fromLonLat
+        return [fromLonLat(lon_lat) for lon_lat in lon_lats]
+
+    def toLonLatArray(self,e_ns):
+        # unproject a sequence of (e,n) tuples, subclasses may override with a faster implementation
+        toLonLat = self.toLonLat
+        return [toLonLat(e_n) for e_n in e_ns]
+
+    def isSeparable(self):
+        # True if longitude depends only on easting and latitude only on northing, so that a grid of
+        # points can be unprojected one row and one column at a time
+        return False
+
 class PROJ_EPSG_3857(Projection):
 
     C1 = 20037508.34
@@ -59,6 +74,32 @@ class PROJ_EPSG_3857(Projection):
         lat = 180/math.pi * (2 * math.atan(math.exp(lat*math.pi/180)) - math.pi/2)
         return (lon,lat)
 
+    def fromLonLatArray(self,lon_lats):
+        # same arithmetic as fromLonLat, with lookups hoisted out of the loop
+        c1 = PROJ_EPSG_3857.C1
+        log = math.log
+        tan = math.tan
+        pi = math.pi
+        d2r = pi / 180
+        try:
+            return [(lon * c1 / 180, log(tan((90+lat) * pi / 360.0)) / d2r * c1 / 180) for (lon,lat) in lon_lats]
+        except ValueError:
+            for lon_lat in lon_lats:
+                self.fromLonLat(lon_lat) # report the offending point
+            raise
+
+    def toLonLatArray(self,e_ns):
+        # same arithmetic as toLonLat, with lookups hoisted out of the loop
+        c1 = PROJ_EPSG_3857.C1
+        atan = math.atan
+        exp = math.exp
+        pi = math.pi
+        r2d = 180/pi
+        return [(e * 180 / c1, r2d * (2 * atan(exp((n * 180 / c1)*pi/180)) - pi/2)) for (e,n) in e_ns]
+
+    def isSeparable(self):
+        return True
+
 class PROJ_EPSG_4326(Projection):
 
     def __init__(self):
@@ -70,6 +111,15 @@ class PROJ_EPSG_4326(Projection):
     def toLonLat(self,e_n):
         return e_n
 
+    def fromLonLatArray(self,lon_lats):
+        return list(lon_lats)
+
+    def toLonLatArray(self,e_ns):
+        return list(e_ns)
+
+    def isSeparable(self):
+        return True
+
 class Projections(object):
 
     EPSG_3857 = PROJ_EPSG_3857()